@@ -1,10 +1,17 @@
-import requests
+import os
+import sys
 import matplotlib.pyplot as plt
 
 from datetime import datetime, timedelta
+
+# The API client is shared with the backend, which is one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from thingspeak import ThingSpeakClient
 from CatBoost import TimeSeriesCatBoost
 
-API_ENDPOINT = "https://api.thingspeak.com/channels/202842"
+API_ENDPOINT = "https://api.thingspeak.com"
+CHANNEL = 202842
 DEVICE_ID = 1
 NUM_ESTIMATORS = 1000
 # Stop after this many iterations if there is no accuracy improvement
@@ -15,11 +22,11 @@ VERBOSE_COUNT = 100
 Y_LABEL = "Temperature"
 NUM_X_TICKS = 5
 
-def get_data(endpoint: str, device_id: int, query_params: list[str]) -> list[dict]:
+def get_data(client: ThingSpeakClient, channel: int, device_id: int, query_params: dict) -> list[dict]:
     result = []
 
     try:
-        response = requests.get(f"{endpoint}/fields/{device_id}.json?{'&'.join(query_params)}").json()
+        response = client.field(channel, device_id, query_params)
         result = [ val for val in response["feeds"] if val[f"field{device_id}"] is not None ]
     except Exception as err:
         print(err)
@@ -34,7 +41,7 @@ def process_data(json_data: list[dict], device_id: int) -> [list[str], list[str]
         y.append(entry[f'field{device_id}'])
     return X, y
 
-input_data = get_data(API_ENDPOINT, DEVICE_ID, ["days=2"])
+input_data = get_data(ThingSpeakClient(API_ENDPOINT), CHANNEL, DEVICE_ID, {"days": 2})
 X, y = process_data(input_data, DEVICE_ID)
 
 catboost_example = TimeSeriesCatBoost(n_estimators=NUM_ESTIMATORS, learning_rate=LEARNING_RATE, verbose=VERBOSE_COUNT)
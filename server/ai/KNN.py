@@ -1,9 +1,13 @@
+import joblib
 import numpy as np
 
 from datetime import datetime, timedelta
 from sklearn.neighbors import KNeighborsRegressor
 from typing import Callable
 
+from ai.features import prediction_grid
+from ai.parsing import parse_feed, parse_series
+
 class TimeSeriesKNN(KNeighborsRegressor):
     """
     K-Neighbors Classifier for Time Series forecasting.
@@ -11,6 +15,9 @@ class TimeSeriesKNN(KNeighborsRegressor):
     daily: should the model learn excluding days, including only time (True) or including days (False)
     granulaity: should the predictions be split by seconds (s), minutes (min) or hours (h)
     """
+    # Increased when the encoding of dates changes, so saved models trained with another encoding are not used
+    model_version = 2
+
     def __init__(
             self,
             daily: bool = False,
@@ -47,46 +54,68 @@ class TimeSeriesKNN(KNeighborsRegressor):
         date_object = input_date
         if type(input_date) is str:
             date_object = datetime.strptime(input_date, "%Y-%m-%dT%H:%M:%SZ")
-        date_part = date_object.date()
-        time_part = date_object.time()
-        date_to_parse = f"{date_part.month}{date_part.day}{time_part.hour}{time_part.minute}{time_part.second}"
-        return int(date_to_parse)
-
-    def initial_processing(self, json_data: list[dict], device_id: int) -> [list[str], list[str]]:
-        X = []
-        y = []
-        for entry in json_data:
-            X.append(entry['created_at'])
-            y.append(entry[f'field{device_id}'])
-        return X, y
-
-    def process_data(self, X : list[str], y: list[str]) -> [list[int], list[float]]:
-        """
-        Convert API response data into format accepted by KNeighborsRegressor.
-        """
-        parsed_X = []
-        parsed_y = []
-        for idx, label in enumerate(y):
-            # Skip measurements without value
-            if label is not None:
-                # If the learning excludes days and only focuses on time
-                if self.daily:
-                    time_X = datetime.strptime(X[idx], "%Y-%m-%dT%H:%M:%SZ").time()
-                    if self.granularity == 's':
-                        parsed_X.append([
-                            time_X.hour * 3600 + time_X.minute * 60 + time_X.second
-                        ])
-                    elif self.granularity == 'min':
-                        parsed_X.append([
-                            time_X.hour * 60 + time_X.minute * 60
-                        ])
-                    else:
-                        parsed_X.append([time_X.hour])
-                # If the learning includes days and time, convert to ordinal int numbers
-                else:
-                    parsed_X.append([self.date_to_ordinal(X[idx])])
-                parsed_y.append(float(label))
-        return parsed_X, parsed_y
+        return int(self.dates_to_ordinal(np.array([date_object], dtype="datetime64[s]"))[0])
+
+    def dates_to_ordinal(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Convert array of dates (datetime64) to ordinal numbers, the same as date_to_ordinal: digits of month, day,
+        hour, minute and second written one after another (without leading zeros). The digits are shifted
+        arithmetically instead of building and parsing a string for every date.
+        """
+        dates = dates.astype("datetime64[s]")
+        days = dates.astype("datetime64[D]")
+        months = days.astype("datetime64[M]")
+        seconds = (dates - days).astype(np.int64)
+        result = (months.astype(np.int64) % 12 + 1)
+        for part in [
+            (days - months).astype(np.int64) + 1,
+            seconds // 3600,
+            seconds // 60 % 60,
+            seconds % 60
+        ]:
+            # Make room for the digits of the part (one digit below 10, two digits otherwise)
+            result = result * np.where(part < 10, 10, 100) + part
+        return result
+
+    # Number of distinct times of day in daily mode for every granularity
+    DAILY_SIZES = {"s": 86400, "min": 1440, "h": 24}
+
+    def time_of_day(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Convert array of dates (datetime64) to time of day in units of granularity.
+        """
+        dates = dates.astype("datetime64[s]")
+        seconds = (dates - dates.astype("datetime64[D]")).astype(np.int64)
+        if self.granularity == 's':
+            return seconds
+        elif self.granularity == 'min':
+            # hour * 60 + minute
+            return seconds // 60
+        return seconds // 3600
+
+    def encode_dates(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Convert array of dates (datetime64) to the only feature of the model (one column).
+        """
+        # If the learning excludes days and only focuses on time
+        if self.daily:
+            return self.time_of_day(dates).reshape(-1, 1)
+        # If the learning includes days and time, convert to ordinal int numbers
+        return self.dates_to_ordinal(dates).reshape(-1, 1)
+
+    def initial_processing(self, json_data: list[dict], device_id: int) -> [np.ndarray, np.ndarray]:
+        """
+        Convert API response data into arrays of dates and values (see parse_feed).
+        """
+        return parse_feed(json_data, device_id)
+
+    def process_data(self, X : list[str] | np.ndarray, y: list[str] | np.ndarray) -> [np.ndarray, np.ndarray]:
+        """
+        Convert API response data into format accepted by KNeighborsRegressor: array of features (one column)
+        and array of values.
+        """
+        dates, parsed_y = parse_series(X, y)
+        return self.encode_dates(dates), parsed_y
 
     def fit2(self, X: list[str] | list[int], y: list[str] | list[float], process_data: bool, *args, **kwargs) -> None:
         """
@@ -95,10 +124,31 @@ class TimeSeriesKNN(KNeighborsRegressor):
         if process_data:
             X, y = self.process_data(X, y)
         self.fit(X=X, y=y, *args, **kwargs)
+        self.daily_table_ = None
+        if self.daily:
+            # There are only DAILY_SIZES distinct times of day, so neighbors of all of them are searched once
+            # and predictions of any horizon are read from the table
+            times = np.arange(self.DAILY_SIZES.get(self.granularity, 24)).reshape(-1, 1)
+            self.daily_table_ = self.predict(times)
     
     def extract_result(self, result) -> list[list, list]:
         return (result[0], result[1].tolist())
 
+    # Extension of files of saved models
+    file_extension = "joblib"
+
+    def save2(self, path: str) -> None:
+        """
+        Save fitted model. scikit-learn has no format of its own, joblib is the one it recommends.
+        """
+        joblib.dump(self, path)
+
+    def load2(self, path: str) -> None:
+        """
+        Load model saved by save2 into this (not fitted) model.
+        """
+        self.__dict__.update(joblib.load(path).__dict__)
+
     def predict2(self, start_date: datetime, end_date: datetime, interval: timedelta) -> [list[datetime], list[float]]:
         """
         Make a prediction using learned data.
@@ -107,23 +157,11 @@ class TimeSeriesKNN(KNeighborsRegressor):
         end_date: end date of prediction
         interval: how often should the prediction be performed between start_date and end_date
         """
-        datetimes = []
-        times = []
-        current_date = start_date
-        # Iterate from start_date to end_date in specified interval
-        while current_date <= end_date:
-            current_time = current_date.time()
-            # Predict on values including days
-            if not self.daily:
-                times.append([self.date_to_ordinal(current_date)])
-            # Predict on values excluding days, only focus on time
-            elif self.granularity == 's':
-                times.append([current_time.hour * 3600 + current_time.minute * 60 + current_time.second])
-            elif self.granularity == 'min':
-                times.append([current_time.hour * 3600 + current_time.minute])
-            else:
-                times.append([current_time.hour])
-            datetimes.append(current_date)
-            current_date += interval
-        
-        return datetimes, self.predict(times)
+        # All dates from start_date to end_date in specified interval
+        datetimes = prediction_grid(start_date, end_date, interval)
+        dates = datetimes.to_numpy()
+        if self.daily and getattr(self, "daily_table_", None) is not None:
+            values = self.daily_table_[self.time_of_day(dates)]
+        else:
+            values = self.predict(self.encode_dates(dates))
+        return datetimes.to_pydatetime().tolist(), values
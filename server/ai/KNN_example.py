@@ -1,21 +1,28 @@
-import requests
+import os
+import sys
 import matplotlib.pyplot as plt
 
 from datetime import datetime, timedelta
+
+# The API client is shared with the backend, which is one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from thingspeak import ThingSpeakClient
 from KNN import TimeSeriesKNN
 
-API_ENDPOINT = "https://api.thingspeak.com/channels/202842"
+API_ENDPOINT = "https://api.thingspeak.com"
+CHANNEL = 202842
 DEVICE_ID = 1
 NUM_NEIGHBORS = 2
 DAILY_LEARNING = False
 Y_LABEL = "Temperature"
 NUM_X_TICKS = 5
 
-def get_data(endpoint: str, device_id: int, query_params: list[str]) -> list[dict]:
+def get_data(client: ThingSpeakClient, channel: int, device_id: int, query_params: dict) -> list[dict]:
     result = []
 
     try:
-        response = requests.get(f"{endpoint}/fields/{device_id}.json?{'&'.join(query_params)}").json()
+        response = client.field(channel, device_id, query_params)
         result = [ val for val in response["feeds"] if val[f"field{device_id}"] is not None ]
     except Exception as err:
         print(err)
@@ -30,7 +37,7 @@ def process_data(json_data: list[dict], device_id: int) -> [list[str], list[str]
         y.append(entry[f'field{device_id}'])
     return X, y
 
-input_data = get_data(API_ENDPOINT, DEVICE_ID, ["days=2"])
+input_data = get_data(ThingSpeakClient(API_ENDPOINT), CHANNEL, DEVICE_ID, {"days": 2})
 X, y = process_data(input_data, DEVICE_ID)
 
 knn_example = TimeSeriesKNN(n_neighbors=NUM_NEIGHBORS, daily=DAILY_LEARNING)
@@ -1,55 +1,98 @@
+import numpy as np
 import pandas as pd
 
 from datetime import datetime, timedelta
 from prophet import Prophet
+from prophet.models import ModelParams
+from prophet.serialize import model_from_json, model_to_json
+
+from ai.parsing import parse_feed, parse_series
 
 class TimeSeriesProphet(Prophet):
     """
     Time series regressor using Prophet.
     Implemented with the help of the official docs: https://facebook.github.io/prophet/docs/quick_start.html
+
+    Set uncertainty_samples=0 when uncertainty intervals (yhat_lower, yhat_upper) are not needed,
+    prediction then skips simulating them, which takes most of its time.
     """
+    # fit2 can start from parameters of a previously fitted model, used by predictions with PREDICT_WARM_START
+    warm_start = True
+
     def __init__(
             self,
             *args,
             **kwargs
         ):
         super().__init__(*args, **kwargs)
+        # Model the fit is started from, set by fit2
+        self.previous = None
 
-    def process_data(self, X: list[str], y: list[str]) -> pd.DataFrame:
+    def process_data(self, X: list[str] | np.ndarray, y: list[str] | np.ndarray) -> pd.DataFrame:
         """
         Convert API response data into format accepted by Prophet.
         """
-        parsed_X = []
-        parsed_y = []
-        for idx, label in enumerate(y):
-            # Skip measurements without value
-            if label is not None:
-                parsed_X.append(datetime.strptime(X[idx], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S"))
-                parsed_y.append(float(label))
+        # Prophet accepts datetime64 dates, so they do not have to be formatted back into strings
+        ds, y = parse_series(X, y)
         return pd.DataFrame({
-            "ds": parsed_X,
-            "y": parsed_y
+            "ds": ds,
+            "y": y
         })
 
-    def initial_processing(self, json_data: list[dict], device_id: int) -> [list[str], list[str]]:
-        X = []
-        y = []
-        for entry in json_data:
-            X.append(entry['created_at'])
-            y.append(entry[f'field{device_id}'])
-        return X, y
+    def initial_processing(self, json_data: list[dict], device_id: int) -> [np.ndarray, np.ndarray]:
+        """
+        Convert API response data into arrays of dates and values (see parse_feed).
+        """
+        return parse_feed(json_data, device_id)
 
-    def fit2(self, X: list[str] | list[datetime], y: list[str] | list[float], process_data: bool, *args, **kwargs) -> None:
+    def fit2(self, X: list[str] | list[datetime], y: list[str] | list[float], process_data: bool, *args, previous: Prophet | None = None, **kwargs) -> None:
         """
         Fit the regressor with provided data.
 
         process_data: should the X and y be processed to fit Prophet model.
+        previous: model of the same configuration fitted on older data of the sensor, optimization starts
+            from its parameters instead of from scratch (see calculate_initial_params)
         """
         if process_data:
             df = self.process_data(X, y)
 
-        self.fit(df=df, *args, **kwargs)
-        
+        self.previous = previous
+        try:
+            self.fit(df=df, *args, **kwargs)
+        finally:
+            self.previous = None
+
+    def calculate_initial_params(self, num_total_regressors: int) -> ModelParams:
+        """
+        Initial parameters of the optimization. Parameters of the previous model (see fit2) cannot be used
+        as they are, changepoints and scales of the new model move with new data, so the previous trend is
+        evaluated at the new changepoints and parameters are converted to the new scales.
+        """
+        initial = super().calculate_initial_params(num_total_regressors)
+        previous = self.previous
+        if previous is None or self.growth != "linear" or previous.growth != "linear":
+            return initial
+        # Trend of the previous model (in units of y) at the start, changepoints and end of the new history
+        knots = np.concatenate([[0.0], self.changepoints_t, [1.0]])
+        ds = pd.DataFrame({"ds": self.start + pd.to_timedelta(knots * self.t_scale.total_seconds(), unit="s")})
+        trend = previous.predict_trend(previous.setup_dataframe(ds)).to_numpy() / self.y_scale
+        # Piecewise linear trend through these points: initial slope and its changes at changepoints
+        slopes = np.diff(trend) / np.diff(knots)
+        ratio = previous.y_scale / self.y_scale
+        beta = np.mean(previous.params["beta"], axis=0)
+        if previous.seasonalities == self.seasonalities and len(beta) == num_total_regressors:
+            # Coefficients of additive features are in units of y, multiplicative ones are relative
+            beta = beta * np.where(self.train_component_cols["additive_terms"].to_numpy() == 1, ratio, 1)
+        else:
+            beta = initial.beta
+        return ModelParams(
+            k=float(slopes[0]),
+            m=float(trend[0]),
+            delta=np.diff(slopes),
+            beta=beta,
+            sigma_obs=float(np.mean(previous.params["sigma_obs"])) * ratio
+        )
+
     def extract_result(self, result) -> list[list, list]:
         X_result = result[['ds']].values.astype('datetime64[us]').tolist()
         y_result = result[['yhat']].values.tolist()
@@ -57,6 +100,24 @@ class TimeSeriesProphet(Prophet):
         y_result = [item for row in y_result for item in row]
         return [X_result, y_result]
 
+    # Extension of files of saved models
+    file_extension = "json"
+
+    def save2(self, path: str) -> None:
+        """
+        Save fitted model in the JSON format of Prophet (pickle is not recommended by its docs).
+        """
+        with open(path, "w") as file:
+            file.write(model_to_json(self))
+
+    def load2(self, path: str) -> None:
+        """
+        Load model saved by save2 into this (not fitted) model.
+        """
+        with open(path, "r") as file:
+            # model_from_json creates a plain Prophet, its state is moved to this model
+            self.__dict__.update(model_from_json(file.read()).__dict__)
+
     def predict2(self, start_date: datetime, end_date: datetime, interval: timedelta, *args, **kwargs) -> pd.DataFrame:
         """
         Make a prediction using learned data.
@@ -64,12 +125,8 @@ class TimeSeriesProphet(Prophet):
         end_date: end date of prediction
         interval: how often should the prediction be performed between start_date and end_date
         """
-        num_datetimes = 0
-        current_date = datetime.now()
-        # Iterate from start_date to end_date in specified interval
-        while current_date <= end_date:
-            current_date += interval
-            num_datetimes += 1
+        # Number of intervals from now to end_date (inclusive), computed at once instead of counting them in a loop
+        num_datetimes = max((end_date - datetime.now()) // interval + 1, 0)
         # Create an array of future dates, to create predictions
         future = self.make_future_dataframe(periods=num_datetimes, freq=interval)
 
@@ -1,8 +1,12 @@
+import numpy as np
 import xgboost as xgb
 import pandas as pd
 
 from datetime import datetime, timedelta
 
+from ai.features import create_features, prediction_grid, CALENDAR_FEATURES
+from ai.parsing import parse_feed, parse_series
+
 class TimeSeriesXGBoost(xgb.XGBRegressor):
     """
     Time series regressor using XGBoost.
@@ -18,7 +22,7 @@ class TimeSeriesXGBoost(xgb.XGBRegressor):
         ):
         self.test_size = test_size
         # Features provided to the regressor (X)
-        self.feature_columns = ["hour", "minute", "second", "weekday", "month"]
+        self.feature_columns = list(CALENDAR_FEATURES)
         # The name of the values, which will take form of a column with this name in input dataset (y)
         self.value_column = ["value"]
         # Because fit of XGBoost depends on params, set them here (otherwise it will crash)
@@ -39,41 +43,18 @@ class TimeSeriesXGBoost(xgb.XGBRegressor):
         train_split = [X[int(len(X) * test_size):], y[int(len(X) * test_size):]]
         return [train_split, test_split]
 
-    def process_data(self, X: list[str], y: list[str]) -> [list[datetime], list[float]]:
+    def process_data(self, X: list[str] | np.ndarray, y: list[str] | np.ndarray) -> [np.ndarray, np.ndarray]:
         """
-        Convert API response data into format accepted by XGBoost.
+        Convert API response data into format accepted by XGBoost: arrays of dates and values.
         """
-        parsed_X = []
-        parsed_y = []
-        for idx, label in enumerate(y):
-            # Skip measurements without value
-            if label is not None:
-                parsed_X.append(datetime.strptime(X[idx], "%Y-%m-%dT%H:%M:%SZ"))
-                parsed_y.append(float(label))
-        return parsed_X, parsed_y
+        return parse_series(X, y)
 
-    def create_features(self, X: list[datetime], y: list[float]) -> pd.DataFrame:
+    def create_features(self, X: list[datetime] | pd.DatetimeIndex, y: list[float] | None) -> pd.DataFrame:
         """
         Get features that will be fed to the model, along with y values.
         Result will be converted into pandas DataFrame.
         """
-        # Notice that variables correspond to self.feature_columns
-        hours = [ val.time().hour for val in X ]
-        minutes = [ val.time().minute for val in X ]
-        seconds = [ val.time().second for val in X ]
-        weekdays = [ val.weekday() for val in X ]
-        months = [ val.month for val in X ]
-
-        return pd.DataFrame({
-            # y
-            "value": y,
-            # X
-            "hour": hours,
-            "minute": minutes,
-            "second": seconds,
-            "weekday": weekdays,
-            "month": months
-        })
+        return create_features(X, y)
 
     def fit2(self, X: list[str] | list[datetime], y: list[str] | list[float], process_data: bool, *args, **kwargs) -> None:
         """
@@ -94,17 +75,30 @@ class TimeSeriesXGBoost(xgb.XGBRegressor):
 
         self.fit(X=X_train, y=y_train, eval_set=[(X_train, y_train), (X_test, y_test)], *args, **kwargs)
     
-    def initial_processing(self, json_data: list[dict], device_id: int) -> [list[str], list[str]]:
-        X = []
-        y = []
-        for entry in json_data:
-            X.append(entry['created_at'])
-            y.append(entry[f'field{device_id}'])
-        return X, y
+    def initial_processing(self, json_data: list[dict], device_id: int) -> [np.ndarray, np.ndarray]:
+        """
+        Convert API response data into arrays of dates and values (see parse_feed).
+        """
+        return parse_feed(json_data, device_id)
     
     def extract_result(self, result) -> list[list, list]:
         return result
 
+    # Extension of files of saved models, XGBoost picks the format by extension (ubj is binary JSON)
+    file_extension = "ubj"
+
+    def save2(self, path: str) -> None:
+        """
+        Save fitted model in the native XGBoost format.
+        """
+        self.save_model(path)
+
+    def load2(self, path: str) -> None:
+        """
+        Load model saved by save2 into this (not fitted) model.
+        """
+        self.load_model(path)
+
     def predict2(self, start_date: datetime, end_date: datetime, interval: timedelta, *args, **kwargs) -> [list[datetime], list[float]]:
         """
         Make a prediction using learned data.
@@ -112,15 +106,8 @@ class TimeSeriesXGBoost(xgb.XGBRegressor):
         end_date: end date of prediction
         interval: how often should the prediction be performed between start_date and end_date
         """
-        datetimes = []
-        values = []
-        current_date = start_date
-        # Iterate from start_date to end_date in specified interval
-        while current_date <= end_date:
-            datetimes.append(current_date)
-            values.append(0)
-            current_date += interval
-        
-        predict_features = self.create_features(datetimes, values)
-
-        return datetimes, self.predict(X=predict_features[self.feature_columns], *args, **kwargs).tolist()
+        # All dates from start_date to end_date in specified interval
+        datetimes = prediction_grid(start_date, end_date, interval)
+        predict_features = self.create_features(datetimes, None)
+
+        return datetimes.to_pydatetime().tolist(), self.predict(X=predict_features[self.feature_columns], *args, **kwargs).tolist()
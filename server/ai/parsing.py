@@ -0,0 +1,80 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+
+def parse_series(
+    X: list[str] | list[datetime] | np.ndarray, y: list[str] | list[float] | np.ndarray
+) -> [np.ndarray, np.ndarray]:
+    """
+    Convert dates and values into arrays of dates (datetime64[s]) and values (float64) in a single vectorized pass.
+    Measurements without value (None, "None" or anything else that is not a number) are dropped.
+
+    X: dates in ThingSpeak format, datetimes or datetime64 array
+    y: values as numbers or strings (ThingSpeak returns values as strings)
+    """
+    if isinstance(X, np.ndarray) and np.issubdtype(X.dtype, np.datetime64):
+        dates = X.astype("datetime64[s]")
+    elif len(X) > 0 and isinstance(X[0], str):
+        # numpy parses ISO dates in C, but it does not accept the UTC designator (Z) at the end of ThingSpeak dates
+        dates = np.array(
+            [date[:-1] if date.endswith("Z") else date for date in X],
+            dtype="datetime64[s]",
+        )
+    else:
+        dates = pd.DatetimeIndex(X).to_numpy().astype("datetime64[s]")
+    if isinstance(y, np.ndarray) and y.dtype == np.float64:
+        values = y
+    else:
+        try:
+            values = np.array(
+                [np.nan if label is None else label for label in y], dtype=object
+            ).astype(np.float64)
+        except ValueError:
+            # Some values are not numbers (e.g. "None"), turn them into nan
+            values = pd.to_numeric(
+                pd.Series(y, dtype=object), errors="coerce"
+            ).to_numpy(dtype=np.float64)
+    # Skip measurements without value
+    has_value = ~np.isnan(values)
+    if has_value.all():
+        return dates, values
+    return dates[has_value], values[has_value]
+
+
+def parse_feed(json_data: list[dict], device_id: int) -> [np.ndarray, np.ndarray]:
+    """
+    Convert feeds of API response into arrays of dates (datetime64[s]) and values (float64) of the device.
+    """
+    field = f"field{device_id}"
+    return parse_series(
+        [entry["created_at"] for entry in json_data],
+        [entry.get(field) for entry in json_data],
+    )
+
+
+def parse_cursor(
+    cursor: sqlite3.Cursor, batch_size: int = 65536
+) -> [np.ndarray, np.ndarray]:
+    """
+    Read rows (date as epoch seconds, value) of a database query into arrays of dates (datetime64[s])
+    and values (float64), e.g. of SELECT measurement_created_at, measurement_field1 FROM measurement.
+    """
+    dates = []
+    values = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        batch_dates, batch_values = zip(*rows)
+        dates.append(np.array(batch_dates, dtype=np.int64))
+        # None becomes nan
+        values.append(np.array(batch_values, dtype=np.float64))
+    if not dates:
+        return np.array([], dtype="datetime64[s]"), np.array([], dtype=np.float64)
+    return parse_series(
+        np.concatenate(dates).astype("datetime64[s]"), np.concatenate(values)
+    )
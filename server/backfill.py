@@ -0,0 +1,220 @@
+import argparse
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+
+from ingest import MAX_RESULTS
+from thingspeak import ThingSpeakClient
+from utils import update_database
+
+
+def api_date(date: datetime) -> str:
+    """
+    Format date the way ThingSpeak expects it in start and end query parameters.
+    """
+    return date.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def split_range(
+    start: datetime, end: datetime, window: timedelta
+) -> list[tuple[datetime, datetime]]:
+    """
+    Split <start, end) date range into consecutive windows of given size.
+    """
+    windows = []
+    current = start
+    while current < end:
+        windows.append((current, min(current + window, end)))
+        current += window
+    return windows
+
+
+def fetch_window(
+    api: ThingSpeakClient, channel: int, start: datetime, end: datetime
+) -> dict:
+    """
+    Fetch all feeds of a channel created in <start, end) window.
+    """
+    return api.feeds(
+        channel,
+        {
+            "start": api_date(start),
+            # ThingSpeak end date is inclusive, the next window starts at this second
+            "end": api_date(end - timedelta(seconds=1)),
+            "results": MAX_RESULTS,
+        },
+    )
+
+
+def completed_windows(
+    db_conn: sqlite3.Connection, channel: int
+) -> list[tuple[datetime, datetime]]:
+    """
+    Get windows of a channel that were already written to the database by previous runs.
+    """
+    cur = db_conn.cursor()
+    cur.execute(
+        "SELECT checkpoint_start, checkpoint_end FROM backfill_checkpoint WHERE checkpoint_channel_id = ?",
+        [channel],
+    )
+    return [
+        (datetime.fromisoformat(row[0]), datetime.fromisoformat(row[1]))
+        for row in cur.fetchall()
+    ]
+
+
+def is_covered(
+    start: datetime, end: datetime, done: list[tuple[datetime, datetime]]
+) -> bool:
+    """
+    Check if <start, end) window is entirely covered by completed windows
+    (windows split because of the result cap are stored as their halves).
+    """
+    current = start
+    for done_start, done_end in sorted(done):
+        if done_start > current:
+            break
+        current = max(current, done_end)
+        if current >= end:
+            return True
+    return current >= end
+
+
+def backfill(
+    db_conn: sqlite3.Connection,
+    api: ThingSpeakClient,
+    channel: int,
+    start: datetime,
+    end: datetime,
+    window: timedelta = timedelta(days=1),
+    workers: int = 4,
+    batch_size: int = 50000,
+) -> int:
+    """
+    Fill the measurement table with channel history between start and end.
+    Windows are fetched concurrently by a bounded pool of workers and written in batched transactions.
+    Every written window is stored as a checkpoint, so an interrupted run skips it when resumed.
+    ThingSpeak caps responses at 8000 results, so full windows are split in half and fetched again.
+    Returns number of rows written.
+
+    api: ThingSpeak API client, its connection pool should fit all workers
+    window: size of the date range fetched by a single request
+    workers: maximum number of concurrent requests
+    batch_size: number of rows written in a single transaction
+    """
+    done = completed_windows(db_conn, channel)
+    windows = [
+        (window_start, window_end)
+        for window_start, window_end in split_range(start, end, window)
+        if not is_covered(window_start, window_end, done)
+    ]
+
+    written = 0
+    started_at = time.monotonic()
+    # Feeds and windows waiting for the next batched transaction
+    batch_feeds = []
+    batch_windows = []
+    channel_info = None
+
+    def flush():
+        nonlocal written, batch_feeds, batch_windows
+        if batch_feeds:
+            update_database(db_conn, {"channel": channel_info, "feeds": batch_feeds})
+        # Checkpoints are stored only after the rows of the window are committed
+        with db_conn:
+            db_conn.executemany(
+                "INSERT OR IGNORE INTO backfill_checkpoint VALUES (?, ?, ?, ?)",
+                [
+                    (channel, window_start.isoformat(), window_end.isoformat(), rows)
+                    for window_start, window_end, rows in batch_windows
+                ],
+            )
+        written += len(batch_feeds)
+        elapsed = time.monotonic() - started_at
+        print(
+            f"{written} rows written, {len(done)} windows done, {written / elapsed if elapsed else 0:.0f} rows/s"
+        )
+        batch_feeds = []
+        batch_windows = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(fetch_window, api, channel, *bounds): bounds
+            for bounds in windows
+        }
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                window_start, window_end = pending.pop(future)
+                data = future.result()
+                feeds = data["feeds"]
+                # Response was capped, so split the window and fetch both halves instead
+                if len(feeds) >= MAX_RESULTS and window_end - window_start > timedelta(
+                    seconds=1
+                ):
+                    middle = window_start + (window_end - window_start) / 2
+                    for bounds in [(window_start, middle), (middle, window_end)]:
+                        if not is_covered(*bounds, done):
+                            pending[
+                                executor.submit(fetch_window, api, channel, *bounds)
+                            ] = bounds
+                    continue
+                channel_info = data.get("channel", channel_info)
+                batch_feeds.extend(feeds)
+                batch_windows.append((window_start, window_end, len(feeds)))
+                done.append((window_start, window_end))
+                if len(batch_feeds) >= batch_size:
+                    flush()
+    flush()
+    return written
+
+
+def parse_date(value: str) -> datetime:
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill measurement history from ThingSpeak into the database."
+    )
+    parser.add_argument("dbpath", help="path to the database created by create_db.py")
+    parser.add_argument("start", type=parse_date, help="start date (ISO format)")
+    parser.add_argument(
+        "end",
+        type=parse_date,
+        nargs="?",
+        default=datetime.now(timezone.utc),
+        help="end date (ISO format), now by default",
+    )
+    parser.add_argument("--api", default="https://api.thingspeak.com")
+    parser.add_argument("--channel", type=int, default=202842)
+    parser.add_argument("--window", type=float, default=24, help="window size in hours")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.dbpath)
+    started = time.monotonic()
+    # Every worker keeps its own connection alive
+    api = ThingSpeakClient(args.api, pool_size=args.workers)
+    total = backfill(
+        db,
+        api,
+        args.channel,
+        args.start,
+        args.end,
+        timedelta(hours=args.window),
+        args.workers,
+        args.batch_size,
+    )
+    elapsed = time.monotonic() - started
+    print(
+        f"Done: {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    api.close()
+    db.close()
@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from db import ConnectionPool
+from utils import get_db_measurements, update_database
+
+NUM_ROWS = 200_000
+NUM_READERS = 4
+SCHEMA_PATH = (
+    f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/schema.sql"
+)
+JOURNAL_MODES = {
+    "rollback journal": {"journal_mode": "DELETE", "busy_timeout": 60000},
+    "WAL": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "busy_timeout": 60000,
+    },
+}
+
+
+def generate_feeds(size: int, offset: int = 0) -> dict:
+    start = datetime(2023, 1, 1)
+    return {
+        "feeds": [
+            {
+                "created_at": (start + timedelta(minutes=idx)).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+                "entry_id": idx,
+                **{f"field{field}": f"{idx % 40}.5" for field in range(1, 9)},
+            }
+            for idx in range(offset + 1, offset + size + 1)
+        ]
+    }
+
+
+def run(pragmas: dict) -> tuple[int, float, float]:
+    """
+    Run readers of the chart query while the writer upserts NUM_ROWS rows in a single update_database call.
+    Returns number of reads finished during the write, the longest read and the duration of the write.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_pool = ConnectionPool(f"{tmp_dir}/benchmark.db", pragmas)
+        with db_pool.writer() as db_conn, open(
+            SCHEMA_PATH, encoding="utf-8"
+        ) as db_schema:
+            db_conn.executescript(db_schema.read())
+            update_database(db_conn, generate_feeds(10000))
+        # Parse rows up front, so the measured write is mostly the database transaction
+        feeds = generate_feeds(NUM_ROWS, 10000)
+
+        writing = threading.Event()
+        done = threading.Event()
+        latencies = []
+
+        def reader():
+            db_conn = db_pool.acquire()
+            while not done.is_set():
+                started = time.perf_counter()
+                get_db_measurements(db_conn, 1)
+                if writing.is_set():
+                    latencies.append(time.perf_counter() - started)
+            db_pool.release(db_conn)
+
+        readers = [threading.Thread(target=reader) for _ in range(NUM_READERS)]
+        for thread in readers:
+            thread.start()
+        with db_pool.writer() as db_conn:
+            writing.set()
+            started = time.perf_counter()
+            update_database(db_conn, feeds)
+            write_time = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+        db_pool.close()
+    return len(latencies), max(latencies, default=0), write_time
+
+
+for name, pragmas in JOURNAL_MODES.items():
+    reads, longest_read, write_time = run(pragmas)
+    print(
+        f"{name:<16} | write {write_time:.2f}s | {reads} reads during write | longest read {longest_read * 1000:.1f} ms"
+    )
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from utils import (
+    EXPORT_HEADER,
+    generate_csv_chunks,
+    generate_csv_file,
+    iter_db_sensor_export,
+    update_database,
+)
+
+NUM_ROWS = 1_000_000
+MEMORY_ROWS = 200_000
+SENSORS = [1, 2]
+SCHEMA_PATH = (
+    f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/schema.sql"
+)
+
+
+def fill_database(num_rows: int) -> sqlite3.Connection:
+    db_conn = sqlite3.connect(":memory:")
+    with open(SCHEMA_PATH, encoding="utf-8") as db_schema:
+        db_conn.executescript(db_schema.read())
+    feeds = [
+        {
+            "created_at": time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1672531200 + idx * 20)
+            ),
+            "entry_id": idx,
+            "field1": f"{idx % 400 / 10 - 10:.1f}",
+            "field2": f"{idx % 1000 / 10:.1f}",
+        }
+        for idx in range(1, num_rows + 1)
+    ]
+    update_database(db_conn, {"feeds": feeds})
+    return db_conn
+
+
+def previous_export(db_conn: sqlite3.Connection):
+    """
+    Previous pipeline: rows of every sensor collected into lists of dicts, flattened and encoded by generate_csv_file.
+    """
+    result = []
+    for sensor_id in SENSORS:
+        cur = db_conn.execute(
+            f"""
+            SELECT measurement_id, strftime('%Y-%m-%dT%H:%M:%SZ', measurement_created_at, 'unixepoch'),
+                measurement_field{sensor_id}
+            FROM measurement WHERE measurement_field{sensor_id} IS NOT NULL ORDER BY measurement_created_at DESC
+            """
+        )
+        result.append(
+            [
+                {
+                    "id": entry_id,
+                    "sensor_name": f"field{sensor_id}",
+                    "timestamp": created_at,
+                    "value": value,
+                }
+                for entry_id, created_at, value in cur.fetchall()
+            ]
+        )
+    return generate_csv_file([row for rows in result for row in rows])
+
+
+def streamed_export(db_conn: sqlite3.Connection):
+    return generate_csv_chunks(iter_db_sensor_export(db_conn, SENSORS), EXPORT_HEADER)
+
+
+def measure(export, db_conn: sqlite3.Connection) -> tuple[float, int]:
+    started = time.perf_counter()
+    size = sum(len(chunk.encode()) for chunk in export(db_conn))
+    return time.perf_counter() - started, size
+
+
+def peak_memory(export, db_conn: sqlite3.Connection) -> int:
+    tracemalloc.start()
+    for _ in export(db_conn):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+db_conn = fill_database(NUM_ROWS)
+for name, export in [
+    ("generate_csv_file", previous_export),
+    ("streamed", streamed_export),
+]:
+    elapsed, size = measure(export, db_conn)
+    print(
+        f"{name}: {NUM_ROWS * len(SENSORS)} rows, {size / 1e6:.1f} MB in {elapsed:.2f} s, {size / 1e6 / elapsed:.1f} MB/s"
+    )
+
+db_conn = fill_database(MEMORY_ROWS)
+for name, export in [
+    ("generate_csv_file", previous_export),
+    ("streamed", streamed_export),
+]:
+    print(
+        f"{name}: peak memory at {MEMORY_ROWS * len(SENSORS)} rows {peak_memory(export, db_conn) / 1e6:.1f} MB"
+    )
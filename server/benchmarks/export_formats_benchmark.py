@@ -0,0 +1,112 @@
+import io
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from export import (
+    generate_columnar_chunks,
+    generate_ndjson_chunks,
+    iter_db_sensor_columns,
+    sensor_schema,
+    SENSOR_PARQUET_ENCODING,
+)
+from utils import (
+    EXPORT_HEADER,
+    generate_csv_chunks,
+    iter_db_sensor_export,
+    update_database,
+)
+
+NUM_ROWS = 500_000
+SENSORS = [1, 2]
+SCHEMA_PATH = (
+    f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/schema.sql"
+)
+
+# Measurement every 20 seconds with values similar to real sensors (daily cycle with noise, 2 decimal places)
+rng = np.random.default_rng(0)
+seconds = np.arange(NUM_ROWS) * 20
+temperature = (
+    20 + 5 * np.sin(seconds / 86400 * 2 * np.pi) + rng.normal(0, 0.3, NUM_ROWS)
+)
+humidity = 50 + 10 * np.cos(seconds / 86400 * 2 * np.pi) + rng.normal(0, 1, NUM_ROWS)
+feeds = [
+    {
+        "created_at": time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1672531200 + int(second))
+        ),
+        "entry_id": idx + 1,
+        "field1": f"{temperature[idx]:.2f}",
+        "field2": f"{humidity[idx]:.2f}",
+    }
+    for idx, second in enumerate(seconds)
+]
+db_conn = sqlite3.connect(":memory:")
+with open(SCHEMA_PATH, encoding="utf-8") as db_schema:
+    db_conn.executescript(db_schema.read())
+update_database(db_conn, {"feeds": feeds})
+
+exports = {
+    "csv": (
+        lambda: generate_csv_chunks(
+            iter_db_sensor_export(db_conn, SENSORS), EXPORT_HEADER
+        ),
+        lambda data: pd.read_csv(io.BytesIO(data)),
+    ),
+    "ndjson+gzip": (
+        lambda: generate_ndjson_chunks(
+            iter_db_sensor_export(db_conn, SENSORS), EXPORT_HEADER, "gzip"
+        ),
+        lambda data: pd.read_json(io.BytesIO(data), lines=True, compression="gzip"),
+    ),
+    "parquet": (
+        lambda: generate_columnar_chunks(
+            iter_db_sensor_columns(db_conn, SENSORS),
+            sensor_schema(pa),
+            "parquet",
+            None,
+            SENSOR_PARQUET_ENCODING,
+        ),
+        lambda data: pd.read_parquet(io.BytesIO(data)),
+    ),
+    "parquet+zstd": (
+        lambda: generate_columnar_chunks(
+            iter_db_sensor_columns(db_conn, SENSORS),
+            sensor_schema(pa),
+            "parquet",
+            "zstd",
+            SENSOR_PARQUET_ENCODING,
+        ),
+        lambda data: pd.read_parquet(io.BytesIO(data)),
+    ),
+    "arrow+zstd": (
+        lambda: generate_columnar_chunks(
+            iter_db_sensor_columns(db_conn, SENSORS), sensor_schema(pa), "arrow", "zstd"
+        ),
+        lambda data: pa.ipc.open_file(io.BytesIO(data)).read_pandas(),
+    ),
+}
+
+csv_size = None
+for name, (export, load) in exports.items():
+    started = time.perf_counter()
+    data = b"".join(
+        chunk if type(chunk) is bytes else chunk.encode() for chunk in export()
+    )
+    export_time = time.perf_counter() - started
+    started = time.perf_counter()
+    frame = load(data)
+    load_time = time.perf_counter() - started
+    csv_size = csv_size or len(data)
+    print(
+        f"{name}: {len(frame)} rows, {len(data) / 1e6:.2f} MB ({csv_size / len(data):.1f}x smaller than csv), "
+        f"export {export_time:.2f} s, load with pandas {load_time * 1000:.0f} ms"
+    )
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ai.features import create_features, prediction_grid
+
+NUM_TIMESTAMPS = 1_000_000
+# One week of minute predictions
+HORIZON = (datetime(2024, 1, 1), datetime(2024, 1, 8), timedelta(minutes=1))
+
+
+def create_features_loop(X: list[datetime], y: list[float]) -> pd.DataFrame:
+    # Previous implementation of TimeSeriesXGBoost.create_features and TimeSeriesCatBoost.create_features
+    return pd.DataFrame(
+        {
+            "value": y,
+            "hour": [val.time().hour for val in X],
+            "minute": [val.time().minute for val in X],
+            "second": [val.time().second for val in X],
+            "weekday": [val.weekday() for val in X],
+            "month": [val.month for val in X],
+        }
+    )
+
+
+def prediction_grid_loop(
+    start_date: datetime, end_date: datetime, interval: timedelta
+) -> list[datetime]:
+    # Previous loop of predict2
+    datetimes = []
+    current_date = start_date
+    while current_date <= end_date:
+        datetimes.append(current_date)
+        current_date += interval
+    return datetimes
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+# Measurement every 20 seconds
+dates = pd.date_range("2023-01-01", periods=NUM_TIMESTAMPS, freq="20s")
+values = np.random.default_rng(0).normal(20, 5, NUM_TIMESTAMPS)
+date_list = dates.to_pydatetime().tolist()
+value_list = values.tolist()
+
+old, old_time = timed(create_features_loop, date_list, value_list)
+new, new_time = timed(create_features, dates.to_numpy(), values)
+new_list, new_list_time = timed(create_features, date_list, value_list)
+assert (old[new.columns].to_numpy() == new.to_numpy()).all()
+print(f"create_features at {NUM_TIMESTAMPS} timestamps:")
+print(
+    f"  python loop          {old_time * 1000:>8.1f} ms | {old.memory_usage(deep=True).sum() / 1e6:>6.1f} MB"
+)
+print(
+    f"  vectorized (list)    {new_list_time * 1000:>8.1f} ms | {new_list.memory_usage(deep=True).sum() / 1e6:>6.1f} MB"
+)
+print(
+    f"  vectorized (array)   {new_time * 1000:>8.1f} ms | {new.memory_usage(deep=True).sum() / 1e6:>6.1f} MB"
+)
+
+old, old_time = timed(prediction_grid_loop, *HORIZON)
+new, new_time = timed(prediction_grid, *HORIZON)
+assert old == new.to_pydatetime().tolist()
+print(f"prediction grid of {len(new)} minutes:")
+print(f"  while loop           {old_time * 1000:>8.1f} ms")
+print(f"  pd.date_range        {new_time * 1000:>8.1f} ms")
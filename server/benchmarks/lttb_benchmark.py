@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from downsample import lttb
+
+NUM_POINTS = 1_000_000
+MAX_POINTS = [500, 1000, 5000]
+REPEATS = 5
+
+# Measurement every 20 seconds: daily cycle with noise and a few spikes that have to survive downsampling
+x = np.arange(NUM_POINTS, dtype=np.float64) * 20
+y = (
+    20
+    + 5 * np.sin(x / 86400 * 2 * np.pi)
+    + np.random.default_rng(0).normal(0, 0.3, NUM_POINTS)
+)
+spikes = np.random.default_rng(1).choice(NUM_POINTS, 10, replace=False)
+y[spikes] += 30
+
+for max_points in MAX_POINTS:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        selected = lttb(x, y, max_points)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    kept_spikes = np.isin(spikes, selected).sum()
+    print(
+        f"{NUM_POINTS} -> {max_points:>5} points | {best * 1000:>7.1f} ms"
+        f" | {NUM_POINTS / best / 1e6:>6.1f} M points/s | {kept_spikes}/{len(spikes)} spikes kept"
+    )
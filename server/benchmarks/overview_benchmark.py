@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from overview import CHANNEL_TITLES, OverviewState
+from utils import fetch_overview, update_database
+
+NUM_ROWS = 100_000
+BATCH_SIZE = 1000
+REPEATS = 100
+SCHEMA_PATH = (
+    f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/schema.sql"
+)
+
+# Measurement every minute with sensors reporting at different rates (so some of them miss the latest day),
+# ingested in batches, which crosses many day boundaries
+start = datetime(2023, 1, 1, 22)
+feeds = [
+    {
+        "created_at": (start + timedelta(minutes=idx)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "entry_id": idx,
+        **{
+            f"field{field}": (
+                f"{(idx * field) % 97 - 20}.25" if idx % field == 0 else None
+            )
+            for field in range(1, 8)
+        },
+        # Sensor which stopped reporting a day before the end
+        "field8": "1.5" if idx < NUM_ROWS - 2000 else None,
+    }
+    for idx in range(1, NUM_ROWS + 1)
+]
+raw_data = {"channel": CHANNEL_TITLES, "feeds": feeds}
+
+db_conn = sqlite3.connect(":memory:")
+with open(SCHEMA_PATH, encoding="utf-8") as db_schema:
+    db_conn.executescript(db_schema.read())
+for idx in range(0, NUM_ROWS, BATCH_SIZE):
+    update_database(db_conn, {"feeds": feeds[idx : idx + BATCH_SIZE]})
+
+started = time.perf_counter()
+for _ in range(REPEATS):
+    fetch_overview(raw_data)
+recompute_time = (time.perf_counter() - started) / REPEATS
+
+state = OverviewState()
+started = time.perf_counter()
+for _ in range(REPEATS):
+    state.get(db_conn)
+state_time = (time.perf_counter() - started) / REPEATS
+
+print(f"fetch_overview over {NUM_ROWS} feeds: {recompute_time * 1000:.2f} ms")
+print(f"overview state read: {state_time * 1000:.3f} ms")
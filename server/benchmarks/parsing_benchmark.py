@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ai.parsing import parse_feed
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def parse_feed_loop(json_data: list[dict], device_id: int) -> [list, list]:
+    # Previous initial_processing followed by process_data of the model wrappers
+    X = []
+    y = []
+    for entry in json_data:
+        X.append(entry["created_at"])
+        y.append(entry[f"field{device_id}"])
+    parsed_X = []
+    parsed_y = []
+    for idx, label in enumerate(y):
+        if label is not None:
+            parsed_X.append(datetime.strptime(X[idx], "%Y-%m-%dT%H:%M:%SZ"))
+            parsed_y.append(float(label))
+    return parsed_X, parsed_y
+
+
+start = datetime(2023, 1, 1)
+for size in SIZES:
+    # ThingSpeak feed with a measurement every 20 seconds, every tenth one without value
+    feeds = [
+        {
+            "created_at": (start + timedelta(seconds=20 * idx)).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            ),
+            "entry_id": idx,
+            "field1": None if idx % 10 == 0 else f"{20 + idx % 7 * 0.5}",
+        }
+        for idx in range(size)
+    ]
+
+    started = time.perf_counter()
+    old_X, old_y = parse_feed_loop(feeds, 1)
+    old_time = time.perf_counter() - started
+    started = time.perf_counter()
+    dates, values = parse_feed(feeds, 1)
+    new_time = time.perf_counter() - started
+
+    assert (dates == np.array(old_X, dtype="datetime64[s]")).all()
+    assert (values == np.array(old_y)).all()
+    print(
+        f"{size:>9} entries | loop {old_time * 1000:>8.1f} ms | vectorized {new_time * 1000:>7.1f} ms"
+        f" | {old_time / new_time:>5.1f}x"
+    )
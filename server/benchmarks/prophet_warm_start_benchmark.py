@@ -0,0 +1,93 @@
+import logging
+import os
+import sys
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ai.Prophet import TimeSeriesProphet
+
+# Parameters of the Prophet model of /sensor/<sensor_id>/predict
+PARAMS = {"growth": "linear", "n_changepoints": 25, "uncertainty_samples": 0}
+# ThingSpeak returns at most 8000 newest entries, with a measurement every minute the window slides with new data
+WINDOW = 8000
+NEW_DATA = [timedelta(hours=1), timedelta(hours=6), timedelta(days=1)]
+SEEDS = [0, 1, 2]
+REPEATS = 3
+
+logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+
+def fit(
+    dates: np.ndarray, values: np.ndarray, **kwargs
+) -> tuple[TimeSeriesProphet, float]:
+    best = None
+    for _ in range(REPEATS):
+        model = TimeSeriesProphet(**PARAMS)
+        started = time.perf_counter()
+        model.fit2(dates, values, process_data=True, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return model, best
+
+
+def measurements(seed: int) -> tuple[np.ndarray, np.ndarray]:
+    # Temperature-like series: daily cycle, wandering level and noise
+    rng = np.random.default_rng(seed)
+    size = WINDOW + int(max(NEW_DATA) / timedelta(minutes=1))
+    dates = pd.date_range("2024-01-01", periods=size, freq="1min")
+    hours = np.arange(size) / 60
+    values = (
+        20
+        + 5 * np.sin(2 * np.pi * hours / 24)
+        + np.cumsum(rng.normal(0, 0.02, size))
+        + rng.normal(0, 0.5, size)
+    )
+    return dates.to_numpy(), values
+
+
+def interval_prediction(model: TimeSeriesProphet, uncertainty_samples: int) -> float:
+    model.uncertainty_samples = uncertainty_samples
+    started = time.perf_counter()
+    model.predict2(
+        datetime.now(), datetime.now() + timedelta(days=1), timedelta(minutes=1)
+    )
+    return time.perf_counter() - started
+
+
+total_cold = total_warm = 0
+for seed in SEEDS:
+    dates, values = measurements(seed)
+    previous, _ = fit(dates[:WINDOW], values[:WINDOW])
+    for new_data in NEW_DATA:
+        shift = int(new_data / timedelta(minutes=1))
+        window = slice(shift, WINDOW + shift)
+        cold, cold_time = fit(dates[window], values[window])
+        warm, warm_time = fit(dates[window], values[window], previous=previous)
+        history = cold.history[["ds"]]
+        difference = np.abs(
+            cold.predict(history)["yhat"].to_numpy()
+            - warm.predict(history)["yhat"].to_numpy()
+        ).max()
+        total_cold += cold_time
+        total_warm += warm_time
+        print(
+            f"Series {seed}, {WINDOW} entries, +{new_data} of new data: cold fit {cold_time:.2f} s, "
+            f"warm fit {warm_time:.2f} s ({cold_time / warm_time:.2f}x), max yhat difference {difference:.4f}"
+        )
+print(
+    f"Total: cold {total_cold:.2f} s, warm {total_warm:.2f} s ({total_cold / total_warm:.2f}x)"
+)
+
+with_intervals = interval_prediction(previous, 1000)
+without_intervals = interval_prediction(previous, 0)
+print(
+    f"predict2 of one day: {with_intervals:.2f} s with uncertainty intervals, "
+    f"{without_intervals:.2f} s with uncertainty_samples=0"
+)
@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from thingspeak import ThingSpeakClient
+
+CONCURRENT_CALLS = 20
+# Latency of the fake API
+API_LATENCY = 0.2
+
+upstream_calls = 0
+upstream_lock = threading.Lock()
+
+
+class SlowApi(BaseHTTPRequestHandler):
+    def do_GET(self):
+        global upstream_calls
+        with upstream_lock:
+            upstream_calls += 1
+        time.sleep(API_LATENCY)
+        body = b'{"channel": {}, "feeds": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), SlowApi)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+api = f"http://127.0.0.1:{server.server_port}"
+
+for coalesce in [False, True]:
+    client = ThingSpeakClient(api, pool_size=CONCURRENT_CALLS, coalesce=coalesce)
+    upstream_calls = 0
+    # Burst of identical requests, e.g. dashboards of many users refreshing the overview at once
+    started = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENT_CALLS) as executor:
+        responses = list(
+            executor.map(
+                lambda _: client.feeds(202842, {"results": 8000}),
+                range(CONCURRENT_CALLS),
+            )
+        )
+    elapsed = time.perf_counter() - started
+    print(
+        f"coalesce={str(coalesce):<5} | {CONCURRENT_CALLS} calls -> {upstream_calls:>2} API requests"
+        f" | {elapsed * 1000:>6.0f} ms | coalesced: {client.stats().get('coalesced', 0)}"
+    )
+    client.close()
+
+server.shutdown()
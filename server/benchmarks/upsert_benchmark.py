@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+# Benchmarks are run from this folder, modules of the server are one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from utils import parse_update_row, update_database
+
+SIZES = [10_000, 100_000, 1_000_000]
+SCHEMA_PATH = (
+    f"{os.path.dirname(os.path.dirname(os.path.realpath(__file__)))}/schema.sql"
+)
+
+
+def legacy_update_database(db_conn: sqlite3.Connection, raw_data: dict) -> None:
+    """
+    Previous implementation of update_database: fill a temporary table, then UPDATE ... FROM and INSERT OR IGNORE.
+    """
+    data_to_insert = []
+    for feed in raw_data["feeds"]:
+        row_to_insert = parse_update_row(feed)
+        if any(value is not None for value in row_to_insert[2:]):
+            data_to_insert.append(row_to_insert)
+    with db_conn:
+        cur = db_conn.cursor()
+        cur.execute(
+            "CREATE TEMPORARY TABLE temp_table AS SELECT * FROM measurement WHERE 1=0"
+        )
+        db_conn.executemany(
+            "INSERT INTO temp_table VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            data_to_insert,
+        )
+        cur.execute(
+            f"""
+            UPDATE measurement
+            SET
+                {', '.join(
+                    f'measurement_field{idx} = COALESCE(measurement.measurement_field{idx}, temp_table.measurement_field{idx})'
+                    for idx in range(1, 9)
+                )}
+            FROM temp_table
+            WHERE measurement.measurement_id = temp_table.measurement_id
+            """
+        )
+        cur.execute("INSERT OR IGNORE INTO measurement SELECT * FROM temp_table")
+        cur.execute("DROP TABLE temp_table")
+
+
+def generate_feeds(size: int, fields: list[int]) -> dict:
+    """
+    Generate API response with size feeds, with values only for selected fields.
+    """
+    start = datetime(2023, 1, 1)
+    return {
+        "feeds": [
+            {
+                "created_at": (start + timedelta(minutes=idx)).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+                "entry_id": idx,
+                **{
+                    f"field{field}": (f"{idx % 40}.5" if field in fields else None)
+                    for field in range(1, 9)
+                },
+            }
+            for idx in range(1, size + 1)
+        ]
+    }
+
+
+def run(update_function, size: int) -> tuple[float, float, float]:
+    """
+    Measure rows per second of inserting size new rows, of merging the same rows with the remaining fields
+    and of syncing the same rows again (nothing changes).
+    """
+    inserted = generate_feeds(size, [1, 2, 3, 4])
+    merged = generate_feeds(size, [5, 6, 7, 8])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_conn = sqlite3.connect(f"{tmp_dir}/benchmark.db")
+        with open(SCHEMA_PATH, encoding="utf-8") as db_schema:
+            db_conn.executescript(db_schema.read())
+
+        started = time.perf_counter()
+        update_function(db_conn, inserted)
+        insert_rate = size / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        update_function(db_conn, merged)
+        merge_rate = size / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        update_function(db_conn, merged)
+        resync_rate = size / (time.perf_counter() - started)
+        db_conn.close()
+    return insert_rate, merge_rate, resync_rate
+
+
+for size in SIZES:
+    for name, update_function in [
+        ("temp table", legacy_update_database),
+        ("upsert", update_database),
+    ]:
+        insert_rate, merge_rate, resync_rate = run(update_function, size)
+        print(
+            f"{size:>9} rows | {name:<10} | insert {insert_rate:>9.0f} rows/s"
+            f" | merge {merge_rate:>9.0f} rows/s | resync {resync_rate:>9.0f} rows/s"
+        )
@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Hashable, Iterable, Iterator
+
+
+class DataVersion:
+    """
+    Version of the measurements, stored in the DATA_VERSION table and incremented by update_database in the
+    transaction changing rows of the measurements. Responses built from the database are cached under the version
+    they were built from, so new data never hits an old entry, whichever process wrote it (every worker of
+    the server runs its own poller, the backfill runs separately).
+    """
+
+    @staticmethod
+    def get(db_conn: sqlite3.Connection) -> int:
+        return db_conn.execute("SELECT version_value FROM data_version").fetchone()[0]
+
+    @staticmethod
+    def bump(db_conn: sqlite3.Connection) -> None:
+        """
+        Increment the version. Does not commit, it is meant to run inside the transaction writing measurements.
+        """
+        db_conn.execute("UPDATE data_version SET version_value = version_value + 1")
+
+
+data_version = DataVersion()
+
+
+def body_etag(body: bytes) -> str:
+    """
+    Strong ETag (without quotes) of a response body.
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses with time to live. Keys should contain the route, its parameters and
+    the data version, values are response bodies with their headers. The cache is bounded both by the number
+    of entries and by the total size of bodies, least recently used entries are evicted first.
+
+    max_entries: maximum number of cached responses
+    max_bytes: maximum total size (in bytes) of cached bodies
+    ttl: time (in seconds) an entry is served for
+    max_entry_bytes: larger responses are not cached
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300,
+        max_entry_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        # key -> (body, headers, expires at)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: Hashable) -> tuple[bytes, dict] | None:
+        """
+        Body and headers of a cached response, None if the key is not cached (or has expired).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def set(self, key: Hashable, body: bytes, headers: dict | None = None) -> bool:
+        """
+        Cache a response. Returns False if it is too large to be cached.
+        """
+        if len(body) > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (
+                body,
+                dict(headers or {}),
+                time.monotonic() + self.ttl,
+            )
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def stream(
+        self,
+        key: Hashable,
+        chunks: Iterable[bytes | str],
+        headers: dict | None = None,
+    ) -> Iterator[bytes | str]:
+        """
+        Pass chunks of a streamed response through and cache the whole body once the stream is complete.
+        Collecting stops as soon as the body is too large to be cached, streams closed early
+        (the client disconnected) are not cached. Text chunks are cached encoded as UTF-8.
+        """
+        collected = []
+        size = 0
+        for chunk in chunks:
+            if collected is not None:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    collected = None
+                else:
+                    collected.append(chunk)
+            yield chunk
+        if collected is not None:
+            self.set(key, b"".join(collected), headers)
+
+    def stats(self) -> dict:
+        """
+        Hits, misses, evictions (to stay within bounds) and expired entries, with the current size.
+        """
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._size}
+
+    def _remove(self, key: Hashable) -> None:
+        body, _, _ = self._entries.pop(key)
+        self._size -= len(body)
@@ -0,0 +1,59 @@
+import zlib
+
+from typing import Iterable, Iterator
+
+try:
+    # Brotli is optional, without it responses are compressed only with gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing, binary exports are compressed by their own format
+COMPRESSIBLE_TYPES = {"application/json", "text/csv"}
+
+
+def supported_encodings() -> list[str]:
+    """
+    Content encodings the server can produce, in order of preference.
+    """
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def _compressor(encoding: str, level: int):
+    if encoding == "br":
+        # Brotli quality is 0-11, gzip level 0-9, scale the level so both have a similar speed
+        return brotli.Compressor(quality=min(round(level * 11 / 9), 11))
+    # wbits=31 writes gzip header and trailer
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def compress_body(body: bytes, encoding: str, level: int = 6) -> bytes:
+    """
+    Compress the whole body of a response.
+
+    encoding: "br" or "gzip"
+    level: gzip compression level, for brotli it is scaled to a quality with a similar speed
+    """
+    compressor = _compressor(encoding, level)
+    if encoding == "br":
+        return compressor.process(body) + compressor.finish()
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_stream(
+    chunks: Iterable[bytes], encoding: str, level: int = 6
+) -> Iterator[bytes]:
+    """
+    Compress a streamed response chunk by chunk, so it is never built in memory.
+    Compressors buffer input, chunks are yielded once they have enough data to emit.
+
+    encoding: "br" or "gzip"
+    level: gzip compression level, for brotli it is scaled to a quality with a similar speed
+    """
+    compressor = _compressor(encoding, level)
+    compress = compressor.process if encoding == "br" else compressor.compress
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish() if encoding == "br" else compressor.flush()
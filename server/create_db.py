@@ -2,14 +2,34 @@ import os
 import sqlite3
 import sys
 
+from migrate import needs_typed_storage_migration, migrate_typed_storage
+from overview import rebuild_overview_state
+from utils import check_query_plans, update_rollups
+
 def init_db():
     if len(sys.argv) < 2:
         print("No dbpath provided!")
         return
     db = sqlite3.connect(sys.argv[1])
+    # Existing databases with TEXT measurements have to be converted before the schema is applied
+    if needs_typed_storage_migration(db):
+        migrate_typed_storage(db)
     with open(f"{os.path.dirname(os.path.realpath(__file__))}/schema.sql", encoding="utf-8") as db_schema:
         db.cursor().executescript(db_schema.read())
     db.commit()
+    # Databases filled before rollups were introduced have to be aggregated once
+    if db.execute("SELECT 1 FROM measurement_rollup LIMIT 1").fetchone() is None:
+        start, end = db.execute(
+            "SELECT MIN(measurement_created_at), MAX(measurement_created_at) FROM measurement"
+        ).fetchone()
+        if start is not None:
+            update_rollups(db, start, end)
+            db.commit()
+    if db.execute("SELECT 1 FROM overview_state LIMIT 1").fetchone() is None:
+        rebuild_overview_state(db)
+    # Make sure measurement queries are served by the indexes from the schema
+    for problem in check_query_plans(db):
+        print(f"Query plan check failed: {problem}")
     db.close()
 
 if __name__ == "__main__":
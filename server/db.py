@@ -0,0 +1,80 @@
+import queue
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    Pool of sqlite connections. Reader connections are reused between requests instead of opening a new connection
+    for every request, and all writes go through a single writer connection guarded by a lock, so writers never
+    compete for the database lock. With WAL journal mode readers keep working while the writer commits.
+
+    db_path: path to the sqlite database
+    pragmas: pragmas applied to every new connection, e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"}
+    max_idle: maximum number of idle reader connections kept open
+    """
+
+    def __init__(self, db_path: str, pragmas: dict | None = None, max_idle: int = 8):
+        self.db_path = db_path
+        self.pragmas = pragmas or {}
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._writer = None
+        self._writer_lock = threading.RLock()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection with configured pragmas.
+        """
+        # Connections are handed between worker threads, but only one thread uses a connection at a time
+        db_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        db_conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            db_conn.execute(f"PRAGMA {pragma} = {value}")
+        return db_conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Get an idle reader connection, or open a new one if there is none.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, db_conn: sqlite3.Connection) -> None:
+        """
+        Return reader connection to the pool. Connections above the idle limit are closed.
+        """
+        # Never put a connection with unfinished transaction back into the pool
+        if db_conn.in_transaction:
+            db_conn.rollback()
+        try:
+            self._idle.put_nowait(db_conn)
+        except queue.Full:
+            db_conn.close()
+
+    @contextmanager
+    def writer(self):
+        """
+        Get the writer connection. The lock is held until the block ends, so there is always one writer.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+            yield self._writer
+
+    def close(self) -> None:
+        """
+        Close all idle connections and the writer connection.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
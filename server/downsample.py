@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling, returns indices of the points to keep.
+    The first and the last point are always kept, the remaining points are split into max_points - 2 buckets and
+    from every bucket the point forming the largest triangle with the point selected from the previous bucket
+    and the average of the next bucket is picked, which preserves peaks and troughs of the series.
+    Averages of all buckets and the triangle areas inside a bucket are computed with NumPy, only the walk over
+    buckets (which depends on the previously selected point) is a Python loop.
+    More about the algorithm: https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+
+    x: x values of the series (e.g. epoch seconds), sorted
+    y: y values of the series
+    max_points: number of points to keep, at least 3 (the ends of the series and a bucket between them)
+    """
+    if max_points < 3:
+        raise ValueError("max_points has to be at least 3")
+    size = len(x)
+    if max_points >= size:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket boundaries of points between the first and the last one
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+    # Average point of every bucket, with the last point as the "bucket" after the last one
+    counts = np.diff(edges)
+    x_sums = np.add.reduceat(x[: edges[-1]], edges[:-1])
+    y_sums = np.add.reduceat(y[: edges[-1]], edges[:-1])
+    x_avg = np.append(x_sums / counts, x[-1])
+    y_avg = np.append(y_sums / counts, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Doubled triangle area for every point of the bucket (the constant factor does not change the argmax)
+        areas = np.abs(
+            (x[previous] - x_avg[bucket + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (y_avg[bucket + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_series(series: list[dict], max_points: int) -> list[dict]:
+    """
+    Downsample output of convert_sensor_data (or get_db_rollups) to at most max_points points using LTTB.
+    Order of the points is preserved (series from the database are sorted newest first, which works the same way).
+
+    series: list of points with "timestamp" and "value" keys
+    """
+    if len(series) <= max_points:
+        return series
+    # Timestamps are in ThingSpeak format (2023-01-01T00:00:00Z), NumPy parses them without the timezone suffix
+    timestamps = np.array(
+        [point["timestamp"].rstrip("Z") for point in series], dtype="datetime64[s]"
+    ).astype(np.float64)
+    values = np.fromiter(
+        (point["value"] for point in series), dtype=np.float64, count=len(series)
+    )
+    selected = lttb(timestamps, values, max_points)
+    return [series[idx] for idx in selected]
+
+
+def downsample_arrays(
+    ids: np.ndarray,
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    max_points: int,
+    sensor_name: str,
+) -> list[dict]:
+    """
+    Downsample a series read into arrays (see get_db_measurement_arrays) to at most max_points points using LTTB.
+    Only the kept points are converted into the format of convert_sensor_data, so the cost of building
+    the response does not depend on the number of rows read.
+
+    ids: entry ids of the points
+    timestamps: epoch seconds of the points
+    values: values of the points
+    sensor_name: name of the field of the sensor (e.g. field1)
+    """
+    selected = lttb(timestamps, values, max_points)
+    dates = np.datetime_as_string(
+        timestamps[selected].astype(np.int64).astype("datetime64[s]")
+    )
+    return [
+        {
+            "id": int(ids[idx]),
+            "sensor_name": sensor_name,
+            "timestamp": f"{date}Z",
+            "value": float(values[idx]),
+        }
+        for idx, date in zip(selected, dates)
+    ]
@@ -0,0 +1,217 @@
+import gzip
+import io
+import json
+import sqlite3
+
+from typing import Iterable, Iterator
+
+from utils import measurements_query
+
+# Formats of /export/export.<format> other than csv
+EXPORT_FORMATS = ["ndjson", "parquet", "arrow"]
+# Compressions supported by every format, Arrow IPC compresses buffers only with zstd (or lz4)
+EXPORT_COMPRESSIONS = {
+    "ndjson": ["gzip", "zstd"],
+    "parquet": ["gzip", "zstd"],
+    "arrow": ["zstd"],
+}
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file collecting written bytes until they are drained, so files written by gzip or pyarrow
+    can be streamed in chunks instead of being built in memory.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def import_pyarrow():
+    """
+    pyarrow is an optional dependency, required only for zstd and the binary formats.
+    Raises ValueError with installation hint if it is missing.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("This export requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def iter_db_sensor_columns(
+    db_conn: sqlite3.Connection,
+    sensor_ids: list[int],
+    start_date: str | None = None,
+    end_date: str | None = None,
+    batch_size: int = 65536,
+) -> Iterator[tuple]:
+    """
+    Read measurements of the sensors for export in batches of columns (id, sensor_name, timestamp, value),
+    sensor after sensor. Timestamps are epoch seconds. Empty batches are never yielded.
+
+    sensor_ids: exported sensors
+    start_date: start of the range in ThingSpeak format, applied together with end_date
+    end_date: end of the range in ThingSpeak format, applied together with start_date
+    batch_size: number of rows in a batch, for parquet every batch is a row group
+    """
+    for sensor_id in sensor_ids:
+        sensor_id = int(sensor_id)
+        query, params = measurements_query(
+            sensor_id,
+            -1,
+            start_date,
+            end_date,
+            columns=f"measurement_id, 'field{sensor_id}', measurement_created_at, measurement_field{sensor_id}",
+        )
+        cur = db_conn.execute(query, params)
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            yield tuple(zip(*batch))
+
+
+def generate_ndjson_chunks(
+    batches: Iterable[list[tuple]],
+    header: list[str],
+    compression: str | None = None,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """
+    Encode rows as JSON objects, one per line, and yield them in chunks of about chunk_size bytes
+    (before compression).
+
+    batches: iterable of lists of rows, in the same format as for generate_csv_chunks
+    header: keys of the objects
+    compression: None, "gzip" or "zstd"
+    """
+    sink = ChunkSink()
+    if compression == "gzip":
+        # Level 9 (the default of gzip module) is twice as slow for a few percent smaller files
+        stream = gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=6)
+    elif compression == "zstd":
+        stream = import_pyarrow().CompressedOutputStream(sink, "zstd")
+    else:
+        stream = sink
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    buffer = []
+    size = 0
+    for batch in batches:
+        lines = "".join(
+            [f"{encode(dict(zip(header, row)))}\n" for row in batch]
+        ).encode()
+        buffer.append(lines)
+        size += len(lines)
+        if size >= chunk_size:
+            stream.write(b"".join(buffer))
+            stream.flush()
+            buffer = []
+            size = 0
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    stream.write(b"".join(buffer))
+    if stream is not sink:
+        stream.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+# Ids and timestamps of sensor exports grow steadily, so deltas between rows take a few bits instead of 8 bytes
+# (dictionary encoding, the default, does not help for unique values)
+SENSOR_PARQUET_ENCODING = {
+    "id": "DELTA_BINARY_PACKED",
+    "timestamp": "DELTA_BINARY_PACKED",
+}
+
+
+def sensor_schema(pa):
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("sensor_name", pa.string()),
+            ("timestamp", pa.timestamp("s", tz="UTC")),
+            ("value", pa.float64()),
+        ]
+    )
+
+
+def overview_schema(pa):
+    return pa.schema(
+        [
+            ("title", pa.string()),
+            ("value", pa.float64()),
+            ("min", pa.float64()),
+            ("max", pa.float64()),
+        ]
+    )
+
+
+def generate_columnar_chunks(
+    batches: Iterable[tuple],
+    schema,
+    export_format: str,
+    compression: str | None = None,
+    parquet_encoding: dict | None = None,
+) -> Iterator[bytes]:
+    """
+    Write batches of columns as a Parquet or Arrow IPC file and yield the file in chunks, one per batch.
+    Parquet files are encoded and compressed per column, so they are a lot smaller than csv.
+
+    batches: iterable of tuples of columns, in the order of schema
+    schema: pyarrow schema of the file (e.g. sensor_schema(pa))
+    export_format: "parquet" or "arrow"
+    compression: None, "gzip" (parquet only) or "zstd"
+    parquet_encoding: encodings of parquet columns (e.g. SENSOR_PARQUET_ENCODING), other columns are
+    dictionary encoded
+    """
+    pa = import_pyarrow()
+    sink = ChunkSink()
+    if export_format == "parquet":
+        parquet_encoding = parquet_encoding or {}
+        writer = pa.parquet.ParquetWriter(
+            sink,
+            schema,
+            compression=compression or "none",
+            use_dictionary=[
+                name for name in schema.names if name not in parquet_encoding
+            ],
+            column_encoding=parquet_encoding or None,
+        )
+    else:
+        writer = pa.ipc.new_file(
+            sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+        )
+    for columns in batches:
+        writer.write_batch(pa.record_batch(list(columns), schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,228 @@
+import sqlite3
+import threading
+import time
+
+import requests
+
+from db import ConnectionPool
+from thingspeak import ThingSpeakClient
+from utils import update_database, get_sync_cursor, set_sync_cursor
+
+# ThingSpeak returns at most this many entries per request
+MAX_RESULTS = 8000
+
+
+def sync_channel(
+    db_pool: ConnectionPool,
+    api: ThingSpeakClient,
+    channel: int,
+    page_size: int = MAX_RESULTS,
+) -> int:
+    """
+    Fetch only the entries newer than the channel's sync cursor and upsert them into the database.
+    If a page is full, older pages are requested (moving the end date backwards) until the cursor is reached,
+    so the cost depends on the number of new entries rather than the size of the window.
+    The writer connection is held only while writing, not while waiting for the API.
+    Returns number of new entries written.
+
+    db_pool: connection pool, entries are written through its writer connection
+    api: ThingSpeak API client
+    channel: id of the ThingSpeak channel
+    page_size: number of results requested per page
+    """
+    with db_pool.writer() as db_conn:
+        cursor = get_sync_cursor(db_conn, channel)
+    params = {"results": page_size}
+    if cursor is not None:
+        # ThingSpeak expects dates as YYYY-MM-DD HH:NN:SS, start is inclusive
+        params["start"] = cursor[1].replace("T", " ").replace("Z", "")
+
+    newest = None
+    # Lowest entry id written so far, entries sharing the boundary second are re-sent by the next page
+    oldest_id = None
+    written = 0
+    while True:
+        data = api.feeds(channel, params)
+        feeds = data["feeds"]
+        delta = [
+            feed
+            for feed in feeds
+            if (cursor is None or feed["entry_id"] > cursor[0])
+            and (oldest_id is None or feed["entry_id"] < oldest_id)
+        ]
+        if not delta:
+            break
+        with db_pool.writer() as db_conn:
+            update_database(db_conn, {**data, "feeds": delta})
+        written += len(delta)
+        if newest is None:
+            newest = max(delta, key=lambda feed: feed["entry_id"])
+        oldest_id = min(feed["entry_id"] for feed in delta)
+        # Page was not full, so everything newer than the cursor was returned
+        if len(feeds) < page_size or cursor is None:
+            break
+        params["end"] = feeds[0]["created_at"].replace("T", " ").replace("Z", "")
+
+    if newest is not None:
+        with db_pool.writer() as db_conn:
+            set_sync_cursor(db_conn, channel, newest["entry_id"], newest["created_at"])
+    return written
+
+
+class IngestionPoller(threading.Thread):
+    """
+    Background thread that polls ThingSpeak channels on a schedule and writes new feeds into the database,
+    so request handlers can serve data from the local store without contacting the API on every page load.
+
+    The measurement table holds rows of a single channel (they are keyed by entry id only), so rows of several
+    channels would overwrite each other, the schedule is limited to one channel.
+
+    api: ThingSpeak API client
+    db_pool: connection pool, feeds are written through its writer connection
+    schedule: mapping of channel id to polling interval (in seconds) for that channel
+    """
+
+    def __init__(
+        self, api: ThingSpeakClient, db_pool: ConnectionPool, schedule: dict[int, float]
+    ):
+        if len(schedule) != 1:
+            raise ValueError(
+                f"Measurements of exactly one channel can be stored, the schedule has {len(schedule)} channels"
+            )
+        super().__init__(name="ingestion-poller", daemon=True)
+        self.api = api
+        self.db_pool = db_pool
+        self.schedule = dict(schedule)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # Polling state for every channel, exposed through health()
+        self._status = {
+            channel: {
+                "interval": interval,
+                "next_poll": 0.0,
+                "last_attempt": None,
+                "last_success": None,
+                "last_error": None,
+                "polls": 0,
+                "failures": 0,
+                "new_rows": 0,
+            }
+            for channel, interval in self.schedule.items()
+        }
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Ask the poller to stop and wait for the current poll to finish.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            for channel in self.schedule:
+                if self._status[channel]["next_poll"] <= now:
+                    self.poll(channel)
+                    self._status[channel]["next_poll"] = (
+                        time.monotonic() + self.schedule[channel]
+                    )
+            # Sleep until the earliest scheduled poll (or until stop() is called)
+            next_poll = min(status["next_poll"] for status in self._status.values())
+            self._stop_event.wait(max(next_poll - time.monotonic(), 0))
+
+    def poll(self, channel: int) -> None:
+        """
+        Fetch feeds of a channel newer than its sync cursor and write them through update_database.
+        Errors are recorded in the channel status instead of stopping the thread.
+        """
+        with self._lock:
+            self._status[channel]["last_attempt"] = time.time()
+            self._status[channel]["polls"] += 1
+        try:
+            new_rows = sync_channel(self.db_pool, self.api, channel)
+            with self._lock:
+                self._status[channel]["new_rows"] = new_rows
+                self._status[channel]["last_success"] = time.time()
+                self._status[channel]["last_error"] = None
+        except (requests.exceptions.RequestException, ValueError, sqlite3.Error) as err:
+            with self._lock:
+                self._status[channel]["failures"] += 1
+                self._status[channel]["last_error"] = str(err)
+
+    def seconds_since_success(self, channel: int) -> float | None:
+        """
+        Time since the channel was last polled successfully, None if it was not polled successfully yet.
+        """
+        with self._lock:
+            last_success = self._status.get(channel, {}).get("last_success")
+        return time.time() - last_success if last_success is not None else None
+
+    def health(self, db_conn: sqlite3.Connection | None = None) -> dict:
+        """
+        Summary of the polling state. A channel is healthy if it was successfully polled within two intervals.
+        If a database connection is provided, the age of the newest stored measurement is reported as data lag.
+
+        db_conn: optional connection used to read the newest measurement timestamp
+        """
+        now = time.time()
+        channels = {}
+        with self._lock:
+            for channel, status in self._status.items():
+                since_success = (
+                    now - status["last_success"]
+                    if status["last_success"] is not None
+                    else None
+                )
+                channels[channel] = {
+                    "interval": status["interval"],
+                    "polls": status["polls"],
+                    "failures": status["failures"],
+                    "new_rows": status["new_rows"],
+                    "last_error": status["last_error"],
+                    "seconds_since_success": since_success,
+                    "healthy": since_success is not None
+                    and since_success <= 2 * status["interval"],
+                }
+
+        data_lag = None
+        if db_conn is not None:
+            latest = db_conn.execute(
+                "SELECT MAX(measurement_created_at) FROM measurement"
+            ).fetchone()[0]
+            if latest is not None:
+                # Dates are stored as epoch seconds
+                data_lag = now - latest
+
+        return {
+            "running": self.is_alive(),
+            "healthy": self.is_alive()
+            and all(channel["healthy"] for channel in channels.values()),
+            "data_lag": data_lag,
+            "channels": channels,
+        }
+
+
+def start_ingestion(
+    api: ThingSpeakClient,
+    db_pool: ConnectionPool,
+    channel: int,
+    interval: float,
+    schedule: dict | None = None,
+) -> IngestionPoller:
+    """
+    Create and start the ingestion poller. If no schedule is provided, only the default channel is polled.
+    Raises ValueError if the schedule polls another channel than the default one, routes serve the stored
+    measurements as data of the default channel.
+
+    interval: default polling interval in seconds
+    schedule: optional mapping of channel id to polling interval, overriding the default interval
+    """
+    schedule = schedule or {channel: interval}
+    if set(schedule) != {channel}:
+        raise ValueError(
+            f"Only channel {channel} can be polled, the schedule has channels {sorted(schedule)}"
+        )
+    poller = IngestionPoller(api, db_pool, schedule)
+    poller.start()
+    return poller
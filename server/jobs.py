@@ -0,0 +1,222 @@
+import multiprocessing
+import threading
+import time
+import uuid
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Hashable
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the maximum number of jobs is already waiting or running.
+    """
+
+
+def _run(function: Callable, args: tuple) -> tuple[float, float, Any]:
+    # Runs in a worker process, times are wall clock, so they can be compared with the server process
+    started = time.time()
+    result = function(*args)
+    return started, time.time(), result
+
+
+class JobQueue:
+    """
+    Queue of jobs run in a pool of worker processes, so long CPU-bound work (like training a model) neither ties
+    up request workers nor competes with them for the GIL. Clients submit a job, get its id and ask for
+    its state until it is finished.
+    - Identical jobs (same key) waiting or running at the same time are submitted once, clients share the job.
+    - At most max_pending jobs are waiting or running, submitting more raises QueueFullError.
+    - Waiting jobs can be cancelled. Running jobs cannot be interrupted, so they cannot be cancelled either.
+    - Finished jobs are kept for keep_finished seconds, so their result can be read.
+
+    max_workers: number of worker processes
+    max_pending: maximum number of waiting and running jobs
+    keep_finished: time (in seconds) finished jobs are kept for
+    initializer: function run once in every worker process (e.g. to set up caches), with initargs
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 16,
+        keep_finished: float = 600,
+        initializer: Callable | None = None,
+        initargs: tuple = (),
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = self._create_executor()
+        # job id -> job state
+        self._jobs = {}
+        # key -> id of the job that is waiting or running
+        self._keys = {}
+        # Reentrant, cancelling a future runs its done callback (_finish) in the same thread
+        self._lock = threading.RLock()
+        self.stats = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "done": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Worker processes are spawned (not forked), forking a process with running threads
+        # (poller, write queue) can copy locks held by them
+        return ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    def submit(self, key: Hashable, function: Callable, *args) -> tuple[str, bool]:
+        """
+        Submit a job running function(*args) in a worker process, function and arguments have to be picklable.
+        Returns id of the job and whether it was created (False if an identical job was already waiting
+        or running). Raises QueueFullError if too many jobs are waiting or running.
+        """
+        with self._lock:
+            self._purge()
+            job_id = self._keys.get(key)
+            if job_id is not None:
+                self.stats["deduplicated"] += 1
+                return job_id, False
+            if len(self._keys) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFullError(
+                    f"{len(self._keys)} jobs are already waiting or running"
+                )
+            job_id = uuid.uuid4().hex
+            submitted_at = time.time()
+            try:
+                future = self._executor.submit(_run, function, args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for using too much memory), the pool cannot be used anymore
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+                future = self._executor.submit(_run, function, args)
+            self._jobs[job_id] = {
+                "key": key,
+                "future": future,
+                "status": self.QUEUED,
+                "submitted_at": submitted_at,
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._keys[key] = job_id
+            self.stats["submitted"] += 1
+        future.add_done_callback(lambda future: self._finish(job_id, future))
+        return job_id, True
+
+    def find(self, key: Hashable) -> str | None:
+        """
+        Id of the job with the key that is waiting or running, None if there is none.
+        Lets clients skip preparing arguments of a job that would be deduplicated, found jobs count as such.
+        """
+        with self._lock:
+            job_id = self._keys.get(key)
+            if job_id is not None:
+                self.stats["deduplicated"] += 1
+            return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """
+        State of the job: status, result (if done), error (if failed) and timing in seconds (time spent waiting
+        for a worker, running and in total), None if there is no such job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = job["status"]
+            if status == self.QUEUED and job["future"].running():
+                status = self.RUNNING
+            now = time.time()
+            submitted, started, finished = (
+                job["submitted_at"],
+                job["started_at"],
+                job["finished_at"],
+            )
+            return {
+                "id": job_id,
+                "status": status,
+                "result": job["result"],
+                "error": job["error"],
+                "timing": {
+                    "queued": (started or finished or now) - submitted,
+                    "running": finished - started if started and finished else None,
+                    "total": (finished or now) - submitted,
+                },
+            }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel the job. Returns False if there is no such job, or it is already running or finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != self.QUEUED:
+                return False
+            # Set before cancelling the future, so _finish (run by cancel()) leaves the job alone
+            job["status"] = self.CANCELLED
+            if not job["future"].cancel():
+                # The job is running (or has just finished), it keeps counting against max_pending until _finish
+                job["status"] = self.QUEUED
+                return False
+            job["finished_at"] = time.time()
+            self._keys.pop(job["key"], None)
+            self.stats["cancelled"] += 1
+            return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Jobs cancelled by cancel() are already finished
+            if job is None or job["status"] == self.CANCELLED:
+                return
+            if self._keys.get(job["key"]) == job_id:
+                del self._keys[job["key"]]
+            job["finished_at"] = time.time()
+            if future.cancelled():
+                # Not cancelled by cancel(), the pool was broken and replaced, which cancels its waiting jobs
+                job["status"] = self.FAILED
+                job["error"] = "worker pool restarted"
+                self.stats["failed"] += 1
+                return
+            error = future.exception()
+            if error is not None:
+                job["status"] = self.FAILED
+                job["error"] = str(error) or type(error).__name__
+                self.stats["failed"] += 1
+                return
+            job["started_at"], job["finished_at"], job["result"] = future.result()
+            job["status"] = self.DONE
+            self.stats["done"] += 1
+
+    def _purge(self) -> None:
+        expired = time.time() - self.keep_finished
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < expired
+        ]:
+            del self._jobs[job_id]
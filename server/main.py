@@ -1,8 +1,12 @@
 from flask import Flask, jsonify, g, request
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
+from itertools import chain
 
+import json
+import os
 import requests
-import sqlite3
+import time
 
 from flask_jwt_extended import (
     create_access_token,
@@ -19,16 +23,48 @@ from utils import (
     user_exists,
     fetch_overview,
     convert_sensor_data,
-    flatten,
+    generate_csv_chunks,
     generate_csv_file,
-    update_database,
+    iter_db_sensor_export,
+    EXPORT_HEADER,
     get_db_measurements,
+    get_db_measurement_arrays,
+    get_db_rollups,
+    pick_resolution,
+    to_epoch,
+    to_number,
+    ROLLUP_RESOLUTIONS,
 )
 
-from ai.CatBoost import TimeSeriesCatBoost
-from ai.KNN import TimeSeriesKNN
-from ai.Prophet import TimeSeriesProphet
-from ai.XGBoost import TimeSeriesXGBoost
+from cache import body_etag, data_version, ResponseCache
+from compress import (
+    compress_body,
+    compress_stream,
+    supported_encodings,
+    COMPRESSIBLE_TYPES,
+)
+from db import ConnectionPool
+from downsample import downsample_arrays, downsample_series
+from export import (
+    generate_columnar_chunks,
+    generate_ndjson_chunks,
+    import_pyarrow,
+    iter_db_sensor_columns,
+    overview_schema,
+    sensor_schema,
+    EXPORT_COMPRESSIONS,
+    EXPORT_CONTENT_TYPES,
+    EXPORT_FORMATS,
+    SENSOR_PARQUET_ENCODING,
+)
+from ingest import start_ingestion
+from jobs import JobQueue, QueueFullError
+from overview import overview_state
+from revalidate import Revalidator
+from predict import init_worker, run_prediction, PREDICT_MODELS
+from ai.parsing import parse_feed
+from thingspeak import CircuitBreaker, fan_out, ThingSpeakClient
+from write_queue import WriteBehindQueue
 
 app = Flask(__name__)
 app.config["API"] = "https://api.thingspeak.com"
@@ -40,14 +76,151 @@ app.config["SECRET_KEY"] = "asdasdasd"
 app.config["JWT_TOKEN_LOCATION"] = ["cookies"]
 # How long should the jwt token be valid for
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
+# Poll ThingSpeak in a background thread and serve /overview and /sensor only from the database
+app.config["INGEST_ENABLED"] = True
+# Default polling interval (in seconds) for the configured channel
+app.config["INGEST_INTERVAL"] = 60
+# Optional schedule ({channel: interval}) overriding the default interval. The database stores measurements of
+# a single channel, so the schedule can only contain CHANNEL
+app.config["INGEST_SCHEDULE"] = None
+# Pragmas applied to every database connection. WAL lets readers work while the writer commits,
+# NORMAL synchronous is safe with WAL, mmap_size is in bytes, negative cache_size is in KiB
+app.config["DB_PRAGMAS"] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "busy_timeout": 5000,
+}
+# Maximum number of idle reader connections kept in the pool
+app.config["DB_POOL_SIZE"] = 8
+# Rows fetched by request handlers are written in batches every WRITE_FLUSH_INTERVAL seconds,
+# or as soon as WRITE_FLUSH_ROWS rows are waiting. Pending rows are written on exit and on SIGTERM,
+# a killed process (SIGKILL) loses up to that much fetched data
+app.config["WRITE_FLUSH_INTERVAL"] = 0.5
+app.config["WRITE_FLUSH_ROWS"] = 5000
+# Maximum number of points returned for a chart when a range is requested (picks the rollup resolution)
+app.config["CHART_MAX_POINTS"] = 1000
+# Maximum number of measurements read from the database for a chart downsampled with ?max_points=
+app.config["CHART_RAW_LIMIT"] = 1_000_000
+# Maximum number of concurrent API requests of exports (one request per sensor)
+app.config["API_FANOUT_WORKERS"] = 4
+# Exports of at least this many sensors fetch all fields with a single feeds.json request instead
+app.config["EXPORT_FEEDS_THRESHOLD"] = 4
+# Deadline (in seconds) of every sensor of an export fetched from the API, a slower sensor is skipped.
+# Requests of sensors are not retried, a retry would not fit into the deadline
+app.config["API_FANOUT_TIMEOUT"] = 10
+# Connect and read timeouts (in seconds) of every API call
+app.config["API_TIMEOUT"] = (3.05, 15)
+# Failed API calls (connection errors, timeouts, 429 and 5xx responses) are retried this many times
+app.config["API_RETRIES"] = 2
+# Base delay (in seconds) between retries, doubled with every retry and randomized
+app.config["API_BACKOFF"] = 0.5
+# Circuit breaker: after API_BREAKER_FAILURES consecutive failed calls (or calls slower than API_BREAKER_SLOW_CALL
+# seconds) the API is not called for API_BREAKER_RESET seconds, routes serve data from the database instead
+app.config["API_BREAKER_FAILURES"] = 5
+app.config["API_BREAKER_SLOW_CALL"] = 5.0
+app.config["API_BREAKER_RESET"] = 30.0
+# Identical API calls made at the same time (same url and parameters) share a single request
+app.config["API_COALESCE"] = True
+# With ingestion disabled, data fetched by a route is served from the database for SWR_MAX_AGE seconds,
+# and for up to SWR_MAX_STALE seconds while it is refreshed in the background
+app.config["SWR_MAX_AGE"] = 60
+app.config["SWR_MAX_STALE"] = 3600
+# Responses of /overview, /sensor and database exports are cached until new data is written by any process
+# (or for at most RESPONSE_CACHE_TTL seconds), the cache holds at most
+# RESPONSE_CACHE_ENTRIES responses and RESPONSE_CACHE_BYTES bytes, larger responses are not cached
+app.config["RESPONSE_CACHE_TTL"] = 300
+app.config["RESPONSE_CACHE_ENTRIES"] = 256
+app.config["RESPONSE_CACHE_BYTES"] = 64 * 1024 * 1024
+app.config["RESPONSE_CACHE_MAX_ENTRY_BYTES"] = 8 * 1024 * 1024
+# JSON and csv responses of at least COMPRESS_MIN_SIZE bytes (and all streamed ones) are compressed with brotli
+# (if installed) or gzip when the client accepts it, COMPRESS_LEVEL is the gzip level (0-9)
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_LEVEL"] = 6
+# Predictions are trained in PREDICT_WORKERS worker processes, at most PREDICT_MAX_PENDING predictions wait or run
+# at a time (more are rejected), finished ones are kept for PREDICT_KEEP_FINISHED seconds
+app.config["PREDICT_WORKERS"] = 2
+app.config["PREDICT_MAX_PENDING"] = 16
+app.config["PREDICT_KEEP_FINISHED"] = 600
+# Trained models of /sensor/<sensor_id>/predict are saved in MODEL_CACHE_DIR and reused until new data arrives,
+# at most MODEL_CACHE_DISK bytes of models are kept on disk and MODEL_CACHE_MEMORY bytes (size of their files)
+# are kept loaded
+app.config["MODEL_CACHE_DIR"] = "server/models"
+app.config["MODEL_CACHE_MEMORY"] = 256 * 1024 * 1024
+app.config["MODEL_CACHE_DISK"] = 1024 * 1024 * 1024
+# Train Prophet models on new data starting from the previous model of the sensor. Off by default, it made
+# refits 1.1x faster overall, but ranged from 0.63x to 1.55x (see benchmarks/prophet_warm_start_benchmark.py)
+app.config["PREDICT_WARM_START"] = False
 jwt = JWTManager(app)
 
+db_pool = ConnectionPool(
+    app.config["DBPATH"], app.config["DB_PRAGMAS"], app.config["DB_POOL_SIZE"]
+)
+
+write_queue = WriteBehindQueue(
+    db_pool, app.config["WRITE_FLUSH_INTERVAL"], app.config["WRITE_FLUSH_ROWS"]
+)
+write_queue.start()
+write_queue.stop_on_signal()
+
+# Shared by all routes and the poller, so connections to the API are kept alive between requests
+api_client = ThingSpeakClient(
+    app.config["API"],
+    app.config["API_TIMEOUT"],
+    app.config["API_RETRIES"],
+    app.config["API_BACKOFF"],
+    # Request handlers, export fan-out and the poller
+    pool_size=app.config["DB_POOL_SIZE"] + app.config["API_FANOUT_WORKERS"] + 1,
+    breaker=CircuitBreaker(
+        app.config["API_BREAKER_FAILURES"],
+        app.config["API_BREAKER_SLOW_CALL"],
+        app.config["API_BREAKER_RESET"],
+    ),
+    coalesce=app.config["API_COALESCE"],
+)
+response_cache = ResponseCache(
+    app.config["RESPONSE_CACHE_ENTRIES"],
+    app.config["RESPONSE_CACHE_BYTES"],
+    app.config["RESPONSE_CACHE_TTL"],
+    app.config["RESPONSE_CACHE_MAX_ENTRY_BYTES"],
+)
+prediction_jobs = JobQueue(
+    app.config["PREDICT_WORKERS"],
+    app.config["PREDICT_MAX_PENDING"],
+    app.config["PREDICT_KEEP_FINISHED"],
+    # Every worker keeps its own loaded models, saved models are shared
+    initializer=init_worker,
+    initargs=(
+        os.path.abspath(app.config["MODEL_CACHE_DIR"]),
+        app.config["MODEL_CACHE_MEMORY"],
+        app.config["MODEL_CACHE_DISK"],
+        app.config["PREDICT_WARM_START"],
+    ),
+)
+revalidator = Revalidator(app.config["SWR_MAX_AGE"], app.config["SWR_MAX_STALE"])
+api_executor = ThreadPoolExecutor(
+    max_workers=app.config["API_FANOUT_WORKERS"], thread_name_prefix="api-fanout"
+)
+
+poller = None
+if app.config["INGEST_ENABLED"]:
+    poller = start_ingestion(
+        api_client,
+        db_pool,
+        app.config["CHANNEL"],
+        app.config["INGEST_INTERVAL"],
+        app.config["INGEST_SCHEDULE"],
+    )
+
 
 def get_db():
+    """
+    Get reader connection for the current request. Writes have to use db_pool.writer().
+    """
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(app.config["DBPATH"])
-        db.row_factory = sqlite3.Row
+        db = g._database = db_pool.acquire()
     return db
 
 
@@ -55,7 +228,7 @@ def get_db():
 def close_connection(exception):
     db = getattr(g, "_database", None)
     if db is not None:
-        db.close()
+        db_pool.release(db)
 
 
 @app.after_request
@@ -76,6 +249,51 @@ def refresh_expiring_jwts(response):
         return response
 
 
+@app.after_request
+def compress_response(response):
+    """
+    Answer conditional requests of responses with ETag (304 Not Modified) and compress JSON and csv responses
+    if the client accepts it. Streamed responses are compressed chunk by chunk.
+    Compressed response is a different representation, so its ETag gets the encoding as suffix.
+    """
+    encoding = None
+    if (
+        response.status_code == 200
+        and response.mimetype in COMPRESSIBLE_TYPES
+        and "Content-Encoding" not in response.headers
+        and not response.direct_passthrough
+        and (
+            response.is_streamed
+            or response.calculate_content_length() >= app.config["COMPRESS_MIN_SIZE"]
+        )
+    ):
+        encoding = request.accept_encodings.best_match(supported_encodings())
+        response.vary.add("Accept-Encoding")
+
+    etag, _ = response.get_etag()
+    if etag is not None:
+        if encoding is not None:
+            response.set_etag(f"{etag}-{encoding}")
+        if request.method in ("GET", "HEAD"):
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(
+            response.iter_encoded(), encoding, app.config["COMPRESS_LEVEL"]
+        )
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(
+            compress_body(response.get_data(), encoding, app.config["COMPRESS_LEVEL"])
+        )
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
 @app.route("/logout", methods=["HEAD"])
 @jwt_required()
 def logout():
@@ -92,19 +310,19 @@ def logout():
 def register():
     if not request.is_json:
         return jsonify({"msg": "Request is not a json"}), 400
-    db = get_db()
     user_data = request.get_json()
 
     if "user_login" not in user_data or "user_password" not in user_data:
         return jsonify({"msg": "Request json has missing fields!"}), 400
 
-    if user_exists(db.cursor(), user_data["user_login"]):
-        return jsonify({"msg": "User already exists!"}), 400
-    db.cursor().execute(
-        f"INSERT INTO USER (user_login, user_password) VALUES (?, ?)",
-        [user_data["user_login"], user_data["user_password"]],
-    )
-    db.commit()
+    with db_pool.writer() as writer:
+        if user_exists(writer.cursor(), user_data["user_login"]):
+            return jsonify({"msg": "User already exists!"}), 400
+        writer.cursor().execute(
+            f"INSERT INTO USER (user_login, user_password) VALUES (?, ?)",
+            [user_data["user_login"], user_data["user_password"]],
+        )
+        writer.commit()
 
     response = jsonify({"msg": "User created!"})
     set_access_cookies(response, create_access_token(identity=user_data["user_login"]))
@@ -132,63 +350,222 @@ def login():
     return jsonify({"msg": "Wrong login or password."}), 401
 
 
+def refresh_feeds(path: str) -> dict:
+    """
+    Fetch feeds from API and queue them for writing to the database.
+    Raises requests.exceptions.RequestException if the API is not available.
+    """
+    resp = api_client.get(path)
+    resp.raise_for_status()
+    data = resp.json()
+    # Written by the write-behind queue, the request does not wait for the commit
+    write_queue.submit(data["feeds"])
+    return data
+
+
+def revalidate(key: str, path: str) -> dict | None:
+    """
+    Stale-while-revalidate for routes reading from the API (when ingestion is disabled).
+    Fresh and stale data is served from the database (stale data is refreshed in the background), expired data
+    is fetched from API before responding. Returns API response if it was fetched, None if the route should
+    serve data from the database (also when the API is not available or the circuit breaker is open).
+    """
+    state = revalidator.state(key)
+    if state == Revalidator.STALE:
+        revalidator.refresh_in_background(key, lambda: refresh_feeds(path))
+    elif state == Revalidator.EXPIRED:
+        # If url does not exist (doesn't even return 404) or the API does not answer in time (even after
+        # retries) GET will throw an exception, so we ignore it and fetch data from the database anyway.
+        try:
+            return revalidator.refresh(key, lambda: refresh_feeds(path))
+        except requests.exceptions.RequestException:
+            pass
+    return None
+
+
+def with_data_age(response, key: str, db=None):
+    """
+    Set X-Data-Age header (in seconds) of response served from the database: time since the data was last
+    fetched from the API by the poller (or by a route with ingestion disabled). If it was not fetched by this
+    process yet, it is the age of the newest stored measurement.
+    """
+    if poller is not None:
+        age = poller.seconds_since_success(app.config["CHANNEL"])
+    else:
+        age = revalidator.age(key)
+    if age is None and db is not None:
+        latest = db.execute(
+            "SELECT MAX(measurement_created_at) FROM measurement"
+        ).fetchone()[0]
+        if latest is not None:
+            # Dates are stored as epoch seconds
+            age = time.time() - latest
+    if age is not None:
+        response.headers["X-Data-Age"] = str(round(age))
+    return response
+
+
+def cache_key(*parts) -> tuple:
+    """
+    Key of a cached response built from the database. The data version is read before the response is built,
+    so a response racing with a write is cached under the older version.
+    """
+    return (*parts, data_version.get(get_db()))
+
+
+def cached_json(key: tuple, build):
+    """
+    Cached JSON response, build() returns data of the response if it is not cached.
+    The response has an ETag, computed once per cached response, so clients polling for unchanged data
+    get 304 Not Modified without the response being built again.
+    """
+    cached = response_cache.get(key)
+    if cached is not None:
+        body, headers = cached
+        response = app.response_class(body, headers=headers)
+    else:
+        response = jsonify(build())
+        body = response.get_data()
+        response.set_etag(body_etag(body))
+        response_cache.set(
+            key,
+            body,
+            {"Content-Type": response.content_type, "ETag": response.headers["ETag"]},
+        )
+    # Browsers have to revalidate the response (with If-None-Match) before using it
+    response.cache_control.no_cache = True
+    return response
+
+
 @app.route("/overview")
 def get_overview():
-    try:
-        resp = requests.get(
-            f"{app.config['API']}/channels/{app.config['CHANNEL']}/feeds.json"
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            db = get_db()
-            if db:
-                update_database(db, data)
-            return jsonify(fetch_overview(data)), 200
-    # If url does not exist (doesn't even return 404) GET will throw ConnectionError, so we ignore it and
-    # fetch data from the database anyway.
-    except ConnectionError:
-        pass
-    finally:
-        db = get_db()
-        if db:
-            return jsonify(fetch_overview(get_db_measurements(db))), 200
-        return jsonify({"msg": "Unable to fetch data"}), 500
+    # With background ingestion the poller keeps the database up to date, so skip the API
+    if not app.config["INGEST_ENABLED"]:
+        data = revalidate("overview", f"/channels/{app.config['CHANNEL']}/feeds.json")
+        if data is not None:
+            response = jsonify(fetch_overview(data))
+            response.headers["X-Data-Age"] = "0"
+            return response, 200
+    db = get_db()
+    if db:
+        # Overview state is maintained on ingest, so this does not read any measurements
+        response = cached_json(cache_key("overview"), lambda: overview_state.get(db))
+        return with_data_age(response, "overview", db), 200
+    return jsonify({"msg": "Unable to fetch data"}), 500
+
+
+@app.route("/health")
+def get_health():
+    if poller is None:
+        health = {"running": False, "healthy": False, "msg": "Ingestion disabled"}
+    else:
+        health = poller.health(get_db())
+    health["revalidate"] = revalidator.stats
+    health["write_queue"] = {**write_queue.stats, "pending": write_queue.pending()}
+    health["response_cache"] = response_cache.stats()
+    health["predict_jobs"] = {
+        **prediction_jobs.stats,
+        "pending": prediction_jobs.pending(),
+    }
+    health["api"] = {**api_client.stats(), "breaker": api_client.breaker.state()}
+    if poller is None:
+        return jsonify(health), 200
+    return jsonify(health), 200 if health["healthy"] else 503
 
 
 @app.route("/sensor/<sensor_id>")
 @jwt_required()
 def get_sensor_data(sensor_id: int):
-    try:
-        resp = requests.get(
-            f"{app.config['API']}/channels/{app.config['CHANNEL']}/fields/{sensor_id}.json"
+    # ?max_points=<n> downsamples the series (LTTB) before serialization, so dense sensors ship
+    # only as many points as the chart can show
+    max_points = request.args.get("max_points", type=int)
+    if "max_points" in request.args and (max_points is None or max_points < 3):
+        return jsonify({"msg": "max_points has to be a number of at least 3"}), 400
+    start_date = request.args.get("startDate")
+    end_date = request.args.get("endDate")
+
+    # Aggregated charts: ?resolution=minute|hour|day or ?range=<seconds> (the resolution is picked to fit the range),
+    # optionally limited by startDate and endDate. Served from rollups maintained on ingest.
+    resolution = request.args.get("resolution")
+    chart_range = request.args.get("range", type=float)
+    key = cache_key("sensor", sensor_id, tuple(sorted(request.args.items())))
+    if resolution is not None or chart_range is not None:
+        # Range ending now moves with time, so it is not cached
+        relative = chart_range is not None and not (start_date and end_date)
+        if relative:
+            now = datetime.now(timezone.utc)
+            start_date = (now - timedelta(seconds=chart_range)).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+            end_date = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+        if resolution is None:
+            resolution = pick_resolution(chart_range, app.config["CHART_MAX_POINTS"])
+        if resolution not in ROLLUP_RESOLUTIONS:
+            return jsonify({"msg": "Unsupported resolution"}), 400
+
+        def build_rollups():
+            series = get_db_rollups(
+                get_db(),
+                sensor_id,
+                resolution,
+                app.config["CHART_MAX_POINTS"],
+                start_date,
+                end_date,
+            )
+            if max_points is not None:
+                series = downsample_series(series, max_points)
+            return series
+
+        if relative:
+            return jsonify(build_rollups()), 200
+        return cached_json(key, build_rollups), 200
+
+    # With background ingestion the poller keeps the database up to date, so skip the API
+    if not app.config["INGEST_ENABLED"]:
+        data = revalidate(
+            f"sensor:{sensor_id}",
+            f"/channels/{app.config['CHANNEL']}/fields/{sensor_id}.json",
         )
-        if resp.status_code == 200:
-            data = resp.json()
-            db = get_db()
-            if db:
-                update_database(db, data)
-            return jsonify(convert_sensor_data(data["feeds"], f"field{sensor_id}")), 200
-    # If url does not exist (doesn't even return 404) GET will throw ConnectionError, so we ignore it and
-    # fetch data from the database anyway.
-    except ConnectionError:
-        pass
-    finally:
-        db = get_db()
-        if db:
-            return (
-                jsonify(
-                    convert_sensor_data(
-                        get_db_measurements(db, sensor_id), f"field{sensor_id}"
-                    )
-                ),
-                200,
+        if data is not None:
+            series = convert_sensor_data(data["feeds"], f"field{sensor_id}")
+            if max_points is not None:
+                series = downsample_series(series, max_points)
+            response = jsonify(series)
+            response.headers["X-Data-Age"] = "0"
+            return response, 200
+    db = get_db()
+    if db:
+
+        def build_series():
+            if max_points is not None:
+                # Read the entire range into arrays, the downsampling keeps its shape
+                return downsample_arrays(
+                    *get_db_measurement_arrays(
+                        db,
+                        sensor_id,
+                        app.config["CHART_RAW_LIMIT"],
+                        start_date,
+                        end_date,
+                    ),
+                    max_points,
+                    f"field{sensor_id}",
+                )
+            return convert_sensor_data(
+                get_db_measurements(db, sensor_id), f"field{sensor_id}"
             )
-        return jsonify({"msg": "Unable to fetch data"}), 500
+
+        response = cached_json(key, build_series)
+        return with_data_age(response, f"sensor:{sensor_id}", db), 200
+    return jsonify({"msg": "Unable to fetch data"}), 500
 
 
 @app.route("/sensor/<sensor_id>/predict", methods=["POST"])
 # @jwt_required
 def get_sensor_data_prediction(sensor_id: int):
+    """
+    Submit prediction job, the model is trained in a worker process. Returns id of the job, its state
+    (and the prediction once it is done) is returned by GET /sensor/<sensor_id>/predict/<job_id>.
+    """
     if not request.is_json:
         return jsonify({"msg": "Request is not a json"}), 400
 
@@ -207,40 +584,211 @@ def get_sensor_data_prediction(sensor_id: int):
     if "algorithm" in predict_params:
         algorithm = predict_params["algorithm"]
 
-    model = None
-    if algorithm == "CatBoost":
-        model = TimeSeriesCatBoost(
-            n_estimators=1000, learning_rate=0.001, verbose=False
-        )
-    elif algorithm == "KNN":
-        model = TimeSeriesKNN(n_neighbors=3, daily=True)
-    elif algorithm == "Prophet":
-        model = TimeSeriesProphet(growth="linear", n_changepoints=25)
-    elif algorithm == "XGBoost":
-        model = TimeSeriesXGBoost(
-            test_size=0.2, params={"n_estimators": 1000, "learning_rate": 0.001}
-        )
-    if not model:
+    if algorithm not in PREDICT_MODELS:
         return jsonify({"msg": "Unsupported model selected"}), 400
 
-    api_resp = requests.get(
-        f"{app.config['API']}/channels/{app.config['CHANNEL']}/fields/{sensor_id}.json{query_params}"
+    # The same prediction requested again while it is waiting or running is not trained twice
+    key = (
+        int(sensor_id),
+        algorithm,
+        predict_params["startDate"],
+        predict_params.get("endDate"),
     )
-    prediction_data = [
-        val for val in api_resp.json()["feeds"] if val[f"field{sensor_id}"] is not None
-    ]
-    X, y = model.initial_processing(prediction_data, sensor_id)
-
-    model.fit2(X, y, process_data=True)
-    result = model.predict2(
-        start_date=datetime.strptime(predict_params["startDate"], "%Y-%m-%dT%H:%M:%SZ"),
-        end_date=datetime.strptime(predict_params["endDate"], "%Y-%m-%dT%H:%M:%SZ")
-        if "endDate" in predict_params
-        else datetime.now(),
-        interval=timedelta(minutes=1),
+
+    job_id = prediction_jobs.find(key)
+    if job_id is None:
+        try:
+            api_resp = api_client.get(
+                f"/channels/{app.config['CHANNEL']}/fields/{sensor_id}.json{query_params}"
+            )
+            api_resp.raise_for_status()
+        except requests.exceptions.RequestException:
+            return jsonify({"msg": "Unable to fetch data"}), 503
+        feeds = api_resp.json()["feeds"]
+        # Workers get parsed arrays, which are a lot cheaper to send to another process than feeds
+        dates, values = parse_feed(feeds, sensor_id)
+        # Training data is identified by its range, number of entries and the last entry,
+        # so the model is trained again only when new data arrives
+        watermark = (
+            query_params,
+            len(feeds),
+            feeds[-1]["entry_id"] if feeds else None,
+        )
+        try:
+            job_id, _ = prediction_jobs.submit(
+                key,
+                run_prediction,
+                int(sensor_id),
+                algorithm,
+                dates,
+                values,
+                watermark,
+                datetime.strptime(predict_params["startDate"], "%Y-%m-%dT%H:%M:%SZ"),
+                datetime.strptime(predict_params["endDate"], "%Y-%m-%dT%H:%M:%SZ")
+                if "endDate" in predict_params
+                else datetime.now(),
+            )
+        except QueueFullError as error:
+            return (
+                jsonify({"msg": f"Too many predictions, try again later ({error})"}),
+                429,
+            )
+    return (
+        jsonify({"job_id": job_id, "status": prediction_jobs.get(job_id)["status"]}),
+        202,
+        {"Location": f"/sensor/{sensor_id}/predict/{job_id}"},
     )
 
-    return jsonify(model.extract_result(result)), 200
+
+@app.route("/sensor/<sensor_id>/predict/<job_id>", methods=["GET", "DELETE"])
+# @jwt_required
+def get_sensor_data_prediction_job(sensor_id: int, job_id: str):
+    """
+    State of the prediction job with the prediction ([datetimes, values]) once it is done, or cancel the job.
+    """
+    if request.method == "DELETE":
+        if prediction_jobs.get(job_id) is None:
+            return jsonify({"msg": "Job does not exist"}), 404
+        if not prediction_jobs.cancel(job_id):
+            return jsonify({"msg": "Job is already running or finished"}), 409
+        return jsonify({"job_id": job_id, "status": JobQueue.CANCELLED}), 200
+
+    job = prediction_jobs.get(job_id)
+    if job is None:
+        return jsonify({"msg": "Job does not exist"}), 404
+    response = {"job_id": job_id, "status": job["status"], "timing": job["timing"]}
+    if job["status"] == JobQueue.DONE:
+        response["result"] = job["result"]["prediction"]
+        response["model_cache"] = job["result"]["model_cache"]
+        response["timing"]["train"] = job["result"]["train_time"]
+        response["timing"]["predict"] = job["result"]["predict_time"]
+    elif job["status"] == JobQueue.FAILED:
+        response["msg"] = job["error"]
+    return jsonify(response), 200
+
+
+def export_query_params(export_params: dict) -> str:
+    """
+    Convert dates of export parameters to ThingSpeak query parameters.
+    """
+    query_params = ""
+    if "startDate" in export_params:
+        query_params += f"?start={export_params['startDate']}"
+        if "endDate" in export_params:
+            query_params += f"&end={export_params['endDate']}"
+    elif "endDate" in export_params:
+        query_params += f"?end={export_params['endDate']}"
+    return query_params
+
+
+def fetch_api_sensor_export(
+    sensor_ids: list[int], query_params: str
+) -> list[list[tuple]]:
+    """
+    Fetch data of the sensors from API for export. Returns list of rows in EXPORT_HEADER format for every sensor
+    that returned data, in the order of sensor_ids.
+    Sensors are fetched concurrently, each within API_FANOUT_TIMEOUT seconds, so export takes as long as
+    the slowest sensor (not the sum of all of them) and a sensor that does not respond in time is skipped.
+    Exports of many sensors fetch all fields at once from feeds.json instead, which is a single request.
+    """
+    channel_path = f"/channels/{app.config['CHANNEL']}"
+    deadline = app.config["API_FANOUT_TIMEOUT"]
+
+    def fetch(path: str, **kwargs) -> list[dict] | None:
+        try:
+            api_resp = api_client.get(path, **kwargs)
+        except requests.exceptions.RequestException as err:
+            app.logger.warning("Unable to fetch %s for export: %s", path, err)
+            return None
+        if api_resp.status_code != 200:
+            return None
+        return api_resp.json()["feeds"]
+
+    if len(sensor_ids) >= app.config["EXPORT_FEEDS_THRESHOLD"]:
+        feeds = fetch(f"{channel_path}/feeds.json{query_params}") or []
+        sensor_feeds = [feeds] * len(sensor_ids)
+    else:
+        # Results are in the order of sensors, no matter which request finishes first
+        sensor_feeds = fan_out(
+            api_executor,
+            lambda path: fetch(
+                path, timeout=(app.config["API_TIMEOUT"][0], deadline), retries=0
+            ),
+            [
+                f"{channel_path}/fields/{sensor_id}.json{query_params}"
+                for sensor_id in sensor_ids
+            ],
+            deadline,
+        )
+
+    result = []
+    for sensor_id, feeds in zip(sensor_ids, sensor_feeds):
+        if feeds:
+            sensor_data = convert_sensor_data(feeds, f"field{sensor_id}")
+            if sensor_data:
+                result.append([tuple(point.values()) for point in sensor_data])
+    return result
+
+
+def get_export_overview(export_params: dict, query_params: str) -> dict | None:
+    """
+    Get overview for export from API or database, depending on the source.
+    """
+    if export_params["source"] == "api":
+        # Fetch csv data from API
+        try:
+            api_resp = api_client.get(
+                f"/channels/{app.config['CHANNEL']}/feeds.json{query_params}"
+            )
+        except requests.exceptions.RequestException:
+            return None
+        if api_resp.status_code == 200:
+            return fetch_overview(api_resp.json())
+        return None
+    # Fetch csv data from database
+    if "startDate" in export_params or "endDate" in export_params:
+        return fetch_overview(
+            get_db_measurements(
+                get_db(),
+                size_limit=999,
+                start_date=export_params.get("startDate"),
+                end_date=export_params.get("endDate"),
+            )
+        )
+    return fetch_overview(get_db_measurements(get_db(), size_limit=999))
+
+
+def stream_db_export(batches, generate_chunks, content_type: str, key: tuple):
+    """
+    Stream export of sensors from the database. The stream outlives the request, so batches have to be read
+    through a connection of their own (taken from the pool), which is returned once the response is sent
+    (or the client disconnects). Complete exports that fit into the response cache are cached under key.
+
+    batches: function returning iterator of batches for a connection, it must not yield empty batches
+    generate_chunks: function encoding iterator of batches into chunks of the file
+    content_type: content type of the file
+    key: key of the cached export
+    """
+    cached = response_cache.get(key)
+    if cached is not None:
+        body, headers = cached
+        return body, headers
+    db = db_pool.acquire()
+    db_batches = batches(db)
+    # Read the first batch before responding, so an empty export is still reported as an error
+    first_batch = next(db_batches, None)
+    if first_batch is None:
+        db_pool.release(db)
+        return jsonify({"msg": "Unable to create export"}), 500
+
+    def stream():
+        try:
+            yield from generate_chunks(chain([first_batch], db_batches))
+        finally:
+            db_pool.release(db)
+
+    headers = {"Content-Type": content_type}
+    return response_cache.stream(key, stream(), headers), headers
 
 
 # The last part of the url is the name of the returned file (export.csv)
@@ -257,78 +805,154 @@ def export_csv():
     if "source" not in export_params:
         return jsonify({"msg": "Source not specified"}), 400
 
-    result = []
-    sensor_ids = None
-
-    if "sensors" in export_params:
-        sensor_ids = export_params["sensors"]
-    db = get_db()
-    if not db:
-        return jsonify({"msg": "Unable to contact database"}), 500
-
-    query_params = ""
-    if "startDate" in export_params:
-        query_params += f"?start={export_params['startDate']}"
-        if "endDate" in export_params:
-            query_params += f"&end={export_params['endDate']}"
-    elif "endDate" in export_params:
-        query_params += f"?end={export_params['endDate']}"
+    sensor_ids = export_params.get("sensors")
+    query_params = export_query_params(export_params)
+
+    if sensor_ids and export_params["source"] != "api":
+        # Stream csv data from the database, rows are encoded while the cursor is read
+        return stream_db_export(
+            lambda db: iter_db_sensor_export(
+                db,
+                sensor_ids,
+                export_params.get("startDate"),
+                export_params.get("endDate"),
+            ),
+            lambda batches: generate_csv_chunks(batches, EXPORT_HEADER),
+            "text/csv",
+            cache_key("export", "csv", json.dumps(export_params, sort_keys=True)),
+        )
 
     if sensor_ids:
-        for sensor_id in sensor_ids:
-            sensor_data = None
-            if export_params["source"] == "api":
-                # Fetch csv data from API
-                api_resp = requests.get(
-                    f"{app.config['API']}/channels/{app.config['CHANNEL']}/fields/{sensor_id}.json{query_params}"
-                )
-                if api_resp.status_code == 200:
-                    sensor_resp = api_resp.json()
-                    sensor_data = convert_sensor_data(
-                        sensor_resp["feeds"], f"field{sensor_id}"
-                    )
-            else:
-                # Fetch csv data from database
-                if "startDate" in export_params or "endDate" in export_params:
-                    sensor_data = get_db_measurements(
-                        db,
-                        sensor_id,
-                        999,
-                        export_params["startDate"],
-                        export_params["endDate"],
-                    )
-                else:
-                    sensor_data = get_db_measurements(db, sensor_id, 999)
-            if sensor_data:
-                result.append(sensor_data)
-        # Merge data for selected sensors
-        result = flatten(result)
+        # Fetch csv data from API, data for selected sensors is merged
+        result = fetch_api_sensor_export(sensor_ids, query_params)
+        if result:
+            return generate_csv_chunks(result, EXPORT_HEADER), {
+                "Content-Type": "text/csv"
+            }
     # Get export for overview
     else:
-        overview_data = None
-        if export_params["source"] == "api":
-            # Fetch csv data from API
-            api_resp = requests.get(
-                f"{app.config['API']}/channels/{app.config['CHANNEL']}/feeds.json{query_params}"
-            )
-            if api_resp.status_code == 200:
-                overview_data = fetch_overview(api_resp.json())
-        else:
-            # Fetch csv data from database
-            if "startDate" in export_params or "endDate" in export_params:
-                overview_data = fetch_overview(
-                    get_db_measurements(
-                        db,
-                        size_limit=999,
-                        start_date=export_params["startDate"],
-                        end_date=export_params["endDate"],
-                    )
-                )
-            else:
-                overview_data = fetch_overview(get_db_measurements(db, size_limit=999))
+        overview_data = get_export_overview(export_params, query_params)
         if overview_data:
             # Extract latest overview data from response
             result = [overview_data[key] for key in overview_data]
-    if len(result) > 0:
-        return generate_csv_file(result), {"Content-Type": "text/csv"}
+            return generate_csv_file(result), {"Content-Type": "text/csv"}
     return jsonify({"msg": "Unable to create csv export"}), 500
+
+
+# Same as export_csv, but in one of EXPORT_FORMATS with optional compression ("compression" in the request json)
+@app.route("/export/export.<export_format>", methods=["POST"])
+def export_file(export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        return (
+            jsonify(
+                {
+                    "msg": f"Unsupported format, use one of: csv, {', '.join(EXPORT_FORMATS)}"
+                }
+            ),
+            404,
+        )
+    if not request.is_json:
+        return jsonify({"msg": "Request is not a json"}), 400
+
+    export_params = request.get_json()
+    if "source" not in export_params:
+        return jsonify({"msg": "Source not specified"}), 400
+    compression = export_params.get("compression")
+    if (
+        compression is not None
+        and compression not in EXPORT_COMPRESSIONS[export_format]
+    ):
+        return (
+            jsonify(
+                {
+                    "msg": f"Unsupported compression, {export_format} supports: {', '.join(EXPORT_COMPRESSIONS[export_format])}"
+                }
+            ),
+            400,
+        )
+    if export_format != "ndjson" or compression == "zstd":
+        # Fail before streaming anything if the optional dependency is missing
+        try:
+            pa = import_pyarrow()
+        except ValueError as error:
+            return jsonify({"msg": str(error)}), 501
+
+    sensor_ids = export_params.get("sensors")
+    query_params = export_query_params(export_params)
+    content_type = EXPORT_CONTENT_TYPES[export_format]
+
+    if sensor_ids and export_params["source"] != "api":
+        key = cache_key(
+            "export", export_format, json.dumps(export_params, sort_keys=True)
+        )
+        if export_format == "ndjson":
+            return stream_db_export(
+                lambda db: iter_db_sensor_export(
+                    db,
+                    sensor_ids,
+                    export_params.get("startDate"),
+                    export_params.get("endDate"),
+                ),
+                lambda batches: generate_ndjson_chunks(
+                    batches, EXPORT_HEADER, compression
+                ),
+                content_type,
+                key,
+            )
+        # Columns are built straight from the cursor batches, without rows converted to dicts
+        return stream_db_export(
+            lambda db: iter_db_sensor_columns(
+                db,
+                sensor_ids,
+                export_params.get("startDate"),
+                export_params.get("endDate"),
+            ),
+            lambda batches: generate_columnar_chunks(
+                batches,
+                sensor_schema(pa),
+                export_format,
+                compression,
+                SENSOR_PARQUET_ENCODING,
+            ),
+            content_type,
+            key,
+        )
+
+    if sensor_ids:
+        rows = fetch_api_sensor_export(sensor_ids, query_params)
+        header = EXPORT_HEADER
+    else:
+        overview_data = get_export_overview(export_params, query_params)
+        rows = []
+        if overview_data:
+            rows = [
+                [
+                    (
+                        overview_data[key]["title"],
+                        to_number(overview_data[key].get("value")),
+                        to_number(overview_data[key].get("min")),
+                        to_number(overview_data[key].get("max")),
+                    )
+                    for key in overview_data
+                    if key != "created_at"
+                ]
+            ]
+        header = ["title", "value", "min", "max"]
+    if not rows:
+        return jsonify({"msg": "Unable to create export"}), 500
+    if export_format == "ndjson":
+        return generate_ndjson_chunks(rows, header, compression), {
+            "Content-Type": content_type
+        }
+
+    columns = [list(zip(*batch)) for batch in rows]
+    if not sensor_ids:
+        return generate_columnar_chunks(
+            columns, overview_schema(pa), export_format, compression
+        ), {"Content-Type": content_type}
+    # Columnar formats store timestamps as numbers
+    for batch in columns:
+        batch[2] = [to_epoch(timestamp) for timestamp in batch[2]]
+    return generate_columnar_chunks(
+        columns, sensor_schema(pa), export_format, compression, SENSOR_PARQUET_ENCODING
+    ), {"Content-Type": content_type}
@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import sys
+import time
+
+# Revision of schema.sql with numeric MEASUREMENT columns
+TYPED_STORAGE_VERSION = 2
+
+# Characters Windows devices and ThingSpeak leave around values (the whitespace float() ignores)
+WHITESPACE = "' ' || char(9, 10, 11, 12, 13)"
+
+
+def sql_trim(column: str) -> str:
+    return f"trim({column}, {WHITESPACE})"
+
+
+def sql_to_real(value: str) -> str:
+    """
+    SQL expression converting TEXT sensor value into REAL, or NULL if it is not a number, with the same rules as
+    to_number (which follows float()): optional sign, digits with at most one decimal point, optional exponent
+    with optional sign, or inf. CAST alone would turn values like "." or "-" into 0.0.
+    Pure SQL is used (instead of a Python function) so the triggers work in every application connection.
+
+    value: SQL expression of the value without surrounding whitespace (see sql_trim)
+    """
+    return f"""
+        CASE
+            -- Mantissa starts with a digit (or a point and a digit), signs can only start the value or follow
+            -- the exponent, and the value does not end with the exponent or a sign
+            WHEN ({value} GLOB '[0-9]*' OR {value} GLOB '.[0-9]*' OR {value} GLOB '[+-][0-9]*' OR {value} GLOB '[+-].[0-9]*')
+                AND {value} NOT GLOB '*[^0-9.eE+-]*'
+                AND {value} NOT GLOB '*.*.*'
+                AND {value} NOT GLOB '*[eE]*.*'
+                AND {value} NOT GLOB '*[eE]*[eE]*'
+                AND {value} NOT GLOB '*[^eE][+-]*'
+                AND {value} NOT GLOB '*[eE+-]'
+            THEN CAST({value} AS REAL)
+            -- 9e999 overflows into infinity, NaN is stored as NULL anyway
+            WHEN lower({value}) IN ('inf', '+inf', 'infinity', '+infinity') THEN 9e999
+            WHEN lower({value}) IN ('-inf', '-infinity') THEN -9e999
+        END"""
+
+
+def sql_to_epoch(column: str) -> str:
+    """
+    SQL expression converting ThingSpeak date (2023-01-01T00:00:00Z) into unix epoch seconds.
+    Dates that already are epoch seconds (written by a backend on the typed storage during the migration)
+    are kept.
+    """
+    return f"""
+        CASE
+            WHEN {column} GLOB '[0-9]*' AND {column} NOT GLOB '*[^0-9]*' THEN CAST({column} AS INTEGER)
+            ELSE CAST(strftime('%s', {column}) AS INTEGER)
+        END"""
+
+
+def converted_columns(prefix: str, trimmed: bool = False) -> str:
+    """
+    Columns of MEASUREMENT converted into the typed storage.
+
+    prefix: prefix of the column names, e.g. NEW. in triggers
+    trimmed: whether whitespace around the values is already removed
+    """
+    columns = [
+        sql_to_epoch(f"{prefix}measurement_created_at"),
+        f"{prefix}measurement_id",
+    ]
+    for idx in range(1, 9):
+        column = f"{prefix}measurement_field{idx}"
+        columns.append(sql_to_real(column if trimmed else sql_trim(column)))
+    return ", ".join(columns)
+
+
+def migrate_typed_storage(
+    db_conn: sqlite3.Connection, batch_size: int = 10000, pause: float = 0.05
+) -> int:
+    """
+    Convert MEASUREMENT with TEXT columns into the schema with epoch dates and REAL values.
+    Rows are copied into a new table in small batches, each in its own short transaction with a pause in between,
+    so the previous version of the backend (which reads and writes the TEXT table) keeps working during
+    the migration. Rows inserted or updated in the meantime are mirrored by triggers. At the end the tables are
+    swapped in a single short transaction.
+    Returns number of copied rows.
+
+    batch_size: number of rows copied in a single transaction
+    pause: time (in seconds) between batches, during which other connections can access the database
+    """
+    # Transactions are controlled explicitly, so they stay as short as possible
+    isolation_level = db_conn.isolation_level
+    db_conn.isolation_level = None
+    cur = db_conn.cursor()
+    try:
+        with open(
+            f"{os.path.dirname(os.path.realpath(__file__))}/schema.sql",
+            encoding="utf-8",
+        ) as db_schema:
+            schema = db_schema.read()
+        # Create the new table with its indexes using definitions from schema.sql
+        start = schema.index("CREATE TABLE IF NOT EXISTS MEASUREMENT")
+        end = schema.index("CREATE TABLE", start + 1)
+        cur.executescript(
+            schema[start:end].replace(" MEASUREMENT ", " MEASUREMENT_NEW ")
+        )
+        for event in ["INSERT", "UPDATE"]:
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS measurement_migrate_{event.lower()} AFTER {event} ON measurement
+                BEGIN
+                    INSERT OR REPLACE INTO measurement_new VALUES ({converted_columns("NEW.")});
+                END
+                """
+            )
+
+        trimmed_columns = ", ".join(
+            f"{sql_trim(f'measurement_field{idx}')} AS measurement_field{idx}"
+            for idx in range(1, 9)
+        )
+        copied = 0
+        last_id = -1
+        while True:
+            cur.execute("BEGIN")
+            cur.execute(
+                "SELECT MAX(measurement_id), COUNT(*) FROM "
+                "(SELECT measurement_id FROM measurement WHERE measurement_id > ? ORDER BY measurement_id LIMIT ?)",
+                [last_id, batch_size],
+            )
+            batch_last_id, batch_rows = cur.fetchone()
+            if batch_rows == 0:
+                cur.execute("COMMIT")
+                break
+            # Values are trimmed once per row, the conversion refers to them many times
+            cur.execute(
+                f"""
+                WITH batch AS MATERIALIZED (
+                    SELECT measurement_created_at, measurement_id, {trimmed_columns}
+                    FROM measurement
+                    WHERE measurement_id > ? AND measurement_id <= ?
+                )
+                INSERT OR REPLACE INTO measurement_new
+                SELECT {converted_columns("", trimmed=True)} FROM batch
+                """,
+                [last_id, batch_last_id],
+            )
+            cur.execute("COMMIT")
+            copied += batch_rows
+            last_id = batch_last_id
+            print(f"{copied} rows converted")
+            time.sleep(pause)
+
+        # Swap tables, indexes of the old table are dropped with it
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("DROP TRIGGER measurement_migrate_insert")
+        cur.execute("DROP TRIGGER measurement_migrate_update")
+        cur.execute("DROP TABLE measurement")
+        cur.execute("ALTER TABLE measurement_new RENAME TO MEASUREMENT")
+        cur.execute(f"PRAGMA user_version = {TYPED_STORAGE_VERSION}")
+        cur.execute("COMMIT")
+        return copied
+    except BaseException:
+        if db_conn.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    finally:
+        db_conn.isolation_level = isolation_level
+
+
+def needs_typed_storage_migration(db_conn: sqlite3.Connection) -> bool:
+    """
+    Check if the database has a MEASUREMENT table created by schema revision older than typed storage.
+    """
+    cur = db_conn.cursor()
+    cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND lower(name) = 'measurement'"
+    )
+    if cur.fetchone() is None:
+        return False
+    cur.execute("PRAGMA user_version")
+    return cur.fetchone()[0] < TYPED_STORAGE_VERSION
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("No dbpath provided!")
+        sys.exit(1)
+    db = sqlite3.connect(sys.argv[1])
+    if needs_typed_storage_migration(db):
+        migrate_typed_storage(db)
+        # VACUUM rewrites the entire file (blocking other connections), so it is optional
+        if "--vacuum" in sys.argv:
+            db.execute("VACUUM")
+    else:
+        print("Database is up to date.")
+    db.close()
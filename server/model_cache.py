@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def model_key(
+    sensor_id: int, algorithm: str, params: dict, watermark: tuple
+) -> tuple[str, str]:
+    """
+    Key of a trained model: (prefix, key). Prefix identifies the configuration (sensor, algorithm and
+    hyperparameters), the key adds the watermark of the training data (e.g. requested range with the number
+    of entries and id of the last one), so new data results in a new key.
+    """
+    config = hashlib.blake2b(
+        json.dumps(params, sort_keys=True, default=str).encode(), digest_size=8
+    ).hexdigest()
+    data = hashlib.blake2b(
+        json.dumps(watermark, default=str).encode(), digest_size=8
+    ).hexdigest()
+    prefix = f"{int(sensor_id)}-{algorithm}-{config}"
+    return prefix, f"{prefix}-{data}"
+
+
+class ModelCache:
+    """
+    Cache of trained models. Models are saved to disk in the native format of their library (save2 and load2
+    of the model wrappers) and loaded lazily, loaded models are kept in memory. Both levels are LRU caches
+    bounded by size in bytes, size of a model in memory is approximated by the size of its file.
+    Only the newest model of every configuration is kept, older ones were trained on older data.
+
+    directory: directory of saved models, created if it does not exist
+    max_memory: maximum total size (in bytes) of models kept in memory
+    max_disk: maximum total size (in bytes) of saved models
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_memory: int = 256 * 1024 * 1024,
+        max_disk: int = 1024 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        os.makedirs(directory, exist_ok=True)
+        # key -> (model, size)
+        self._models = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "saved": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key: str, create: Callable[[], Any]) -> Any | None:
+        """
+        Trained model of the key, from memory or disk, None if it was not trained yet.
+
+        create: function returning new (not fitted) model the saved one is loaded into
+        """
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+        model = create()
+        path = self._path(key, model)
+        if not os.path.exists(path):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        try:
+            model.load2(path)
+            # Modification time orders saved models for eviction
+            os.utime(path)
+            size = os.path.getsize(path)
+        except Exception as err:
+            # Corrupted or incompatible file (e.g. saved by another version of the library), train again.
+            # The file is removed, so it is not loaded again before the new model replaces it
+            logger.warning("Unable to load model %s: %s", path, err)
+            self._remove_file(os.path.basename(path))
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._keep(key, model, size)
+        return model
+
+    def latest(self, prefix: str, create: Callable[[], Any]) -> Any | None:
+        """
+        Newest trained model of the configuration (prefix), whatever data it was trained on, None if there is
+        none. Lets models trained on new data start from the previous one (warm start).
+
+        create: function returning new (not fitted) model the saved one is loaded into
+        """
+        with self._lock:
+            for key in reversed(self._models):
+                if key.startswith(f"{prefix}-"):
+                    return self._models[key][0]
+        files = [
+            (modified, name)
+            for modified, name, _ in self._files()
+            if name.startswith(f"{prefix}-")
+        ]
+        if not files:
+            return None
+        # Key is the file name without the extension
+        return self.get(max(files)[1].rsplit(".", 1)[0], create)
+
+    def put(self, key: str, prefix: str, model: Any) -> None:
+        """
+        Save trained model and keep it in memory. Models of the same configuration (prefix) are removed.
+        """
+        path = self._path(key, model)
+        # Written under a temporary name and renamed, so other processes never load a partial file.
+        # The extension stays last, libraries pick the format by it
+        tmp_path = os.path.join(
+            self.directory,
+            f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.{model.file_extension}",
+        )
+        model.save2(tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self.stats["saved"] += 1
+            for other in list(self._models):
+                if other.startswith(f"{prefix}-") and other != key:
+                    self._memory -= self._models.pop(other)[1]
+            self._keep(key, model, size)
+        for name in os.listdir(self.directory):
+            if (
+                name.startswith(f"{prefix}-")
+                and not name.startswith(key)
+                and ".tmp." not in name
+            ):
+                self._remove_file(name)
+        self._evict_disk()
+
+    def disk_usage(self) -> int:
+        return sum(size for _, _, size in self._files())
+
+    def _keep(self, key: str, model: Any, size: int) -> None:
+        if key in self._models:
+            self._memory -= self._models.pop(key)[1]
+        self._models[key] = (model, size)
+        self._memory += size
+        while self._memory > self.max_memory and len(self._models) > 1:
+            _, (_, evicted_size) = self._models.popitem(last=False)
+            self._memory -= evicted_size
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        files = sorted(self._files())
+        total = sum(size for _, _, size in files)
+        # Least recently used first, the newest file is always kept
+        for _, name, size in files[:-1]:
+            if total <= self.max_disk:
+                break
+            self._remove_file(name)
+            total -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+
+    def _files(self) -> list[tuple[float, str, int]]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and ".tmp." not in entry.name:
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        return files
+
+    def _remove_file(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str, model: Any) -> str:
+        return os.path.join(self.directory, f"{key}.{model.file_extension}")
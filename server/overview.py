@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+
+from datetime import datetime, timezone
+
+from cache import data_version
+
+SECONDS_PER_DAY = 86400
+
+# This could be improved by creating a table in database with titles for each field, but I am skipping it here
+# by hard-coding values (man, do I love to be pressured by time)
+CHANNEL_TITLES = {
+    "field1": "Temperatura (DHT-22) [°C]",
+    "field2": "Wilgotność względna (DHT-22) [%]",
+    "field3": "Natężenie światła (BH-1750) [lx]",
+    "field4": "Ciśnienie atm. (BMP-180) [hPa]",
+    "field5": "Temp. grzejnika (DS18B20) [°C]",
+    "field6": "Temperatura (DS18B20) [°C]",
+    "field7": "Ruch (PIR)",
+    "field8": "Temperatura  (BMP-180) [°C]",
+}
+
+
+class OverviewState:
+    """
+    Latest value, minimum and maximum of the latest day for every sensor, the same data fetch_overview computes
+    from a feed. The state is persisted in the OVERVIEW_STATE table and updated by update_database with new rows
+    only, this object mirrors it in memory so /overview does not have to touch the measurements at all.
+    The mirror is reloaded from the database once the data version changes, to pick up rows written by
+    other processes (other workers of the server, the backfill).
+    """
+
+    def __init__(self):
+        # sensor id -> {"value", "created_at", "day", "min", "max"}
+        self.fields = {}
+        # Data version the mirror was loaded at
+        self._version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def read(db_conn: sqlite3.Connection) -> dict:
+        """
+        Read persisted state of all sensors.
+        """
+        cur = db_conn.cursor()
+        cur.execute(
+            """
+            SELECT overview_sensor_id, overview_value, overview_created_at, overview_day, overview_min, overview_max
+            FROM overview_state
+            """
+        )
+        return {
+            sensor_id: {
+                "value": value,
+                "created_at": created_at,
+                "day": day,
+                "min": minimum,
+                "max": maximum,
+            }
+            for sensor_id, value, created_at, day, minimum, maximum in cur.fetchall()
+        }
+
+    @staticmethod
+    def apply(fields: dict, rows: list[list]) -> dict:
+        """
+        Apply measurement rows (in the format of parse_update_row) to the state of sensors.
+        Returns state of the sensors that changed, fields are not modified.
+        Rows from a newer day start the day over, rows from older days than the current one are ignored.
+        """
+        changed = {}
+        for row in rows:
+            created_at = row[0]
+            day = created_at // SECONDS_PER_DAY
+            for sensor_id in range(1, 9):
+                value = row[sensor_id + 1]
+                if value is None:
+                    continue
+                state = changed.get(sensor_id, fields.get(sensor_id))
+                if state is None or day > state["day"]:
+                    state = {
+                        "value": value,
+                        "created_at": created_at,
+                        "day": day,
+                        "min": value,
+                        "max": value,
+                    }
+                elif day == state["day"]:
+                    state = {
+                        **state,
+                        "min": min(state["min"], value),
+                        "max": max(state["max"], value),
+                    }
+                    if created_at >= state["created_at"]:
+                        state["value"] = value
+                        state["created_at"] = created_at
+                else:
+                    continue
+                changed[sensor_id] = state
+        return changed
+
+    @staticmethod
+    def save(db_conn: sqlite3.Connection, changed: dict) -> None:
+        """
+        Persist changed sensors. Does not commit, it is meant to run inside the transaction writing measurements.
+        """
+        db_conn.executemany(
+            "INSERT OR REPLACE INTO overview_state VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    sensor_id,
+                    state["value"],
+                    state["created_at"],
+                    state["day"],
+                    state["min"],
+                    state["max"],
+                )
+                for sensor_id, state in changed.items()
+            ],
+        )
+
+    def update(self, db_conn: sqlite3.Connection, rows: list[list]) -> dict:
+        """
+        Update persisted state with new rows inside the current transaction. The persisted state is used as the base
+        (not the mirror), so it is correct even if another process wrote in the meantime.
+        Returns the new state, which should be passed to mirror() once the transaction is committed.
+        """
+        fields = self.read(db_conn)
+        changed = self.apply(fields, rows)
+        if changed:
+            self.save(db_conn, changed)
+        return {**fields, **changed}
+
+    def mirror(self, fields: dict, version: int) -> None:
+        """
+        Replace the in-memory mirror with state committed at the data version.
+        """
+        with self._lock:
+            self.fields = fields
+            self._version = version
+
+    def get(self, db_conn: sqlite3.Connection, titles: dict = CHANNEL_TITLES) -> dict:
+        """
+        Get overview in the format returned by fetch_overview: sensors with values on the latest day get
+        their latest value, minimum and maximum of that day, created_at is the latest day.
+        """
+        # Read before the state, so state committed in between is read again by the next call
+        version = data_version.get(db_conn)
+        with self._lock:
+            stale = self._version != version
+        if stale:
+            self.mirror(self.read(db_conn), version)
+        with self._lock:
+            fields = self.fields
+
+        latest_day = max((state["day"] for state in fields.values()), default=None)
+        overview = {}
+        for sensor_id in range(1, 9):
+            key = f"field{sensor_id}"
+            overview[key] = {"title": titles[key]}
+            state = fields.get(sensor_id)
+            if state is not None and state["day"] == latest_day:
+                overview[key]["value"] = str(state["value"])
+                overview[key]["min"] = state["min"]
+                overview[key]["max"] = state["max"]
+        overview["created_at"] = (
+            datetime.fromtimestamp(latest_day * SECONDS_PER_DAY, timezone.utc).date()
+            if latest_day is not None
+            else None
+        )
+        return overview
+
+
+def rebuild_overview_state(db_conn: sqlite3.Connection) -> None:
+    """
+    Compute overview state from the measurements of the latest day, for databases filled before the state existed.
+    """
+    cur = db_conn.cursor()
+    cur.execute("SELECT MAX(measurement_created_at) FROM measurement")
+    latest = cur.fetchone()[0]
+    if latest is None:
+        return
+    cur.execute(
+        "SELECT * FROM measurement WHERE measurement_created_at >= ? ORDER BY measurement_created_at",
+        [latest // SECONDS_PER_DAY * SECONDS_PER_DAY],
+    )
+    with db_conn:
+        db_conn.execute("DELETE FROM overview_state")
+        OverviewState.save(db_conn, OverviewState.apply({}, cur.fetchall()))
+        # Running servers reload their mirrors
+        data_version.bump(db_conn)
+
+
+# In-memory mirror shared by the whole process
+overview_state = OverviewState()
@@ -0,0 +1,98 @@
+import time
+
+import numpy as np
+
+from datetime import datetime, timedelta
+
+from model_cache import model_key, ModelCache
+
+from ai.CatBoost import TimeSeriesCatBoost
+from ai.KNN import TimeSeriesKNN
+from ai.Prophet import TimeSeriesProphet
+from ai.XGBoost import TimeSeriesXGBoost
+
+# Models of /sensor/<sensor_id>/predict with their hyperparameters, trained models are cached by both
+PREDICT_MODELS = {
+    "CatBoost": (
+        TimeSeriesCatBoost,
+        {"n_estimators": 1000, "learning_rate": 0.001, "verbose": False},
+    ),
+    "KNN": (TimeSeriesKNN, {"n_neighbors": 3, "daily": True}),
+    # Only yhat is returned, uncertainty intervals are not simulated
+    "Prophet": (
+        TimeSeriesProphet,
+        {"growth": "linear", "n_changepoints": 25, "uncertainty_samples": 0},
+    ),
+    "XGBoost": (
+        TimeSeriesXGBoost,
+        {"test_size": 0.2, "params": {"n_estimators": 1000, "learning_rate": 0.001}},
+    ),
+}
+
+# Cache of trained models of the worker process, set up by init_worker
+model_cache = None
+# Whether models supporting it are trained starting from the previous model of the sensor, set up by init_worker
+warm_start = False
+
+
+def init_worker(
+    directory: str, max_memory: int, max_disk: int, use_warm_start: bool = False
+) -> None:
+    """
+    Set up the model cache of a worker process. Saved models are shared by all workers through the directory.
+    """
+    global model_cache, warm_start
+    model_cache = ModelCache(directory, max_memory, max_disk)
+    warm_start = use_warm_start
+
+
+def run_prediction(
+    sensor_id: int,
+    algorithm: str,
+    dates: np.ndarray,
+    values: np.ndarray,
+    watermark: tuple,
+    start_date: datetime,
+    end_date: datetime,
+) -> dict:
+    """
+    Train the model (unless it is cached) and predict values of the sensor between start_date and end_date.
+    Runs in a worker process. Returns the prediction ([datetimes, values]), whether the model was cached
+    (hit, miss or warm - trained starting from the previous model of the sensor) and time (in seconds)
+    of training and prediction.
+
+    dates: dates of measurements the model is trained on (see ai.parsing)
+    values: values of measurements the model is trained on
+    watermark: identifies training data, the cached model is used only if it was trained on the same data
+    """
+    model_class, model_params = PREDICT_MODELS[algorithm]
+    # Models saved by an older version of the wrapper (e.g. with different encoding of features) are not reused
+    version = getattr(model_class, "model_version", 1)
+    prefix, key = model_key(
+        sensor_id, algorithm, {**model_params, "model_version": version}, watermark
+    )
+    started = time.perf_counter()
+    model = model_cache.get(key, lambda: model_class(**model_params))
+    cache_status = "hit"
+    if model is None:
+        cache_status = "miss"
+        model = model_class(**model_params)
+        fit_params = {}
+        if warm_start and getattr(model_class, "warm_start", False):
+            # Model trained on older data of the sensor is a starting point close to the optimum
+            previous = model_cache.latest(prefix, lambda: model_class(**model_params))
+            if previous is not None:
+                cache_status = "warm"
+                fit_params["previous"] = previous
+        model.fit2(dates, values, process_data=True, **fit_params)
+        model_cache.put(key, prefix, model)
+    trained = time.perf_counter()
+    result = model.predict2(
+        start_date=start_date, end_date=end_date, interval=timedelta(minutes=1)
+    )
+    return {
+        "prediction": model.extract_result(result),
+        "model_cache": cache_status,
+        "train_time": trained - started,
+        "predict_time": time.perf_counter() - trained,
+    }
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Revalidator:
+    """
+    Stale-while-revalidate for data that is refreshed from the API into the database. It remembers when every
+    key (e.g. "overview" or "sensor:1") was last refreshed:
+    - data refreshed less than max_age seconds ago is fresh and is served from the database,
+    - data refreshed less than max_stale seconds ago is stale, it is served from the database immediately
+      while a background refresh runs,
+    - data that is older or was never refreshed by this process has to be refreshed before responding.
+    There is at most one background refresh per key at a time.
+
+    max_age: time (in seconds) data is fresh after a refresh
+    max_stale: time (in seconds) after a refresh stale data can be served
+    max_workers: maximum number of concurrent background refreshes
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+    EXPIRED = "expired"
+
+    def __init__(self, max_age: float, max_stale: float, max_workers: int = 2):
+        self.max_age = max_age
+        self.max_stale = max_stale
+        self._refreshed = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="revalidate"
+        )
+        self.stats = {"refreshes": 0, "background_refreshes": 0, "failures": 0}
+
+    def age(self, key: str) -> float | None:
+        """
+        Seconds since the last successful refresh of the key, None if it was never refreshed.
+        """
+        with self._lock:
+            refreshed = self._refreshed.get(key)
+        return time.monotonic() - refreshed if refreshed is not None else None
+
+    def state(self, key: str) -> str:
+        age = self.age(key)
+        if age is None or age > self.max_stale:
+            return self.EXPIRED
+        return self.FRESH if age <= self.max_age else self.STALE
+
+    def refresh(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Refresh the key now. Returns result of fetch, exceptions of fetch are propagated.
+        """
+        result = fetch()
+        with self._lock:
+            self._refreshed[key] = time.monotonic()
+            self.stats["refreshes"] += 1
+        return result
+
+    def refresh_in_background(self, key: str, fetch: Callable[[], Any]) -> None:
+        """
+        Refresh the key in a background thread, unless it is already being refreshed.
+        Failures are logged, stale data stays in place until the next attempt.
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return
+            self._in_flight.add(key)
+            self.stats["background_refreshes"] += 1
+
+        def run():
+            try:
+                self.refresh(key, fetch)
+            except Exception as err:
+                with self._lock:
+                    self.stats["failures"] += 1
+                logger.warning("Background refresh of %s failed: %s", key, err)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(key)
+
+        self._executor.submit(run)
@@ -4,15 +4,79 @@ CREATE TABLE IF NOT EXISTS USER (
     user_password TEXT NOT NULL
 );
 
+-- Dates are stored as unix epoch seconds and sensor values as numbers,
+-- databases created with the TEXT columns are converted by migrate.py
 CREATE TABLE IF NOT EXISTS MEASUREMENT (
-    measurement_created_at TEXT NOT NULL,
+    measurement_created_at INTEGER NOT NULL,
     measurement_id INTEGER PRIMARY KEY UNIQUE,
-    measurement_field1 TEXT NULL,
-    measurement_field2 TEXT NULL,
-    measurement_field3 TEXT NULL,
-    measurement_field4 TEXT NULL,
-    measurement_field5 TEXT NULL,
-    measurement_field6 TEXT NULL,
-    measurement_field7 TEXT NULL,
-    measurement_field8 TEXT NULL
+    measurement_field1 REAL NULL,
+    measurement_field2 REAL NULL,
+    measurement_field3 REAL NULL,
+    measurement_field4 REAL NULL,
+    measurement_field5 REAL NULL,
+    measurement_field6 REAL NULL,
+    measurement_field7 REAL NULL,
+    measurement_field8 REAL NULL
 );
+
+-- Time range queries (exports, overview between dates)
+CREATE INDEX IF NOT EXISTS measurement_time_idx ON MEASUREMENT (measurement_created_at);
+
+-- Per-sensor queries only read rows with a value for that sensor, partial indexes skip the rest
+CREATE INDEX IF NOT EXISTS measurement_sensor1_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field1 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor2_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field2 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor3_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field3 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor4_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field4 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor5_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field5 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor6_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field6 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor7_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field7 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS measurement_sensor8_idx ON MEASUREMENT (measurement_created_at) WHERE measurement_field8 IS NOT NULL;
+
+-- Pre-aggregated measurements per sensor, rollup_resolution is the bucket size in seconds (minute, hour, day)
+-- and rollup_bucket is the epoch of the bucket start. Maintained by update_database.
+CREATE TABLE IF NOT EXISTS MEASUREMENT_ROLLUP (
+    rollup_resolution INTEGER NOT NULL,
+    rollup_sensor_id INTEGER NOT NULL,
+    rollup_bucket INTEGER NOT NULL,
+    rollup_min REAL NOT NULL,
+    rollup_max REAL NOT NULL,
+    rollup_sum REAL NOT NULL,
+    rollup_count INTEGER NOT NULL,
+    PRIMARY KEY (rollup_resolution, rollup_sensor_id, rollup_bucket)
+) WITHOUT ROWID;
+
+-- Latest value and minimum/maximum of the latest day for every sensor (overview), overview_day is the number of
+-- days since epoch. Maintained by update_database.
+CREATE TABLE IF NOT EXISTS OVERVIEW_STATE (
+    overview_sensor_id INTEGER PRIMARY KEY,
+    overview_value REAL NOT NULL,
+    overview_created_at INTEGER NOT NULL,
+    overview_day INTEGER NOT NULL,
+    overview_min REAL NOT NULL,
+    overview_max REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS SYNC_CURSOR (
+    cursor_channel_id INTEGER PRIMARY KEY,
+    cursor_entry_id INTEGER NOT NULL,
+    cursor_created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS BACKFILL_CHECKPOINT (
+    checkpoint_channel_id INTEGER NOT NULL,
+    checkpoint_start TEXT NOT NULL,
+    checkpoint_end TEXT NOT NULL,
+    checkpoint_rows INTEGER NOT NULL,
+    PRIMARY KEY (checkpoint_channel_id, checkpoint_start, checkpoint_end)
+);
+
+-- Version of the measurements, incremented by update_database whenever it changes them.
+-- Cached responses are keyed by it, so writes of any process invalidate them
+CREATE TABLE IF NOT EXISTS DATA_VERSION (
+    version_id INTEGER PRIMARY KEY CHECK (version_id = 0),
+    version_value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO DATA_VERSION VALUES (0, 0);
+
+-- Schema revision, used to decide which migrations have to be applied to an existing database
+PRAGMA user_version = 2;
@@ -0,0 +1,133 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+# Modules of the server import each other by name, the same way they are run by flask
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def generate_feeds(
+    size: int, offset: int = 0, step: int = 60, start: int = 1672531200
+) -> list[dict]:
+    """
+    Feeds in the format of ThingSpeak responses, one entry every step seconds from start (epoch seconds).
+    """
+    return [
+        {
+            "created_at": datetime.fromtimestamp(
+                start + idx * step, timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "entry_id": idx + 1,
+            **{f"field{field}": f"{(idx * field) % 37}.5" for field in range(1, 9)},
+        }
+        for idx in range(offset, offset + size)
+    ]
+
+
+@pytest.fixture
+def make_feeds():
+    return generate_feeds
+
+
+class FakeThingSpeak(ThreadingHTTPServer):
+    """
+    ThingSpeak API on localhost serving feeds of a channel: feeds.json and fields/<n>.json with inclusive start
+    and end dates and the newest results entries (at most 8000), like the real API.
+
+    feeds: feeds of the channel, sorted by date
+    delays: path -> time (in seconds) the response is delayed by
+    requests: path and query parameters of every request
+    """
+
+    daemon_threads = True
+
+    def __init__(self, feeds: list[dict]):
+        super().__init__(("127.0.0.1", 0), FakeThingSpeakHandler)
+        self.feeds = feeds
+        self.delays = {}
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_port}"
+
+
+class FakeThingSpeakHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, params))
+        time.sleep(self.server.delays.get(url.path, 0))
+        parts = url.path.split("/")
+        if url.path.endswith("/feeds.json"):
+            fields = [f"field{idx}" for idx in range(1, 9)]
+        elif len(parts) == 5 and parts[3] == "fields":
+            fields = [f"field{parts[4].removesuffix('.json')}"]
+        else:
+            self.send_error(404)
+            return
+
+        # Dates are compared as strings, both are in the same format
+        start = params.get("start", "").replace(" ", "T")
+        end = params.get("end", "9999").replace(" ", "T")
+        feeds = [
+            {
+                "created_at": feed["created_at"],
+                "entry_id": feed["entry_id"],
+                **{field: feed[field] for field in fields},
+            }
+            for feed in self.server.feeds
+            if start <= feed["created_at"].rstrip("Z") <= end
+        ]
+        results = min(int(params.get("results", 8000)), 8000)
+        body = json.dumps(
+            {"channel": {"id": int(parts[2])}, "feeds": feeds[-results:]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def thingspeak():
+    """
+    Fake ThingSpeak API running in a thread, set its feeds before making requests.
+    """
+    server = FakeThingSpeak([])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """
+    Path of a new database with the schema applied.
+    """
+    path = str(tmp_path / "database.db")
+    db_conn = sqlite3.connect(path)
+    with open(os.path.join(SERVER_DIR, "schema.sql"), encoding="utf-8") as db_schema:
+        db_conn.executescript(db_schema.read())
+    db_conn.close()
+    return path
+
+
+@pytest.fixture
+def db_conn(db_path) -> sqlite3.Connection:
+    db_conn = sqlite3.connect(db_path)
+    yield db_conn
+    db_conn.close()
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backfill import backfill
+from conftest import SERVER_DIR
+from ingest import MAX_RESULTS
+from thingspeak import ThingSpeakClient
+from utils import to_epoch
+
+
+class FakeApi:
+    """
+    ThingSpeak feeds endpoint over a list of feeds: inclusive start and end, newest results only.
+    """
+
+    def __init__(self, feeds: list[dict], fail_after: int | None = None):
+        self.feeds_data = feeds
+        self.fail_after = fail_after
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def feeds(self, channel: int, params: dict) -> dict:
+        with self._lock:
+            if self.fail_after is not None and len(self.requests) >= self.fail_after:
+                raise ConnectionError("API is down")
+            self.requests.append(params)
+        start = to_epoch(params["start"].replace(" ", "T") + "Z")
+        end = to_epoch(params["end"].replace(" ", "T") + "Z")
+        feeds = [
+            feed
+            for feed in self.feeds_data
+            if start <= to_epoch(feed["created_at"]) <= end
+        ]
+        return {"channel": {"id": channel}, "feeds": feeds[-params["results"] :]}
+
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def stored_ids(db_conn) -> list[int]:
+    return [
+        row[0]
+        for row in db_conn.execute(
+            "SELECT measurement_id FROM measurement ORDER BY measurement_id"
+        )
+    ]
+
+
+def test_backfill_writes_every_window_once(db_conn, make_feeds):
+    # Three days of measurements every 10 minutes
+    feeds = make_feeds(3 * 144, step=600)
+    api = FakeApi(feeds)
+
+    written = backfill(db_conn, api, 1, START, START + timedelta(days=3), workers=4)
+
+    assert written == len(feeds)
+    assert stored_ids(db_conn) == [feed["entry_id"] for feed in feeds]
+    assert len(api.requests) == 3
+
+
+def test_backfill_splits_capped_windows(db_conn, make_feeds):
+    # More entries in a single day than a response can hold
+    feeds = make_feeds(MAX_RESULTS + 2000, step=5)
+    api = FakeApi(feeds)
+
+    written = backfill(db_conn, api, 1, START, START + timedelta(days=1), workers=2)
+
+    assert written == len(feeds)
+    assert stored_ids(db_conn) == [feed["entry_id"] for feed in feeds]
+    assert len(api.requests) > 1
+
+
+def test_interrupted_backfill_resumes_from_checkpoints(db_conn, make_feeds):
+    feeds = make_feeds(4 * 144, step=600)
+    end = START + timedelta(days=4)
+
+    # A batch per window, so windows fetched before the API fails are committed
+    with pytest.raises(ConnectionError):
+        backfill(
+            db_conn,
+            FakeApi(feeds, fail_after=2),
+            1,
+            START,
+            end,
+            workers=1,
+            batch_size=1,
+        )
+    committed = len(stored_ids(db_conn)) // 144
+    assert committed <= 2
+
+    api = FakeApi(feeds)
+    written = backfill(db_conn, api, 1, START, end, workers=1, batch_size=1)
+
+    # Only windows without a checkpoint are fetched again
+    assert written == (4 - committed) * 144
+    assert len(api.requests) == 4 - committed
+    assert stored_ids(db_conn) == [feed["entry_id"] for feed in feeds]
+
+    # Everything is covered by checkpoints, nothing is fetched again
+    api = FakeApi(feeds)
+    assert backfill(db_conn, api, 1, START, end) == 0
+    assert api.requests == []
+
+
+def test_backfill_through_http_client(db_conn, make_feeds, thingspeak):
+    # Two days, the second one with more entries than a response can hold
+    thingspeak.feeds = make_feeds(144, step=600) + make_feeds(
+        MAX_RESULTS + 1000, step=9, start=to_epoch("2023-01-02T00:00:00Z")
+    )
+    for idx, feed in enumerate(thingspeak.feeds):
+        feed["entry_id"] = idx + 1
+    api = ThingSpeakClient(thingspeak.url, pool_size=4)
+
+    written = backfill(db_conn, api, 1, START, START + timedelta(days=2), workers=4)
+
+    assert written == len(thingspeak.feeds)
+    assert stored_ids(db_conn) == [feed["entry_id"] for feed in thingspeak.feeds]
+    # Query parameters are built by the client in the format ThingSpeak expects
+    assert {path for path, _ in thingspeak.requests} == {"/channels/1/feeds.json"}
+    assert {params["results"] for _, params in thingspeak.requests} == {
+        str(MAX_RESULTS)
+    }
+    windows = [(params["start"], params["end"]) for _, params in thingspeak.requests]
+    assert ("2023-01-01 00:00:00", "2023-01-01 23:59:59") in windows
+    assert ("2023-01-02 00:00:00", "2023-01-02 23:59:59") in windows
+    # The capped day was split
+    assert len(thingspeak.requests) > 2
+
+
+def test_backfill_command(db_path, make_feeds, thingspeak):
+    thingspeak.feeds = make_feeds(3 * 144, step=600)
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(SERVER_DIR, "backfill.py"),
+            db_path,
+            "2023-01-01",
+            "2023-01-04",
+            "--api",
+            thingspeak.url,
+            "--channel",
+            "7",
+            "--workers",
+            "2",
+        ],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert f"Done: {3 * 144} rows" in result.stdout
+    assert {path for path, _ in thingspeak.requests} == {"/channels/7/feeds.json"}
+    db_conn = sqlite3.connect(db_path)
+    assert len(stored_ids(db_conn)) == 3 * 144
+    assert db_conn.execute("SELECT COUNT(*) FROM backfill_checkpoint").fetchone() == (
+        3,
+    )
+    db_conn.close()
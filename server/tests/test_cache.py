@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+import utils
+
+from cache import data_version
+from overview import OverviewState
+from utils import update_database
+
+
+def test_data_version_is_shared_by_connections(db_path, make_feeds):
+    # Connections of two processes, e.g. two workers of the server
+    writer = sqlite3.connect(db_path)
+    reader = sqlite3.connect(db_path)
+    version = data_version.get(reader)
+
+    update_database(writer, {"feeds": make_feeds(100)})
+    assert data_version.get(reader) == version + 1
+
+    # Rows that do not change anything do not invalidate cached responses
+    update_database(writer, {"feeds": make_feeds(100)})
+    update_database(writer, {"feeds": []})
+    assert data_version.get(reader) == version + 1
+
+    update_database(writer, {"feeds": make_feeds(10, offset=100)})
+    assert data_version.get(reader) == version + 2
+    writer.close()
+    reader.close()
+
+
+def test_failed_write_does_not_change_data_version(db_conn, make_feeds, monkeypatch):
+    version = data_version.get(db_conn)
+
+    class FailingVersion:
+        # Fails after the version was bumped, before the transaction commits
+        @staticmethod
+        def bump(db_conn):
+            data_version.bump(db_conn)
+            raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(utils, "data_version", FailingVersion)
+    with pytest.raises(sqlite3.OperationalError):
+        utils.update_database(db_conn, {"feeds": make_feeds(10)})
+
+    # The version is bumped in the transaction of the write, so it is rolled back with the rows
+    assert data_version.get(db_conn) == version
+    assert db_conn.execute("SELECT COUNT(*) FROM measurement").fetchone()[0] == 0
+
+
+def test_overview_mirror_picks_up_writes_of_other_processes(db_path, make_feeds):
+    writer = sqlite3.connect(db_path)
+    reader = sqlite3.connect(db_path)
+    # Mirror of another worker, loaded before the write
+    state = OverviewState()
+    update_database(writer, {"feeds": make_feeds(10)})
+    assert str(state.get(reader)["created_at"]) == "2023-01-01"
+
+    update_database(writer, {"feeds": make_feeds(10, offset=1440)})
+
+    assert str(state.get(reader)["created_at"]) == "2023-01-02"
+    writer.close()
+    reader.close()
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import time
+
+import utils
+
+from cache import DataVersion
+from db import ConnectionPool
+from utils import get_db_measurements, update_database
+
+# Same as DB_PRAGMAS of the backend
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+}
+
+
+class CountingPool(ConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+        self._count_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        with self._count_lock:
+            self.opened += 1
+        return super().connect()
+
+
+def test_pool_connections_use_wal(db_path):
+    db_pool = ConnectionPool(db_path, PRAGMAS)
+    db_conn = db_pool.acquire()
+    assert db_conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db_pool.release(db_conn)
+    with db_pool.writer() as db_conn:
+        assert db_conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db_conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    db_pool.close()
+
+
+def test_pool_reuses_connections_under_concurrent_readers(db_path, make_feeds):
+    num_readers = 4
+    db_pool = CountingPool(db_path, PRAGMAS, max_idle=num_readers)
+    with db_pool.writer() as db_conn:
+        update_database(db_conn, {"feeds": make_feeds(100)})
+    # The writer connection is the only one opened so far
+    assert db_pool.opened == 1
+    errors = []
+    barrier = threading.Barrier(num_readers)
+
+    def reader():
+        try:
+            barrier.wait()
+            for _ in range(200):
+                db_conn = db_pool.acquire()
+                assert len(get_db_measurements(db_conn, 1, 10)) == 10
+                db_pool.release(db_conn)
+        except Exception as err:
+            errors.append(err)
+
+    readers = [threading.Thread(target=reader) for _ in range(num_readers)]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    # 800 reads were served by at most one connection per concurrent reader
+    assert db_pool.opened <= 1 + num_readers
+    db_pool.close()
+
+
+def test_pool_closes_connections_above_idle_limit(db_path):
+    db_pool = CountingPool(db_path, PRAGMAS, max_idle=1)
+    first, second = db_pool.acquire(), db_pool.acquire()
+    db_pool.release(first)
+    db_pool.release(second)
+    # The second connection did not fit into the pool and was closed
+    try:
+        second.execute("SELECT 1")
+        closed = False
+    except sqlite3.ProgrammingError:
+        closed = True
+    assert closed
+    assert db_pool.acquire() is first
+    db_pool.close()
+
+
+def test_release_rolls_back_open_transaction(db_path):
+    db_pool = ConnectionPool(db_path, PRAGMAS, max_idle=1)
+    db_conn = db_pool.acquire()
+    db_conn.execute(
+        "INSERT INTO measurement (measurement_created_at, measurement_id) VALUES (0, 1)"
+    )
+    db_pool.release(db_conn)
+    assert not db_conn.in_transaction
+    assert db_conn.execute("SELECT COUNT(*) FROM measurement").fetchone()[0] == 0
+    db_pool.close()
+
+
+def test_readers_are_not_blocked_by_writer(db_path, make_feeds, monkeypatch):
+    db_pool = ConnectionPool(db_path, {**PRAGMAS, "busy_timeout": 0})
+    with db_pool.writer() as db_conn:
+        update_database(db_conn, {"feeds": make_feeds(10)})
+    in_transaction = threading.Event()
+    reads_done = threading.Event()
+
+    class PausedVersion(DataVersion):
+        @staticmethod
+        def bump(db_conn: sqlite3.Connection) -> None:
+            # Rows of the batch are written, but not committed yet
+            in_transaction.set()
+            reads_done.wait(10)
+            DataVersion.bump(db_conn)
+
+    monkeypatch.setattr(utils, "data_version", PausedVersion)
+
+    def write():
+        with db_pool.writer() as db_conn:
+            update_database(db_conn, {"feeds": make_feeds(30000, offset=10)})
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    reader = db_pool.acquire()
+    # Readers keep working while the writer inserts the batch and holds the write lock
+    while not in_transaction.is_set():
+        started = time.perf_counter()
+        assert len(get_db_measurements(reader, 1, 99)) == 10
+        assert time.perf_counter() - started < 0.5
+        time.sleep(0.01)
+    # and see the last committed data without waiting for the commit
+    assert reader.execute("SELECT COUNT(*) FROM measurement").fetchone()[0] == 10
+    reads_done.set()
+    writer.join()
+    assert reader.execute("SELECT COUNT(*) FROM measurement").fetchone()[0] == 30010
+    db_pool.release(reader)
+    db_pool.close()
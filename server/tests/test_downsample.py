@@ -0,0 +1,74 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from downsample import downsample_arrays, downsample_series, lttb
+from utils import (
+    convert_sensor_data,
+    get_db_measurement_arrays,
+    get_db_measurements,
+    update_database,
+)
+
+
+@pytest.mark.parametrize("max_points", [-5, 0, 1, 2])
+def test_lttb_rejects_less_than_three_points(max_points):
+    with pytest.raises(ValueError):
+        lttb(np.arange(10.0), np.arange(10.0), max_points)
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x = np.arange(100_000, dtype=np.float64)
+    y = np.sin(x / 1000)
+    spikes = [12_345, 67_890]
+    y[spikes] = 50
+
+    selected = lttb(x, y, 500)
+
+    assert len(selected) == 500
+    assert selected[0] == 0 and selected[-1] == len(x) - 1
+    assert np.all(np.diff(selected) > 0)
+    assert set(spikes) <= set(selected.tolist())
+
+
+def test_lttb_keeps_short_series():
+    assert lttb(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_measurement_arrays_match_measurements(db_conn, make_feeds):
+    feeds = make_feeds(3000)
+    for feed in feeds[::4]:
+        feed["field2"] = None
+    update_database(db_conn, {"feeds": feeds})
+
+    ids, timestamps, values = get_db_measurement_arrays(db_conn, 2, 2000)
+    series = convert_sensor_data(get_db_measurements(db_conn, 2, 2000), "field2")
+
+    assert ids.tolist() == [point["id"] for point in series]
+    assert values.tolist() == [point["value"] for point in series]
+    assert len(ids) == len(timestamps) == 2000
+
+
+def test_measurement_arrays_of_pooled_connection(db_conn, make_feeds):
+    update_database(db_conn, {"feeds": make_feeds(10)})
+    # Pooled connections return rows as sqlite3.Row
+    db_conn.row_factory = sqlite3.Row
+    ids, _, _ = get_db_measurement_arrays(db_conn, 1, 100)
+    assert ids.tolist() == list(range(10, 0, -1))
+
+
+def test_measurement_arrays_of_empty_range(db_conn):
+    ids, timestamps, values = get_db_measurement_arrays(db_conn, 1, 100)
+    assert len(ids) == len(timestamps) == len(values) == 0
+
+
+def test_downsampled_arrays_match_downsampled_series(db_conn, make_feeds):
+    update_database(db_conn, {"feeds": make_feeds(5000)})
+    series = convert_sensor_data(get_db_measurements(db_conn, 3, 10_000), "field3")
+
+    downsampled = downsample_arrays(
+        *get_db_measurement_arrays(db_conn, 3, 10_000), 300, "field3"
+    )
+
+    assert downsampled == downsample_series(series, 300)
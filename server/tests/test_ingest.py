@@ -0,0 +1,232 @@
+import importlib
+import sys
+import time
+
+import pytest
+
+from db import ConnectionPool
+from ingest import IngestionPoller, MAX_RESULTS, start_ingestion, sync_channel
+from thingspeak import ThingSpeakClient
+from utils import get_sync_cursor, to_epoch
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def stored_rows(db_pool: ConnectionPool) -> int:
+    db_conn = db_pool.acquire()
+    try:
+        return db_conn.execute("SELECT COUNT(*) FROM measurement").fetchone()[0]
+    finally:
+        db_pool.release(db_conn)
+
+
+@pytest.fixture
+def db_pool(db_path) -> ConnectionPool:
+    db_pool = ConnectionPool(db_path)
+    yield db_pool
+    db_pool.close()
+
+
+def test_poller_writes_new_feeds(thingspeak, make_feeds, db_pool):
+    thingspeak.feeds = make_feeds(100)
+    poller = IngestionPoller(ThingSpeakClient(thingspeak.url), db_pool, {1: 0.05})
+    poller.start()
+    try:
+        wait_for(lambda: stored_rows(db_pool) == 100)
+        # New feeds arrive between polls
+        thingspeak.feeds = make_feeds(150)
+        wait_for(lambda: stored_rows(db_pool) == 150)
+        wait_for(lambda: poller.health()["channels"][1]["polls"] >= 3)
+
+        db_conn = db_pool.acquire()
+        health = poller.health(db_conn)
+        db_pool.release(db_conn)
+    finally:
+        poller.stop()
+
+    assert health["running"] and health["healthy"]
+    channel = health["channels"][1]
+    assert channel["failures"] == 0 and channel["last_error"] is None
+    assert channel["seconds_since_success"] < 1
+    # Lag is the age of the newest stored measurement
+    newest = thingspeak.feeds[-1]["created_at"]
+    assert health["data_lag"] == pytest.approx(time.time() - to_epoch(newest), abs=5)
+    assert not poller.is_alive()
+
+
+def test_failed_polls_are_reported(db_pool):
+    # Nothing listens on the port
+    api = ThingSpeakClient("http://127.0.0.1:9", timeout=(0.5, 0.5), retries=0)
+    poller = IngestionPoller(api, db_pool, {1: 60})
+
+    poller.poll(1)
+    poller.poll(1)
+
+    health = poller.health()
+    assert not health["healthy"]
+    assert health["data_lag"] is None
+    channel = health["channels"][1]
+    assert (channel["polls"], channel["failures"]) == (2, 2)
+    assert channel["last_error"]
+    assert channel["seconds_since_success"] is None
+    assert not channel["healthy"]
+
+
+def test_poll_older_than_two_intervals_is_unhealthy(thingspeak, make_feeds, db_pool):
+    thingspeak.feeds = make_feeds(10)
+    poller = IngestionPoller(ThingSpeakClient(thingspeak.url), db_pool, {1: 0.05})
+
+    poller.poll(1)
+    assert poller.health()["channels"][1]["healthy"]
+    time.sleep(0.15)
+    assert not poller.health()["channels"][1]["healthy"]
+
+
+def test_schedule_with_several_channels_is_rejected(db_pool):
+    api = ThingSpeakClient("http://127.0.0.1:9")
+    with pytest.raises(ValueError):
+        IngestionPoller(api, db_pool, {1: 60, 2: 60})
+    # Rows of another channel would be served as rows of the configured one
+    with pytest.raises(ValueError):
+        start_ingestion(api, db_pool, 1, 60, {2: 60})
+
+
+@pytest.fixture
+def main(monkeypatch, tmp_path, db_path):
+    """
+    The flask app with its database replaced and without the poller it starts on import.
+    """
+    monkeypatch.chdir(tmp_path)
+    import ingest
+
+    monkeypatch.setattr(ingest, "start_ingestion", lambda *args: None)
+    main = sys.modules.get("main") or importlib.import_module("main")
+    monkeypatch.setattr(main, "db_pool", ConnectionPool(db_path))
+    yield main
+    main.db_pool.close()
+
+
+def test_health_reports_poller_state(main, monkeypatch, thingspeak, make_feeds):
+    thingspeak.feeds = make_feeds(10)
+    poller = IngestionPoller(ThingSpeakClient(thingspeak.url), main.db_pool, {1: 60})
+    monkeypatch.setattr(main, "poller", poller)
+    client = main.app.test_client()
+
+    # Not running yet
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json["running"] is False
+
+    poller.start()
+    try:
+        wait_for(lambda: poller.health()["healthy"])
+        response = client.get("/health")
+    finally:
+        poller.stop()
+    assert response.status_code == 200
+    assert response.json["healthy"] is True
+    assert response.json["data_lag"] > 0
+    assert response.json["channels"]["1"]["polls"] == 1
+
+    # Stopped poller
+    assert client.get("/health").status_code == 503
+
+
+def test_health_without_poller(main, monkeypatch):
+    monkeypatch.setattr(main, "poller", None)
+
+    response = main.app.test_client().get("/health")
+
+    assert response.status_code == 200
+    assert response.json["running"] is False
+
+
+def api_date(feed: dict) -> str:
+    return feed["created_at"].replace("T", " ").rstrip("Z")
+
+
+def stored_ids(db_pool: ConnectionPool) -> list[int]:
+    db_conn = db_pool.acquire()
+    try:
+        return [
+            row[0]
+            for row in db_conn.execute(
+                "SELECT measurement_id FROM measurement ORDER BY measurement_id"
+            )
+        ]
+    finally:
+        db_pool.release(db_conn)
+
+
+def test_sync_with_empty_cursor_fetches_newest_page(thingspeak, make_feeds, db_pool):
+    thingspeak.feeds = make_feeds(MAX_RESULTS + 100)
+    api = ThingSpeakClient(thingspeak.url)
+
+    written = sync_channel(db_pool, api, 1)
+
+    # History older than the newest page is filled by the backfill
+    assert written == MAX_RESULTS
+    assert stored_ids(db_pool) == list(range(101, MAX_RESULTS + 101))
+    assert thingspeak.requests == [
+        ("/channels/1/feeds.json", {"results": str(MAX_RESULTS)})
+    ]
+    with db_pool.writer() as db_conn:
+        assert get_sync_cursor(db_conn, 1) == (
+            MAX_RESULTS + 100,
+            thingspeak.feeds[-1]["created_at"],
+        )
+
+
+def test_sync_pages_through_large_delta(thingspeak, make_feeds, db_pool):
+    thingspeak.feeds = make_feeds(100)
+    api = ThingSpeakClient(thingspeak.url)
+    sync_channel(db_pool, api, 1)
+    thingspeak.requests.clear()
+
+    # More new entries than fit into a response
+    thingspeak.feeds = make_feeds(100 + 2 * MAX_RESULTS + 500)
+    written = sync_channel(db_pool, api, 1)
+
+    assert written == 2 * MAX_RESULTS + 500
+    assert stored_ids(db_pool) == [feed["entry_id"] for feed in thingspeak.feeds]
+    # Newest page first, then older pages ending where the previous one started, until the cursor is reached
+    assert len(thingspeak.requests) == 3
+    start = api_date(thingspeak.feeds[99])
+    assert all(params["start"] == start for _, params in thingspeak.requests)
+    assert "end" not in thingspeak.requests[0][1]
+    assert thingspeak.requests[1][1]["end"] == api_date(thingspeak.feeds[-MAX_RESULTS])
+
+
+def test_sync_deduplicates_entries_of_boundary_second(thingspeak, make_feeds, db_pool):
+    # 10 entries every second, so every page boundary splits a second
+    feeds = make_feeds(300, step=1)
+    for idx, feed in enumerate(feeds):
+        feed["created_at"] = feeds[idx // 10 * 10]["created_at"]
+    thingspeak.feeds = feeds[:50]
+    api = ThingSpeakClient(thingspeak.url)
+    sync_channel(db_pool, api, 1, page_size=64)
+
+    thingspeak.feeds = feeds
+    written = sync_channel(db_pool, api, 1, page_size=64)
+
+    assert written == 250
+    assert stored_ids(db_pool) == list(range(1, 301))
+
+
+def test_repeated_sync_fetches_nothing(thingspeak, make_feeds, db_pool):
+    thingspeak.feeds = make_feeds(500)
+    api = ThingSpeakClient(thingspeak.url)
+    sync_channel(db_pool, api, 1)
+    thingspeak.requests.clear()
+
+    assert sync_channel(db_pool, api, 1) == 0
+    assert sync_channel(db_pool, api, 1) == 0
+
+    # A single request per sync, which only returns the entry of the cursor
+    assert len(thingspeak.requests) == 2
+    assert stored_ids(db_pool) == list(range(1, 501))
@@ -0,0 +1,102 @@
+import math
+import os
+import time
+
+from concurrent.futures import Future
+
+import pytest
+
+from jobs import JobQueue, QueueFullError
+
+
+class FakeExecutor:
+    """
+    Executor which only creates futures, tests start and finish them.
+    """
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            for future in self.futures:
+                future.cancel()
+
+
+@pytest.fixture
+def queue(monkeypatch) -> JobQueue:
+    monkeypatch.setattr(JobQueue, "_create_executor", lambda self: FakeExecutor())
+    return JobQueue(max_pending=2)
+
+
+def test_waiting_job_is_cancelled(queue):
+    job_id, _ = queue.submit("a", math.factorial, 5)
+
+    assert queue.cancel(job_id)
+    assert queue.get(job_id)["status"] == JobQueue.CANCELLED
+    assert queue._executor.futures[0].cancelled()
+    assert queue.pending() == 0
+    assert queue.stats["cancelled"] == 1
+    assert not queue.cancel(job_id)
+
+
+def test_running_job_is_not_cancelled(queue):
+    job_id, _ = queue.submit("a", math.factorial, 5)
+    queue.submit("b", math.factorial, 6)
+    future = queue._executor.futures[0]
+    future.set_running_or_notify_cancel()
+
+    assert not queue.cancel(job_id)
+    assert queue.get(job_id)["status"] == JobQueue.RUNNING
+    # The running job still takes a place in the queue
+    with pytest.raises(QueueFullError):
+        queue.submit("c", math.factorial, 7)
+
+    now = time.time()
+    future.set_result((now, now, 120))
+    job = queue.get(job_id)
+    assert (job["status"], job["result"]) == (JobQueue.DONE, 120)
+    assert queue.pending() == 1
+    assert queue.stats["cancelled"] == 0
+
+
+def test_jobs_cancelled_by_pool_restart_fail(queue):
+    job_id, _ = queue.submit("a", math.factorial, 5)
+
+    # What submit does once the pool is broken
+    queue._executor.shutdown(wait=False, cancel_futures=True)
+
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == (JobQueue.FAILED, "worker pool restarted")
+    assert queue.pending() == 0
+    assert queue.stats["failed"] == 1
+    # The job can be submitted again
+    assert queue.submit("a", math.factorial, 5)[1]
+
+
+def wait_finished(queue: JobQueue, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while (job := queue.get(job_id))["status"] in [JobQueue.QUEUED, JobQueue.RUNNING]:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+    return job
+
+
+def test_broken_pool_is_replaced():
+    queue = JobQueue(max_workers=1)
+    try:
+        # The worker process dies, which breaks the pool
+        crashed_id, _ = queue.submit("crash", os._exit, 1)
+        assert wait_finished(queue, crashed_id)["status"] == JobQueue.FAILED
+
+        job_id, _ = queue.submit("factorial", math.factorial, 5)
+        job = wait_finished(queue, job_id)
+        assert (job["status"], job["result"]) == (JobQueue.DONE, 120)
+        assert queue.pending() == 0
+    finally:
+        queue._executor.shutdown(cancel_futures=True)
@@ -0,0 +1,150 @@
+import math
+import sqlite3
+
+from types import SimpleNamespace
+
+import pytest
+
+import migrate
+
+from migrate import (
+    migrate_typed_storage,
+    needs_typed_storage_migration,
+    sql_to_real,
+    sql_trim,
+    TYPED_STORAGE_VERSION,
+)
+from utils import to_epoch, to_number
+
+# MEASUREMENT before typed storage (schema revision 1)
+V1_SCHEMA = """
+CREATE TABLE MEASUREMENT (
+    measurement_created_at TEXT NOT NULL,
+    measurement_id INTEGER PRIMARY KEY UNIQUE,
+    measurement_field1 TEXT NULL,
+    measurement_field2 TEXT NULL,
+    measurement_field3 TEXT NULL,
+    measurement_field4 TEXT NULL,
+    measurement_field5 TEXT NULL,
+    measurement_field6 TEXT NULL,
+    measurement_field7 TEXT NULL,
+    measurement_field8 TEXT NULL
+);
+"""
+
+# Values as the API returned them, including broken ones
+RAW_VALUES = ["21.50\r\n", "-3", ".", "-", "", "None", "1e3", "abc", None]
+
+
+def v1_row(feed: dict, idx: int) -> list:
+    values = [RAW_VALUES[(idx + field) % len(RAW_VALUES)] for field in range(8)]
+    return [feed["created_at"], feed["entry_id"], *values]
+
+
+def expected_row(row: list) -> tuple:
+    created_at = row[0] if isinstance(row[0], int) else to_epoch(row[0])
+    return (created_at, row[1], *(to_number(value) for value in row[2:]))
+
+
+@pytest.fixture
+def v1_db(tmp_path, make_feeds) -> tuple[sqlite3.Connection, list[list]]:
+    db_conn = sqlite3.connect(str(tmp_path / "database.db"))
+    db_conn.executescript(V1_SCHEMA)
+    rows = [v1_row(feed, idx) for idx, feed in enumerate(make_feeds(100))]
+    db_conn.executemany(
+        "INSERT INTO measurement VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    db_conn.commit()
+    yield db_conn, rows
+    db_conn.close()
+
+
+def measurements(db_conn: sqlite3.Connection) -> list[tuple]:
+    return db_conn.execute(
+        "SELECT * FROM measurement ORDER BY measurement_id"
+    ).fetchall()
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["21.5", " -21.50\r\n", "+.5", "5.", "1E-3", "-1e+3", "inf", "-Infinity", "nan"]
+    + [".", "-", "+", "", "None", "e5", "1e", "1.2.3", "--1", "1-2", "0x10", "abc"],
+)
+def test_sql_conversion_matches_to_number(value):
+    db_conn = sqlite3.connect(":memory:")
+    converted = db_conn.execute(
+        f"SELECT {sql_to_real(sql_trim('?1'))}", [value]
+    ).fetchone()[0]
+    number = to_number(value)
+    # SQLite stores NaN as NULL
+    if number is not None and math.isnan(number):
+        number = None
+    assert converted == number
+
+
+def test_migration_converts_values(v1_db):
+    db_conn, rows = v1_db
+    assert needs_typed_storage_migration(db_conn)
+
+    copied = migrate_typed_storage(db_conn, batch_size=7, pause=0)
+
+    assert copied == len(rows)
+    assert measurements(db_conn) == [expected_row(row) for row in rows]
+    columns = {
+        name: column_type
+        for _, name, column_type, *_ in db_conn.execute(
+            "PRAGMA table_info(measurement)"
+        )
+    }
+    assert columns["measurement_created_at"] == "INTEGER"
+    assert columns["measurement_field1"] == "REAL"
+    indexes = {
+        row[0]
+        for row in db_conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'MEASUREMENT'"
+        )
+    }
+    assert {"measurement_time_idx", "measurement_sensor1_idx"} <= indexes
+    assert db_conn.execute("PRAGMA user_version").fetchone()[0] == TYPED_STORAGE_VERSION
+    assert (
+        db_conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' OR name = 'measurement_new'"
+        ).fetchall()
+        == []
+    )
+    assert not needs_typed_storage_migration(db_conn)
+
+
+def test_writes_during_migration_are_converted(v1_db, monkeypatch):
+    db_conn, rows = v1_db
+    other = sqlite3.connect(db_conn.execute("PRAGMA database_list").fetchone()[2])
+    new_rows = [
+        # Written by the old backend
+        ["2023-01-02T00:00:00Z", 1000, "1.5", None, None, None, None, None, None, "."],
+        # Written by a backend already on typed storage
+        [1672617660, 1001, 2.5, None, None, None, None, None, None, None],
+    ]
+
+    def write(seconds):
+        # Runs between the batches, the first batch is already copied
+        if (
+            other.execute(
+                "SELECT 1 FROM measurement WHERE measurement_id = 1000"
+            ).fetchone()
+            is None
+        ):
+            with other:
+                other.executemany(
+                    "INSERT INTO measurement VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    new_rows,
+                )
+                other.execute(
+                    "UPDATE measurement SET measurement_field1 = '7' WHERE measurement_id = 1"
+                )
+
+    monkeypatch.setattr(migrate, "time", SimpleNamespace(sleep=write))
+    migrate_typed_storage(db_conn, batch_size=10)
+    other.close()
+
+    rows[0][2] = "7"
+    assert measurements(db_conn) == [expected_row(row) for row in rows + new_rows]
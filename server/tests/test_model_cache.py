@@ -0,0 +1,141 @@
+import json
+import os
+
+import pytest
+
+from model_cache import model_key, ModelCache
+
+
+class StubModel:
+    """
+    Model saving its weights as JSON, padded to size bytes.
+    """
+
+    file_extension = "json"
+
+    def __init__(self, weights=None, size: int = 100):
+        self.weights = weights
+        self.size = size
+
+    def save2(self, path: str) -> None:
+        data = json.dumps({"weights": self.weights})
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(data.ljust(self.size))
+
+    def load2(self, path: str) -> None:
+        with open(path, encoding="utf-8") as file:
+            self.weights = json.load(file)["weights"]
+
+
+PARAMS = {"n_neighbors": 3}
+
+
+def key_of(watermark: tuple, params: dict = PARAMS) -> tuple[str, str]:
+    return model_key(1, "KNN", params, watermark)
+
+
+@pytest.fixture
+def cache(tmp_path) -> ModelCache:
+    return ModelCache(str(tmp_path / "models"))
+
+
+def test_get_after_put_is_a_hit(cache):
+    prefix, key = key_of((10, 100))
+    assert cache.get(key, StubModel) is None
+
+    model = StubModel([1, 2])
+    cache.put(key, prefix, model)
+
+    assert cache.get(key, StubModel) is model
+    # Another process (or a restart) loads the saved model
+    other = ModelCache(cache.directory)
+    assert other.get(key, StubModel).weights == [1, 2]
+    assert cache.stats["misses"] == 1
+    assert cache.stats["memory_hits"] == 1
+    assert other.stats["disk_hits"] == 1
+
+
+def test_new_data_or_hyperparameters_are_a_miss(cache):
+    prefix, key = key_of((10, 100))
+    cache.put(key, prefix, StubModel([1]))
+
+    assert cache.get(key_of((11, 101))[1], StubModel) is None
+    assert cache.get(key_of((10, 100), {"n_neighbors": 5})[1], StubModel) is None
+    assert cache.get(model_key(2, "KNN", PARAMS, (10, 100))[1], StubModel) is None
+    assert key_of((10, 100), {"n_neighbors": 5})[0] != prefix
+    assert cache.stats["misses"] == 3
+
+
+def test_latest_falls_back_to_older_watermark(cache):
+    prefix, old_key = key_of((10, 100))
+    _, new_key = key_of((11, 101))
+    cache.put(old_key, prefix, StubModel([1]))
+
+    assert cache.get(new_key, StubModel) is None
+    # From memory and, in another process, from disk
+    assert cache.latest(prefix, StubModel).weights == [1]
+    assert ModelCache(cache.directory).latest(prefix, StubModel).weights == [1]
+    assert cache.latest(key_of((10, 100), {"n_neighbors": 5})[0], StubModel) is None
+
+    # The model trained on new data replaces the older one
+    cache.put(new_key, prefix, StubModel([2]))
+    assert cache.latest(prefix, StubModel).weights == [2]
+    assert ModelCache(cache.directory).get(old_key, StubModel) is None
+    assert len(os.listdir(cache.directory)) == 1
+
+
+def test_memory_is_evicted_least_recently_used(tmp_path):
+    cache = ModelCache(str(tmp_path), max_memory=250)
+    keys = [model_key(sensor_id, "KNN", PARAMS, (1,)) for sensor_id in range(3)]
+    for sensor_id, (prefix, key) in enumerate(keys[:2]):
+        cache.put(key, prefix, StubModel([sensor_id]))
+    # Used last, so the second model is evicted instead
+    cache.get(keys[0][1], StubModel)
+    cache.put(keys[2][1], keys[2][0], StubModel([2]))
+
+    assert list(cache._models) == [keys[0][1], keys[2][1]]
+    assert cache._memory == 200
+    assert cache.stats["evictions"] == 1
+    # Evicted from memory only, it is loaded from disk again
+    assert cache.get(keys[1][1], StubModel).weights == [1]
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_disk_is_evicted_least_recently_used(tmp_path):
+    cache = ModelCache(str(tmp_path), max_disk=250)
+    keys = [model_key(sensor_id, "KNN", PARAMS, (1,)) for sensor_id in range(3)]
+    for sensor_id, (prefix, key) in enumerate(keys[:2]):
+        cache.put(key, prefix, StubModel([sensor_id]))
+        # Modification times order the files, make them distinct
+        os.utime(os.path.join(str(tmp_path), f"{key}.json"), (sensor_id, sensor_id))
+    cache.put(keys[2][1], keys[2][0], StubModel([2]))
+
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        f"{key}.json" for _, key in [keys[1], keys[2]]
+    )
+    assert cache.disk_usage() == 200
+    assert cache.stats["evictions"] == 1
+
+
+def test_newest_model_is_kept_over_budget(tmp_path):
+    cache = ModelCache(str(tmp_path), max_memory=50, max_disk=50)
+    prefix, key = key_of((10, 100))
+    model = StubModel([1])
+    cache.put(key, prefix, model)
+
+    assert cache.get(key, StubModel) is model
+    assert os.listdir(str(tmp_path)) == [f"{key}.json"]
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"other": 1}', ""])
+def test_unloadable_file_is_a_miss_and_removed(cache, content):
+    prefix, key = key_of((10, 100))
+    path = os.path.join(cache.directory, f"{key}.json")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+
+    assert cache.get(key, StubModel) is None
+    assert not os.path.exists(path)
+    assert cache.latest(prefix, StubModel) is None
+    assert cache.stats["misses"] == 1
+    assert cache.stats["disk_hits"] == 0
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from overview import CHANNEL_TITLES, OverviewState
+from utils import fetch_overview, update_database
+
+
+def baseline_fetch_overview(raw_data: dict) -> dict:
+    # fetch_overview before the overview state was introduced, kept verbatim as the reference
+    channel_keys = [f"field{idx}" for idx in range(1, 9)]
+
+    overview = {}
+    for key in channel_keys:
+        overview[key] = {"title": raw_data["channel"][key]}
+
+    latest_date = None
+    for idx in range(len(raw_data["feeds"]) - 1, -1, -1):
+        if latest_date is not None:
+            current_date = datetime.strptime(
+                raw_data["feeds"][idx]["created_at"], "%Y-%m-%dT%H:%M:%SZ"
+            )
+            if current_date.date() != latest_date.date():
+                break
+        for key in channel_keys:
+            if raw_data["feeds"][idx][key] is not None:
+                if latest_date is None:
+                    latest_date = datetime.strptime(
+                        raw_data["feeds"][idx]["created_at"], "%Y-%m-%dT%H:%M:%SZ"
+                    )
+                overview[key]["value"] = str(raw_data["feeds"][idx][key]).strip()
+                try:
+                    if (
+                        "min" not in overview[key]
+                        or float(raw_data["feeds"][idx][key]) < overview[key]["min"]
+                    ):
+                        overview[key]["min"] = float(raw_data["feeds"][idx][key])
+                    if (
+                        "max" not in overview[key]
+                        or float(raw_data["feeds"][idx][key]) > overview[key]["max"]
+                    ):
+                        overview[key]["max"] = float(raw_data["feeds"][idx][key])
+                except ValueError:
+                    pass
+    overview["created_at"] = latest_date.date() if latest_date is not None else None
+    return overview
+
+
+def expected_overview(raw_data: dict) -> dict:
+    """
+    Baseline overview with the latest value of the day instead of the earliest one.
+    """
+    overview = baseline_fetch_overview(raw_data)
+    for feed in raw_data["feeds"]:
+        if feed["created_at"][:10] != str(overview["created_at"]):
+            continue
+        for key in CHANNEL_TITLES:
+            if feed[key] is not None:
+                overview[key]["value"] = str(feed[key]).strip()
+    return overview
+
+
+def fixture_feeds(size: int) -> list[dict]:
+    """
+    Measurement every 7 minutes from 22:00, crossing several days. Sensors report at different rates,
+    field8 stops reporting a day before the end, values carry the \\r\\n some devices send.
+    """
+    start = 1672610400
+    feeds = []
+    for idx in range(1, size + 1):
+        feed = {
+            "created_at": datetime.fromtimestamp(
+                start + idx * 420, timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "entry_id": idx,
+        }
+        for field in range(1, 8):
+            feed[f"field{field}"] = (
+                f"{(idx * field * 7) % 97 - 20}.25\r\n" if idx % field == 0 else None
+            )
+        feed["field8"] = "1.5" if idx < size - 250 else None
+        feeds.append(feed)
+    return feeds
+
+
+@pytest.mark.parametrize("size", [0, 1, 100, 1000])
+def test_fetch_overview_matches_baseline(size):
+    raw_data = {"channel": CHANNEL_TITLES, "feeds": fixture_feeds(size)}
+    assert fetch_overview(raw_data) == expected_overview(raw_data)
+
+
+def as_numbers(overview: dict) -> dict:
+    # Stored values are numbers, the API returns them as strings
+    return {
+        key: (
+            {
+                name: float(value) if name in ["value", "min", "max"] else value
+                for name, value in field.items()
+            }
+            if key in CHANNEL_TITLES
+            else field
+        )
+        for key, field in overview.items()
+    }
+
+
+@pytest.mark.parametrize("batch_size", [1, 37, 1000])
+def test_overview_state_matches_baseline(db_conn, batch_size):
+    feeds = fixture_feeds(1000)
+    for idx in range(0, len(feeds), batch_size):
+        update_database(db_conn, {"feeds": feeds[idx : idx + batch_size]})
+
+    expected = expected_overview({"channel": CHANNEL_TITLES, "feeds": feeds})
+    assert as_numbers(OverviewState().get(db_conn)) == as_numbers(expected)
+
+
+def test_overview_state_ignores_rows_of_older_days(db_conn):
+    feeds = fixture_feeds(1000)
+    update_database(db_conn, {"feeds": feeds[500:]})
+    # Backfilled history does not change the overview of the latest day
+    update_database(db_conn, {"feeds": feeds[:500]})
+
+    expected = expected_overview({"channel": CHANNEL_TITLES, "feeds": feeds})
+    assert as_numbers(OverviewState().get(db_conn)) == as_numbers(expected)
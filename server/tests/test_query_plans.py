@@ -0,0 +1,20 @@
+from utils import check_query_plans, measurements_query, update_database
+
+
+def test_measurement_queries_use_indexes(db_conn):
+    assert check_query_plans(db_conn) == []
+
+
+def test_measurement_queries_use_indexes_with_statistics(db_conn, make_feeds):
+    # Statistics of a filled table may change the plans chosen by SQLite
+    update_database(db_conn, {"feeds": make_feeds(5000)})
+    db_conn.execute("ANALYZE")
+    assert check_query_plans(db_conn) == []
+
+
+def test_sensor_query_uses_partial_index(db_conn):
+    query, params = measurements_query(3, 99)
+    plan = " ".join(
+        row[3] for row in db_conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    )
+    assert "measurement_sensor3_idx" in plan
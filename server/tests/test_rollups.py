@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from utils import ROLLUP_RESOLUTIONS, update_database
+
+
+def aggregate_raw(db_conn) -> dict:
+    """
+    Expected rollups computed directly from the measurement rows.
+    """
+    buckets = defaultdict(list)
+    for row in db_conn.execute("SELECT * FROM measurement"):
+        created_at, values = row[0], row[2:]
+        for sensor_id, value in enumerate(values, start=1):
+            if value is None:
+                continue
+            for size in ROLLUP_RESOLUTIONS.values():
+                buckets[(size, sensor_id, created_at // size * size)].append(value)
+    return {
+        key: (min(values), max(values), sum(values), len(values))
+        for key, values in buckets.items()
+    }
+
+
+def stored_rollups(db_conn) -> dict:
+    return {
+        row[:3]: row[3:] for row in db_conn.execute("SELECT * FROM measurement_rollup")
+    }
+
+
+def assert_rollups_match(db_conn):
+    expected = aggregate_raw(db_conn)
+    stored = stored_rollups(db_conn)
+    assert stored.keys() == expected.keys()
+    for key, (minimum, maximum, total, count) in expected.items():
+        assert stored[key][0] == minimum
+        assert stored[key][1] == maximum
+        assert abs(stored[key][2] - total) < 1e-6
+        assert stored[key][3] == count
+
+
+def test_rollups_match_raw_rows(db_conn, make_feeds):
+    # Two days of measurements every 7 minutes, so buckets of every resolution are partially filled
+    update_database(db_conn, {"feeds": make_feeds(2 * 24 * 60 // 7, step=7 * 60)})
+    assert_rollups_match(db_conn)
+
+
+def test_rollups_follow_incremental_writes(db_conn, make_feeds):
+    feeds = make_feeds(1000, step=97)
+    # Some values are missing in the first sync
+    for feed in feeds[::3]:
+        feed["field2"] = None
+    update_database(db_conn, {"feeds": feeds[:600]})
+    assert_rollups_match(db_conn)
+
+    # New rows in buckets that already have rollups, and overlapping rows filling the missing values
+    update_database(db_conn, {"feeds": make_feeds(500, offset=500, step=97)})
+    assert_rollups_match(db_conn)
+
+    # Re-synced rows that change nothing
+    update_database(db_conn, {"feeds": make_feeds(100, offset=200, step=97)})
+    assert_rollups_match(db_conn)
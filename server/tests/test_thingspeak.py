@@ -0,0 +1,163 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from thingspeak import fan_out, ThingSpeakClient
+
+CONCURRENT_CALLS = 8
+
+
+class FakeGet:
+    """
+    Replacement of ThingSpeakClient._get counting the requests, every request blocks until release() is called.
+    """
+
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.requests = []
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url, params, timeout, retries):
+        with self._lock:
+            self.requests.append((url, params))
+        assert self.released.wait(5)
+        if self.error is not None:
+            raise self.error
+        return object()
+
+    def release(self):
+        self.released.set()
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def burst(client: ThingSpeakClient, params: list[dict], fake: FakeGet) -> list:
+    """
+    Make the calls concurrently, the API answers once every call waits for a response.
+    """
+    with ThreadPoolExecutor(len(params)) as executor:
+        futures = [
+            executor.submit(client.get, "/channels/1/feeds.json", call_params)
+            for call_params in params
+        ]
+        single_flight = client.single_flight
+        wait_for(
+            lambda: len(fake.requests)
+            + (single_flight.stats["shared"] if single_flight else 0)
+            == len(params)
+        )
+        fake.release()
+        return [future.exception() or future.result() for future in futures]
+
+
+@pytest.mark.parametrize("coalesce", [True, False])
+def test_identical_concurrent_calls(monkeypatch, coalesce):
+    client = ThingSpeakClient("http://api", coalesce=coalesce)
+    fake = FakeGet()
+    monkeypatch.setattr(client, "_get", fake)
+
+    responses = burst(client, [{"results": 10}] * CONCURRENT_CALLS, fake)
+
+    if coalesce:
+        assert len(fake.requests) == 1
+        assert all(response is responses[0] for response in responses)
+        assert client.stats()["coalesced"] == CONCURRENT_CALLS - 1
+    else:
+        assert len(fake.requests) == CONCURRENT_CALLS
+        assert len({id(response) for response in responses}) == CONCURRENT_CALLS
+        assert "coalesced" not in client.stats()
+
+
+def test_calls_with_different_params_are_not_coalesced(monkeypatch):
+    client = ThingSpeakClient("http://api")
+    fake = FakeGet()
+    monkeypatch.setattr(client, "_get", fake)
+
+    burst(client, [{"results": 10}, {"results": 20}, {"results": "10"}], fake)
+
+    # Parameters are compared as strings, the same way they end up in the url
+    assert sorted(params["results"] for _, params in fake.requests) == [10, 20]
+    assert client.stats()["coalesced"] == 1
+
+
+def test_error_is_shared_by_coalesced_calls(monkeypatch):
+    client = ThingSpeakClient("http://api")
+    fake = FakeGet(ConnectionError("API is down"))
+    monkeypatch.setattr(client, "_get", fake)
+
+    errors = burst(client, [{"results": 10}] * CONCURRENT_CALLS, fake)
+
+    assert len(fake.requests) == 1
+    assert all(isinstance(error, ConnectionError) for error in errors)
+
+
+def test_finished_call_is_not_reused(monkeypatch):
+    client = ThingSpeakClient("http://api")
+    fake = FakeGet()
+    fake.release()
+    monkeypatch.setattr(client, "_get", fake)
+
+    first = client.get("/channels/1/feeds.json", {"results": 10})
+    second = client.get("/channels/1/feeds.json", {"results": 10})
+
+    assert first is not second
+    assert len(fake.requests) == 2
+    assert client.stats()["coalesced"] == 0
+
+
+def test_get_without_retries_makes_one_attempt(thingspeak):
+    thingspeak.delays["/channels/1/feeds.json"] = 1
+    client = ThingSpeakClient(thingspeak.url, timeout=(1, 0.2), backoff=0)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get("/channels/1/feeds.json", retries=0)
+
+    assert len(thingspeak.requests) == 1
+    assert client.stats()["retries"] == 0
+
+
+def test_slow_sensor_does_not_delay_the_others(thingspeak, make_feeds):
+    thingspeak.feeds = make_feeds(10)
+    thingspeak.delays["/channels/1/fields/2.json"] = 2
+    client = ThingSpeakClient(thingspeak.url)
+    paths = [f"/channels/1/fields/{sensor_id}.json" for sensor_id in [1, 2, 3]]
+
+    def fetch(path: str) -> list[dict]:
+        return client.get(path, timeout=(1, 0.5), retries=0).json()["feeds"]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(len(paths)) as executor:
+        results = fan_out(executor, fetch, paths, timeout=0.5)
+        elapsed = time.monotonic() - started
+
+    assert elapsed < 1.5
+    assert results[1] is None
+    assert [feed["field1"] for feed in results[0]] == [
+        feed["field1"] for feed in thingspeak.feeds
+    ]
+    assert [feed["field3"] for feed in results[2]] == [
+        feed["field3"] for feed in thingspeak.feeds
+    ]
+    # The slow sensor was not retried
+    assert [path for path, _ in thingspeak.requests].count(paths[1]) == 1
+
+
+def test_fan_out_keeps_order_of_items():
+    def slow_square(value: int) -> int:
+        time.sleep(0.01 * (5 - value))
+        return value * value
+
+    with ThreadPoolExecutor(5) as executor:
+        results = fan_out(executor, slow_square, list(range(5)), timeout=5)
+
+    assert results == [0, 1, 4, 9, 16]
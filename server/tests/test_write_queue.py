@@ -0,0 +1,138 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import write_queue
+
+from conftest import SERVER_DIR
+from db import ConnectionPool
+from write_queue import WriteBehindQueue
+
+
+@pytest.fixture
+def queue(db_path):
+    db_pool = ConnectionPool(db_path)
+    # Not started, tests flush explicitly
+    queue = WriteBehindQueue(db_pool)
+    yield queue
+    db_pool.close()
+
+
+@pytest.fixture
+def failing_once(monkeypatch):
+    """
+    Make the next write of the queue fail like a locked database.
+    """
+    update_database = write_queue.update_database
+    calls = []
+
+    def fail_once(db_conn, raw_data):
+        calls.append(raw_data)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        update_database(db_conn, raw_data)
+
+    monkeypatch.setattr(write_queue, "update_database", fail_once)
+    return calls
+
+
+def stored(db_path) -> dict:
+    db_conn = sqlite3.connect(db_path)
+    rows = db_conn.execute(
+        "SELECT measurement_id, measurement_field1, measurement_field2 FROM measurement"
+    ).fetchall()
+    db_conn.close()
+    return {row[0]: row[1:] for row in rows}
+
+
+def test_flush_writes_pending_rows(queue, db_path, make_feeds):
+    queue.submit(make_feeds(10))
+    queue.submit(make_feeds(5, offset=5))
+    assert queue.pending() == 10
+    assert queue.flush() == 10
+    assert queue.pending() == 0
+    assert len(stored(db_path)) == 10
+
+
+def test_failed_flush_is_retried(queue, db_path, failing_once, make_feeds):
+    queue.submit(make_feeds(10))
+
+    assert queue.flush() == 0
+    assert queue.stats["errors"] == 1
+    assert queue.pending() == 10
+    assert stored(db_path) == {}
+
+    assert queue.flush() == 10
+    assert queue.pending() == 0
+    assert len(stored(db_path)) == 10
+    assert len(failing_once) == 2
+
+
+def test_failed_rows_do_not_overwrite_newer_rows(
+    queue, db_path, monkeypatch, make_feeds
+):
+    feed = make_feeds(1)[0]
+    update_database = write_queue.update_database
+    calls = []
+
+    def fail_once(db_conn, raw_data):
+        calls.append(raw_data)
+        if len(calls) == 1:
+            # Rows of the same entry submitted while the failing write is running
+            queue.submit([{**feed, "field1": "2.0", "field2": None}])
+            raise sqlite3.OperationalError("database is locked")
+        update_database(db_conn, raw_data)
+
+    monkeypatch.setattr(write_queue, "update_database", fail_once)
+    queue.submit([{**feed, "field1": "1.0", "field2": "3.0"}])
+
+    assert queue.flush() == 0
+    assert queue.flush() == 1
+    # The newer value is kept, the value missing in the newer row comes from the failed one
+    assert stored(db_path)[1] == (2.0, 3.0)
+
+
+def test_stop_retries_failed_rows(queue, db_path, failing_once, make_feeds):
+    queue.start()
+    queue.submit(make_feeds(10))
+    queue.stop(timeout=5)
+    assert not queue.is_alive()
+    assert queue.stats["errors"] == 1
+    assert queue.pending() == 0
+    assert len(stored(db_path)) == 10
+
+
+def test_sigterm_writes_pending_rows(db_path):
+    # Rows would wait a minute for the next flush, the process is terminated before that
+    script = textwrap.dedent(
+        f"""
+        import sys, time
+        sys.path[:0] = [{SERVER_DIR!r}, {os.path.join(SERVER_DIR, "tests")!r}]
+        from conftest import generate_feeds
+        from db import ConnectionPool
+        from write_queue import WriteBehindQueue
+        queue = WriteBehindQueue(ConnectionPool({db_path!r}), flush_interval=60)
+        queue.start()
+        queue.stop_on_signal()
+        queue.submit(generate_feeds(10))
+        print("ready", flush=True)
+        time.sleep(60)
+        """
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE, text=True
+    )
+    assert process.stdout.readline().strip() == "ready"
+    assert stored(db_path) == {}
+
+    process.send_signal(signal.SIGTERM)
+
+    # The signal still terminates the process, after the rows are written
+    assert process.wait(timeout=10) == -signal.SIGTERM
+    process.stdout.close()
+    assert len(stored(db_path)) == 10
@@ -0,0 +1,347 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from concurrent.futures import Executor, Future, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.thingspeak.com"
+# Responses that are worth retrying, the API is overloaded or temporarily unavailable
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling the API while the circuit breaker is open. It is a ConnectionError, so callers
+    fall back to the database the same way as when the API is unreachable.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around the API. After failure_threshold consecutive failed or slow calls the circuit opens
+    and calls fail immediately (without waiting for timeouts), so requests go straight to the local store.
+    After reset_timeout seconds a single trial call is let through (half-open), which closes the circuit
+    if it succeeds and opens it again if it fails.
+
+    failure_threshold: number of consecutive failed calls that opens the circuit
+    slow_call: calls taking longer than this (in seconds) count as failures, even if they succeed
+    reset_timeout: time (in seconds) the circuit stays open before a trial call
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call: float = 5.0,
+        reset_timeout: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._opens = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a call can be made now.
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                # Only one trial call at a time
+                if self._trial_running:
+                    self._rejected += 1
+                    return False
+                self._trial_running = True
+            return True
+
+    def record(self, success: bool, latency: float) -> None:
+        """
+        Record result of a call allowed by allow().
+        """
+        failed = not success or latency > self.slow_call
+        with self._lock:
+            self._trial_running = False
+            if not failed:
+                self._failures = 0
+                self._state = self.CLOSED
+                return
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                if self._state != self.OPEN:
+                    self._opens += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def state(self) -> dict:
+        """
+        Current state, number of consecutive failures, how many times the circuit opened, how many calls
+        were rejected and in how many seconds a trial call is let through (if open).
+        """
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(
+                    self.reset_timeout - (time.monotonic() - self._opened_at), 0
+                )
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "opens": self._opens,
+                "rejected": self._rejected,
+                "retry_in": retry_in,
+            }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs the function, callers arriving while it
+    runs wait for it and get the same result (or the same exception) instead of running it again.
+    Works across threads of one process, once the call finishes the next caller runs the function again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Run function, or wait for the call with the same key that is already running.
+        Returns result of the function, exceptions are propagated to every waiting caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats["calls"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        future.set_result(result)
+        return result
+
+
+def fan_out(
+    executor: Executor, function: Callable[[Any], Any], items: list, timeout: float
+) -> list:
+    """
+    Call function for every item on the executor. Returns results in the order of items, with None for items
+    whose call did not finish within timeout seconds. The calls run concurrently and share the deadline,
+    so one slow call does not hold the rest, the caller waits at most timeout seconds in total.
+    Calls that timed out keep running in the executor, their results are dropped.
+    """
+    deadline = time.monotonic() + timeout
+    futures = [executor.submit(function, item) for item in items]
+    results = []
+    for item, future in zip(items, futures):
+        try:
+            results.append(future.result(max(deadline - time.monotonic(), 0)))
+        except FutureTimeoutError:
+            logger.warning(
+                "Call for %s did not finish in %.1fs, skipping it", item, timeout
+            )
+            future.cancel()
+            results.append(None)
+    return results
+
+
+class ThingSpeakClient:
+    """
+    HTTP client for the ThingSpeak API, shared by request handlers, the ingestion poller and the backfill.
+    Connections are pooled and kept alive by a single session (no new TCP and TLS handshake per call),
+    every call has connect and read timeouts, so a stuck socket cannot block a worker forever, and failed calls
+    (connection errors, timeouts, broken responses and responses from RETRY_STATUSES) are retried with
+    exponential backoff and full jitter, so clients do not retry in lockstep. Latency of every call is recorded
+    in stats().
+    An optional circuit breaker stops calling the API once it keeps failing.
+    Identical calls (same url and parameters) made at the same time are coalesced into one, so a burst of requests
+    for the same page (or the poller and a handler refreshing the same channel) costs a single API call.
+
+    api: base url of the API
+    timeout: (connect, read) timeout in seconds
+    retries: how many times a failed call is retried
+    backoff: base delay (in seconds) between retries, doubled with every retry
+    pool_size: maximum number of kept-alive connections, should be at least the number of concurrent callers
+    breaker: optional circuit breaker, every attempt is recorded in it
+    coalesce: whether identical concurrent calls are coalesced
+    """
+
+    def __init__(
+        self,
+        api: str = API_URL,
+        timeout: tuple[float, float] = (3.05, 15),
+        retries: int = 2,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        breaker: CircuitBreaker | None = None,
+        coalesce: bool = True,
+    ):
+        self.api = api
+        self.breaker = breaker
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.single_flight = SingleFlight() if coalesce else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+            "last_latency": None,
+        }
+
+    def get(
+        self,
+        path: str,
+        params: dict | None = None,
+        timeout: tuple[float, float] | None = None,
+        retries: int | None = None,
+    ) -> requests.Response:
+        """
+        Send GET request to the API, retrying failed attempts. Returns the last response, which may still have
+        an error status (it is up to the caller to check it).
+        Raises requests.exceptions.RequestException if the last attempt did not get any response
+        (CircuitOpenError if the circuit breaker does not allow the call).
+        Callers of a coalesced call share the same response object, it must not be modified.
+
+        path: path of the endpoint, e.g. /channels/202842/feeds.json (may contain query string)
+        params: query parameters
+        timeout: (connect, read) timeout overriding the default one
+        retries: number of retries overriding the default one
+        """
+        url = f"{self.api}{path}"
+        if retries is None:
+            retries = self.retries
+        if self.single_flight is None:
+            return self._get(url, params, timeout, retries)
+        # Calls with other timeouts or retries would not take as long as the caller expects, they are not shared
+        key = (
+            url,
+            tuple(sorted((name, str(value)) for name, value in (params or {}).items())),
+            timeout,
+            retries,
+        )
+        return self.single_flight.do(
+            key, lambda: self._get(url, params, timeout, retries)
+        )
+
+    def _get(
+        self,
+        url: str,
+        params: dict | None,
+        timeout: tuple[float, float] | None,
+        retries: int,
+    ) -> requests.Response:
+        for attempt in range(retries + 1):
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker is open for {self.api}")
+            started = time.perf_counter()
+            try:
+                resp = self.session.get(
+                    url, params=params, timeout=timeout or self.timeout
+                )
+                error = None
+            except requests.exceptions.RequestException as err:
+                resp = None
+                error = err
+            latency = time.perf_counter() - started
+            failed = resp is None or resp.status_code in RETRY_STATUSES
+            self._record(latency, retry=attempt > 0, failed=failed)
+            if self.breaker is not None:
+                self.breaker.record(not failed, latency)
+            logger.debug(
+                "GET %s: %s in %.3fs",
+                url,
+                resp.status_code if resp is not None else error,
+                latency,
+            )
+            if not failed:
+                return resp
+            if attempt < retries:
+                # Full jitter: random delay up to the exponential backoff
+                time.sleep(random.uniform(0, self.backoff * 2**attempt))
+        if resp is None:
+            raise error
+        return resp
+
+    def feeds(self, channel: int, params: dict | None = None) -> dict:
+        """
+        Get feeds of all fields of a channel. Raises requests.exceptions.RequestException on failure.
+        """
+        resp = self.get(f"/channels/{channel}/feeds.json", params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def field(self, channel: int, field_id: int, params: dict | None = None) -> dict:
+        """
+        Get feeds of a single field of a channel. Raises requests.exceptions.RequestException on failure.
+        """
+        resp = self.get(f"/channels/{channel}/fields/{field_id}.json", params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _record(self, latency: float, retry: bool, failed: bool) -> None:
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["retries"] += retry
+            self._stats["failures"] += failed
+            self._stats["total_latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+            self._stats["last_latency"] = latency
+
+    def stats(self) -> dict:
+        """
+        Number of calls (every attempt counts), retries and failed attempts, with latency in seconds,
+        and number of calls that were coalesced with an identical running call.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        if self.single_flight is not None:
+            stats["coalesced"] = self.single_flight.stats["shared"]
+        total_latency = stats.pop("total_latency")
+        stats["avg_latency"] = (
+            total_latency / stats["calls"] if stats["calls"] else None
+        )
+        return stats
+
+    def close(self) -> None:
+        self.session.close()
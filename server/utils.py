@@ -1,8 +1,15 @@
+import csv
+import io
 import requests
 import sqlite3
 
+import numpy as np
+
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterable, Iterator
+
+from cache import data_version
+from overview import CHANNEL_TITLES, overview_state
 
 
 def convert_sensor_data(data_json: dict, field_name: str) -> list[dict]:
@@ -13,13 +20,15 @@ def convert_sensor_data(data_json: dict, field_name: str) -> list[dict]:
     """
     result = []
     for entry in data_json:
-        if entry[field_name] is not None and entry[field_name] != "None":
+        value = entry[field_name]
+        if value is not None and value != "None":
             result.append(
                 {
                     "id": entry["entry_id"],
                     "sensor_name": field_name,
                     "timestamp": str(entry["created_at"]),
-                    "value": float(entry[field_name]),
+                    # Database values are already numbers, only API responses have to be parsed
+                    "value": value if type(value) is float else float(value),
                 }
             )
     return result
@@ -78,6 +87,69 @@ def generate_csv_file(data: list[dict]):
             yield f"{','.join([convert_to_csv(value) for value in row.values()])}\n"
 
 
+# Columns of exported sensor data, the same as keys returned by convert_sensor_data
+EXPORT_HEADER = ["id", "sensor_name", "timestamp", "value"]
+
+
+def generate_csv_chunks(
+    batches: Iterable[list[tuple]], header: list[str], chunk_size: int = 64 * 1024
+) -> Iterator[str]:
+    """
+    Encode rows with the csv module and yield them in chunks of about chunk_size characters, so the response
+    is streamed with few large writes and memory use does not depend on the number of rows.
+
+    batches: iterable of lists of rows (e.g. results of cursor.fetchmany)
+    header: first row of the file
+    chunk_size: minimum size of a yielded chunk (except for the last one)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(header)
+    for batch in batches:
+        writer.writerows(batch)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_db_sensor_export(
+    db_conn: sqlite3.Connection,
+    sensor_ids: list[int],
+    start_date: str | None = None,
+    end_date: str | None = None,
+    batch_size: int = 5000,
+) -> Iterator[list[tuple]]:
+    """
+    Read measurements of the sensors for export in batches of rows in EXPORT_HEADER format, sensor after sensor.
+    There is no limit on the number of rows, only one batch is held in memory at a time.
+    Empty batches are never yielded, so an exhausted iterator means there is no data to export.
+
+    sensor_ids: exported sensors
+    start_date: start of the range in ThingSpeak format, applied together with end_date
+    end_date: end of the range in ThingSpeak format, applied together with start_date
+    batch_size: number of rows fetched from the cursor at once
+    """
+    for sensor_id in sensor_ids:
+        sensor_id = int(sensor_id)
+        # LIMIT -1 means no limit in SQLite
+        query, params = measurements_query(
+            sensor_id,
+            -1,
+            start_date,
+            end_date,
+            columns=f"measurement_id, 'field{sensor_id}', {CREATED_AT_COLUMN}, measurement_field{sensor_id}",
+        )
+        cur = db_conn.execute(query, params)
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
+
 def fetch_overview(raw_data: dict) -> dict:
     """
     Helper function to parse overview response from ThingSpeak API.
@@ -105,26 +177,25 @@ def fetch_overview(raw_data: dict) -> dict:
                 break
         # Otherwise proceed as normal
         for key in channel_keys:
-            if raw_data["feeds"][idx][key] is not None:
+            value = raw_data["feeds"][idx][key]
+            if value is not None:
                 # Set the date of the earliest non-null feed in the API response
                 if latest_date is None:
                     latest_date = datetime.strptime(
                         raw_data["feeds"][idx]["created_at"], "%Y-%m-%dT%H:%M:%SZ"
                     )
+                # Feeds are iterated from the newest, so the first value found is the latest one
                 # Remove \n, \r, \b with strip
-                overview[key]["value"] = str(raw_data["feeds"][idx][key]).strip()
+                if "value" not in overview[key]:
+                    overview[key]["value"] = str(value).strip()
                 # Update minimum and maximum values for each sensor
                 try:
-                    if (
-                        "min" not in overview[key]
-                        or float(raw_data["feeds"][idx][key]) < overview[key]["min"]
-                    ):
-                        overview[key]["min"] = float(raw_data["feeds"][idx][key])
-                    if (
-                        "max" not in overview[key]
-                        or float(raw_data["feeds"][idx][key]) > overview[key]["max"]
-                    ):
-                        overview[key]["max"] = float(raw_data["feeds"][idx][key])
+                    # Database values are already numbers, only API responses have to be parsed
+                    number = value if type(value) is float else float(value)
+                    if "min" not in overview[key] or number < overview[key]["min"]:
+                        overview[key]["min"] = number
+                    if "max" not in overview[key] or number > overview[key]["max"]:
+                        overview[key]["max"] = number
                 except ValueError:
                     pass
     # Add date of the day of displayed values to overview
@@ -142,6 +213,28 @@ def flatten(data: list[list[Any]]) -> list[Any]:
     return flat_list
 
 
+def to_epoch(date: str) -> int:
+    """
+    Convert ThingSpeak date (e.g. 2023-01-01T00:00:00Z) into unix epoch seconds, which is how dates are stored.
+    """
+    # fromisoformat is an order of magnitude faster than strptime, which matters when syncing large windows
+    return int(datetime.fromisoformat(date.replace("Z", "+00:00")).timestamp())
+
+
+def to_number(value: Any) -> float | None:
+    """
+    Convert sensor value from API response into a number, which is how values are stored.
+    Missing values and values that are not numbers (like "None") are converted to None.
+    """
+    if value is None:
+        return None
+    try:
+        # float() ignores surrounding whitespace, so \r\n added by Windows devices does not matter
+        return float(value)
+    except ValueError:
+        return None
+
+
 def parse_update_row(row_data: dict) -> list[Any]:
     """
     Convert row dict into a list with order of columns in the measurement table.
@@ -165,62 +258,264 @@ def parse_update_row(row_data: dict) -> list[Any]:
         "field8": 9,
     }
     for key in row_data:
-        parsed_row[mapping[key]] = str(row_data[key]).replace("\n", "")
+        if key == "created_at":
+            parsed_row[0] = to_epoch(row_data[key])
+        elif key == "entry_id":
+            parsed_row[1] = int(row_data[key])
+        else:
+            parsed_row[mapping[key]] = to_number(row_data[key])
     return parsed_row
 
 
-def update_database(db_conn: sqlite3.Connection, raw_data: dict) -> None:
+# Single statement upsert: insert new rows, for existing rows fill only the values that are still null
+UPSERT_MEASUREMENT = """
+    INSERT INTO measurement VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(measurement_id) DO UPDATE SET
+        measurement_field1 = COALESCE(measurement.measurement_field1, excluded.measurement_field1),
+        measurement_field2 = COALESCE(measurement.measurement_field2, excluded.measurement_field2),
+        measurement_field3 = COALESCE(measurement.measurement_field3, excluded.measurement_field3),
+        measurement_field4 = COALESCE(measurement.measurement_field4, excluded.measurement_field4),
+        measurement_field5 = COALESCE(measurement.measurement_field5, excluded.measurement_field5),
+        measurement_field6 = COALESCE(measurement.measurement_field6, excluded.measurement_field6),
+        measurement_field7 = COALESCE(measurement.measurement_field7, excluded.measurement_field7),
+        measurement_field8 = COALESCE(measurement.measurement_field8, excluded.measurement_field8)
+    -- Skip rows that would not change, re-synced rows are not rewritten (and their indexes are not touched)
+    WHERE
+        (measurement.measurement_field1 IS NULL AND excluded.measurement_field1 IS NOT NULL)
+        OR (measurement.measurement_field2 IS NULL AND excluded.measurement_field2 IS NOT NULL)
+        OR (measurement.measurement_field3 IS NULL AND excluded.measurement_field3 IS NOT NULL)
+        OR (measurement.measurement_field4 IS NULL AND excluded.measurement_field4 IS NOT NULL)
+        OR (measurement.measurement_field5 IS NULL AND excluded.measurement_field5 IS NOT NULL)
+        OR (measurement.measurement_field6 IS NULL AND excluded.measurement_field6 IS NOT NULL)
+        OR (measurement.measurement_field7 IS NULL AND excluded.measurement_field7 IS NOT NULL)
+        OR (measurement.measurement_field8 IS NULL AND excluded.measurement_field8 IS NOT NULL)
+"""
+
+
+def update_database(
+    db_conn: sqlite3.Connection, raw_data: dict, batch_size: int = 10000
+) -> None:
     """
     Insert API response data into the database if it doesn't exist or update null values if non-null value is provided.
     Basically, a bulk upsert with coalesce to remove nulls.
 
+    Bumps data_version in the same transaction if any row was inserted or changed, so cached responses built from
+    older data are not served.
+
     raw_data: entire response from the endpoint API
+    batch_size: number of rows passed to a single executemany call
     """
     data_to_insert = []
     for feed in raw_data["feeds"]:
         row_to_insert = parse_update_row(feed)
-        if any(row_to_insert[2:]):
-            # Windows adds carriage returns to values for some reason, so remove them
-            data_to_insert.append(
-                [
-                    column.replace("\r", "") if type(column) == str else column
-                    for column in row_to_insert
-                ]
-            )
+        if any(value is not None for value in row_to_insert[2:]):
+            data_to_insert.append(row_to_insert)
     # Bulk upsert operation, using connection as context manager executes code as a single transaction
     # https://docs.python.org/3/library/sqlite3.html#sqlite3-connection-context-manager
+    # executemany prepares the statement once and reuses it for every row
+    changes = db_conn.total_changes
     with db_conn:
-        cur = db_conn.cursor()
-        # Create empty temporary table that will have the same schema as the original table (and no rows, since 1=0 is always false)
-        cur.execute(
-            "CREATE TEMPORARY TABLE temp_table AS SELECT * FROM measurement WHERE 1=0"
-        )
-        cur = db_conn.cursor()
-        db_conn.executemany(
-            "INSERT INTO temp_table VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            data_to_insert,
-        )
-        # Update existing rows if existing row value is None
-        cur.execute(
-            """
-            UPDATE measurement
-            SET
-                measurement_field1 = COALESCE(measurement.measurement_field1, temp_table.measurement_field1),
-                measurement_field2 = COALESCE(measurement.measurement_field2, temp_table.measurement_field2),
-                measurement_field2 = COALESCE(measurement.measurement_field3, temp_table.measurement_field3),
-                measurement_field2 = COALESCE(measurement.measurement_field4, temp_table.measurement_field4),
-                measurement_field2 = COALESCE(measurement.measurement_field5, temp_table.measurement_field5),
-                measurement_field2 = COALESCE(measurement.measurement_field6, temp_table.measurement_field6),
-                measurement_field2 = COALESCE(measurement.measurement_field7, temp_table.measurement_field7),
-                measurement_field2 = COALESCE(measurement.measurement_field8, temp_table.measurement_field8)
-            FROM temp_table
-            WHERE measurement.measurement_id = temp_table.measurement_id
-        """
-        )
+        for idx in range(0, len(data_to_insert), batch_size):
+            db_conn.executemany(
+                UPSERT_MEASUREMENT, data_to_insert[idx : idx + batch_size]
+            )
+        # Rows that would not change are skipped by the upsert, so they are not counted
+        changed = db_conn.total_changes > changes
+        if data_to_insert:
+            # Rollups and overview are refreshed in the same transaction, so they always match the measurements
+            update_rollups(
+                db_conn,
+                min(row[0] for row in data_to_insert),
+                max(row[0] for row in data_to_insert),
+            )
+            overview = overview_state.update(db_conn, data_to_insert)
+        if changed:
+            data_version.bump(db_conn)
+        version = data_version.get(db_conn)
+    if data_to_insert:
+        overview_state.mirror(overview, version)
+
+
+# Bucket sizes (in seconds) of the rollups, from the finest to the coarsest
+ROLLUP_RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def update_rollups(db_conn: sqlite3.Connection, start: int, end: int) -> None:
+    """
+    Recompute rollup buckets (min, max, sum and count per sensor) covering measurements between start and end
+    (epoch seconds). Minute buckets are computed from measurements, every coarser resolution from the previous one,
+    so the cost depends on the number of new rows, not on the size of the table.
+    Does not commit, it is meant to run inside the transaction that inserted the measurements.
+    """
+    cur = db_conn.cursor()
+    previous_size = None
+    for size in ROLLUP_RESOLUTIONS.values():
+        bucket_start = start // size * size
+        bucket_end = end // size * size + size
+        if previous_size is None:
+            for sensor_id in range(1, 9):
+                field = f"measurement_field{sensor_id}"
+                cur.execute(
+                    f"""
+                    INSERT OR REPLACE INTO measurement_rollup
+                    SELECT ?, ?, measurement_created_at / ? * ?, MIN({field}), MAX({field}), SUM({field}), COUNT({field})
+                    FROM measurement
+                    WHERE {field} IS NOT NULL AND measurement_created_at >= ? AND measurement_created_at < ?
+                    GROUP BY measurement_created_at / ?
+                    """,
+                    [size, sensor_id, size, size, bucket_start, bucket_end, size],
+                )
+        else:
+            cur.execute(
+                """
+                INSERT OR REPLACE INTO measurement_rollup
+                SELECT ?, rollup_sensor_id, rollup_bucket / ? * ?,
+                    MIN(rollup_min), MAX(rollup_max), SUM(rollup_sum), SUM(rollup_count)
+                FROM measurement_rollup
+                WHERE rollup_resolution = ? AND rollup_bucket >= ? AND rollup_bucket < ?
+                GROUP BY rollup_sensor_id, rollup_bucket / ?
+                """,
+                [size, size, size, previous_size, bucket_start, bucket_end, size],
+            )
+        previous_size = size
+
+
+def pick_resolution(range_seconds: float, max_points: int) -> str:
+    """
+    Pick the rollup resolution for a chart covering range_seconds: the finest one that still fits in max_points
+    buckets, so a chart of a year costs about the same as a chart of an hour.
+    """
+    for resolution, size in ROLLUP_RESOLUTIONS.items():
+        if range_seconds / size <= max_points:
+            return resolution
+    return "day"
+
+
+def get_db_rollups(
+    db_conn: sqlite3.Connection,
+    sensor_id: int,
+    resolution: str,
+    size_limit: int = 999,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> list[dict]:
+    """
+    Get rollup buckets of a sensor, newest first, in the format returned by convert_sensor_data
+    (value is the average of the bucket) extended with min, max and count of measurements in the bucket.
+
+    resolution: one of ROLLUP_RESOLUTIONS keys
+    size_limit: maximum number of buckets
+    """
+    conditions = ["rollup_resolution = ?", "rollup_sensor_id = ?"]
+    params = [ROLLUP_RESOLUTIONS[resolution], int(sensor_id)]
+    if start_date and end_date:
+        conditions.append("rollup_bucket BETWEEN ? AND ?")
+        params.extend([to_epoch(start_date), to_epoch(end_date)])
+    params.append(size_limit)
+    cur = db_conn.cursor()
+    cur.execute(
+        f"""
+        SELECT
+            rollup_bucket,
+            strftime('%Y-%m-%dT%H:%M:%SZ', rollup_bucket, 'unixepoch'),
+            rollup_min,
+            rollup_max,
+            rollup_sum,
+            rollup_count
+        FROM measurement_rollup
+        WHERE {' AND '.join(conditions)}
+        ORDER BY rollup_bucket DESC
+        LIMIT ?
+        """,
+        params,
+    )
+    return [
+        {
+            "id": bucket,
+            "sensor_name": f"field{sensor_id}",
+            "timestamp": timestamp,
+            "value": total / count,
+            "min": minimum,
+            "max": maximum,
+            "count": count,
+        }
+        for bucket, timestamp, minimum, maximum, total, count in cur.fetchall()
+    ]
+
+
+# Dates are stored as epoch seconds, this converts them back to the format returned by ThingSpeak
+CREATED_AT_COLUMN = (
+    "strftime('%Y-%m-%dT%H:%M:%SZ', measurement_created_at, 'unixepoch')"
+)
 
-        # Insert rows that did not exist in the original table
-        cur.execute("INSERT OR IGNORE INTO measurement SELECT * FROM temp_table")
-    db_conn.commit()
+
+def measurements_query(
+    sensor_id: int | None = None,
+    size_limit: int = 99,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    columns: str | None = None,
+) -> tuple[str, list]:
+    """
+    Build the query used by get_db_measurements. Dates are expected in ThingSpeak format (2023-01-01T00:00:00Z).
+    Queries are written so they are served by indexes from schema.sql:
+    sensor queries repeat the partial index condition (measurement_fieldN IS NOT NULL) and order by
+    measurement_created_at, which is the indexed column, so SQLite walks the index backwards instead of sorting.
+    ThingSpeak entry ids grow with creation time, so the order is the same as ordering by measurement_id.
+
+    columns: selected columns, by default the formatted date, measurement_id and all fields
+
+    Returns query and its parameters.
+    """
+    conditions = []
+    params = []
+    if sensor_id:
+        conditions.append(f"measurement_field{int(sensor_id)} IS NOT NULL")
+    if start_date and end_date:
+        conditions.append("measurement_created_at BETWEEN ? AND ?")
+        params.extend([to_epoch(start_date), to_epoch(end_date)])
+    if columns is None:
+        columns = f"""
+            {CREATED_AT_COLUMN} AS created_at,
+            measurement_id,
+            {', '.join(f'measurement_field{idx}' for idx in range(1, 9))}"""
+    query = f"""
+        SELECT {columns}
+        FROM measurement"""
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+        query += " ORDER BY measurement_created_at DESC, measurement_id DESC LIMIT ?"
+    else:
+        # Without conditions the table is read backwards by its primary key
+        query += " ORDER BY measurement_id DESC LIMIT ?"
+    params.append(size_limit)
+    return query, params
+
+
+def check_query_plans(db_conn: sqlite3.Connection) -> list[str]:
+    """
+    Verify that every query built by measurements_query is served by an index, without a full table scan
+    or a temporary sort. Returns list of problems (empty if all plans are fine).
+    """
+    problems = []
+    variants = [(sensor_id, None, None) for sensor_id in [None, *range(1, 9)]]
+    variants += [
+        (sensor_id, "2023-01-01T00:00:00Z", "2023-01-02T00:00:00Z")
+        for sensor_id in [None, *range(1, 9)]
+    ]
+    for sensor_id, start_date, end_date in variants:
+        query, params = measurements_query(sensor_id, 99, start_date, end_date)
+        plan = [
+            row[3]
+            for row in db_conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        ]
+        if any("TEMP B-TREE" in step for step in plan):
+            problems.append(f"{query}: sorted in a temporary b-tree ({plan})")
+        if (sensor_id or start_date) and not any(
+            "USING INDEX" in step or "USING COVERING INDEX" in step for step in plan
+        ):
+            problems.append(f"{query}: not served by an index ({plan})")
+    return problems
 
 
 def get_db_measurements(
@@ -251,42 +546,102 @@ def get_db_measurements(
         "field7",
         "field8",
     ]
+    cur.execute(*measurements_query(sensor_id, size_limit, start_date, end_date))
     if not sensor_id:
         # For overview
-        if not start_date or not end_date:
-            cur.execute(
-                f"SELECT * FROM measurement ORDER BY measurement_id DESC LIMIT {size_limit}"
-            )
-        else:
-            cur.execute(
-                f"SELECT * FROM measurement WHERE measurement_created_at BETWEEN ? AND ? ORDER BY measurement_id DESC LIMIT {size_limit}",
-                [start_date, end_date],
-            )
         return dict(
-            # This could be improved by creating a table in database with titles for each field, but I am skipping it here
-            # by hard-coding values (man, do I love to be pressured by time)
-            channel={
-                "field1": "Temperatura (DHT-22) [°C]",
-                "field2": "Wilgotność względna (DHT-22) [%]",
-                "field3": "Natężenie światła (BH-1750) [lx]",
-                "field4": "Ciśnienie atm. (BMP-180) [hPa]",
-                "field5": "Temp. grzejnika (DS18B20) [°C]",
-                "field6": "Temperatura (DS18B20) [°C]",
-                "field7": "Ruch (PIR)",
-                "field8": "Temperatura  (BMP-180) [°C]",
-            },
+            channel=CHANNEL_TITLES,
             # This could be replaced by https://www.adamsmith.haus/python/examples/3884/sqlite3-use-a-row-factory-to-access-values-by-column-name
             # but then we would have to remap the keys to the ones accepted by fetch_overview anyway, so I am not doing it
-            feeds=[dict(zip(keys, values)) for values in cur.fetchall()],
+            # Rows are read newest first, but ThingSpeak (and fetch_overview) lists feeds in ascending dates
+            feeds=[dict(zip(keys, values)) for values in cur.fetchall()][::-1],
         )
     # For specific sensor
-    if not start_date or not end_date:
-        cur.execute(
-            f"SELECT * FROM measurement WHERE measurement_field{sensor_id} IS NOT NULL ORDER BY measurement_id DESC LIMIT {size_limit}"
+    return [dict(zip(keys, values)) for values in cur.fetchall()]
+
+
+def get_db_measurement_arrays(
+    db_conn: sqlite3.Connection,
+    sensor_id: int,
+    size_limit: int = 99,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    batch_size: int = 65536,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get non-null measurements of a sensor (newest first, same rows as get_db_measurements) as arrays of entry ids,
+    dates (epoch seconds) and values. Rows are read in batches straight into arrays, without building a dict
+    and formatting a date for every row, which is what dominates reading large ranges.
+
+    sensor_id: sensor of the measurements
+    size_limit: how much data to fetch from database
+    batch_size: number of rows fetched from the cursor at once
+    """
+    sensor_id = int(sensor_id)
+    cur = db_conn.cursor()
+    # Plain tuples, pooled connections return sqlite3.Row objects which NumPy converts an order of magnitude slower
+    cur.row_factory = None
+    cur.execute(
+        *measurements_query(
+            sensor_id,
+            size_limit,
+            start_date,
+            end_date,
+            columns=f"measurement_id, measurement_created_at, measurement_field{sensor_id}",
         )
-    else:
+    )
+    batches = []
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        # Ids and epoch seconds are integers below 2^53, so they are exact in float64
+        batches.append(np.array(rows, dtype=np.float64))
+    if not batches:
+        batches.append(np.empty((0, 3), dtype=np.float64))
+    rows = np.concatenate(batches)
+    return rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2]
+
+
+def get_sync_cursor(
+    db_conn: sqlite3.Connection, channel: int
+) -> tuple[int, str] | None:
+    """
+    Get the (entry_id, created_at) of the newest entry synced for a channel.
+    If the channel was never synced, fall back to the newest measurement stored in the database.
+
+    channel: id of the ThingSpeak channel
+    """
+    cur = db_conn.cursor()
+    cur.execute(
+        "SELECT cursor_entry_id, cursor_created_at FROM sync_cursor WHERE cursor_channel_id = ?",
+        [channel],
+    )
+    row = cur.fetchone()
+    if row is None:
         cur.execute(
-            f"SELECT * FROM measurement WHERE measurement_field{sensor_id} IS NOT NULL AND measurement_created_at BETWEEN ? AND ? ORDER BY measurement_id DESC LIMIT {size_limit}",
-            [start_date, end_date],
+            """
+            SELECT measurement_id, strftime('%Y-%m-%dT%H:%M:%SZ', measurement_created_at, 'unixepoch')
+            FROM measurement ORDER BY measurement_id DESC LIMIT 1
+            """
+        )
+        row = cur.fetchone()
+    return (row[0], row[1]) if row is not None else None
+
+
+def set_sync_cursor(
+    db_conn: sqlite3.Connection, channel: int, entry_id: int, created_at: str
+) -> None:
+    """
+    Store the newest synced entry for a channel.
+    """
+    with db_conn:
+        db_conn.execute(
+            """
+            INSERT INTO sync_cursor (cursor_channel_id, cursor_entry_id, cursor_created_at) VALUES (?, ?, ?)
+            ON CONFLICT(cursor_channel_id) DO UPDATE SET
+                cursor_entry_id = excluded.cursor_entry_id,
+                cursor_created_at = excluded.cursor_created_at
+            """,
+            [channel, entry_id, created_at],
         )
-    return [dict(zip(keys, values)) for values in cur.fetchall()]
@@ -0,0 +1,156 @@
+import atexit
+import logging
+import signal
+import threading
+import time
+
+from db import ConnectionPool
+from utils import update_database
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue(threading.Thread):
+    """
+    Write-behind queue for feed rows. Request handlers submit rows and return immediately, a single writer thread
+    flushes them in one transaction every flush_interval seconds or as soon as max_rows rows are waiting.
+    Rows are de-duplicated by entry_id while waiting, so overlapping responses are written once.
+    Rows of a failed write stay in the queue until a later flush writes them.
+    Pending rows are flushed when the queue is stopped, which happens at interpreter exit and, once
+    stop_on_signal() is called, on SIGTERM (which skips exit handlers). A process killed without a chance to
+    clean up (SIGKILL, out of memory, power loss) loses the pending rows, up to flush_interval seconds or
+    max_rows rows of fetched data.
+
+    db_pool: connection pool, rows are written through its writer connection
+    flush_interval: maximum time (in seconds) rows wait before they are written
+    max_rows: number of pending rows that triggers an immediate flush
+    """
+
+    def __init__(
+        self, db_pool: ConnectionPool, flush_interval: float = 0.5, max_rows: int = 5000
+    ):
+        super().__init__(name="write-behind-queue", daemon=True)
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._flush_lock = threading.Lock()
+        self.stats = {"submitted": 0, "written": 0, "flushes": 0, "errors": 0}
+        atexit.register(self.stop)
+
+    def submit(self, feeds: list[dict]) -> None:
+        """
+        Queue feed rows (from API response) for writing. Values of rows with the same entry_id are merged,
+        the first non-null value of every field wins, same as in the database upsert.
+        """
+        with self._condition:
+            for feed in feeds:
+                pending = self._pending.get(feed["entry_id"])
+                if pending is None:
+                    self._pending[feed["entry_id"]] = dict(feed)
+                else:
+                    for key, value in feed.items():
+                        if pending.get(key) is None:
+                            pending[key] = value
+            self.stats["submitted"] += len(feeds)
+            if len(self._pending) >= self.max_rows:
+                self._condition.notify()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Write all pending rows in a single transaction. Returns number of written rows.
+        If the write fails, rows are put back into the queue and written by the next flush.
+        """
+        # Only one flush at a time, so rows are committed in the order they were taken from the queue
+        with self._flush_lock:
+            with self._condition:
+                rows = list(self._pending.values())
+                self._pending = {}
+            if not rows:
+                return 0
+            try:
+                with self.db_pool.writer() as db_conn:
+                    update_database(db_conn, {"feeds": rows})
+                self.stats["written"] += len(rows)
+                self.stats["flushes"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception(
+                    "Unable to write %d queued rows, retrying with the next flush",
+                    len(rows),
+                )
+                self._requeue(rows)
+                return 0
+            return len(rows)
+
+    def _requeue(self, rows: list[dict]) -> None:
+        # Rows submitted while the write was failing are newer, their values are kept and only their
+        # missing values are taken from the failed rows
+        with self._condition:
+            for row in rows:
+                pending = self._pending.get(row["entry_id"])
+                if pending is None:
+                    self._pending[row["entry_id"]] = row
+                else:
+                    for key, value in row.items():
+                        if pending.get(key) is None:
+                            pending[key] = value
+
+    def stop_on_signal(self, signum: int = signal.SIGTERM) -> None:
+        """
+        Stop the queue (writing pending rows) when the process receives the signal, then pass the signal to
+        the previous handler, so the process still exits the way it would without the queue.
+        Signal handlers can only be set in the main thread, elsewhere this does nothing.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signum)
+
+        def handler(received, frame):
+            self.stop()
+            if callable(previous):
+                previous(received, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        signal.signal(signum, handler)
+
+    def run(self) -> None:
+        failed = False
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                # Wait until the interval passes or enough rows are waiting,
+                # after a failed write always wait for the interval before trying again
+                while (
+                    not self._stopped
+                    and (failed or len(self._pending) < self.max_rows)
+                    and time.monotonic() < deadline
+                ):
+                    self._condition.wait(deadline - time.monotonic())
+                stopped = self._stopped
+            errors = self.stats["errors"]
+            self.flush()
+            failed = self.stats["errors"] > errors
+            if stopped:
+                break
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Stop the writer thread, pending rows are written before it exits.
+        Rows of a failed last write of the thread are written once more.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+        # Rows submitted after the thread exited (or when it was never started)
+        self.flush()
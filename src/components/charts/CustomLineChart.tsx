@@ -8,6 +8,8 @@ import { Icon } from "@iconify/react";
 
 // Set the interval for showing the x axis labels
 const INTERVAL = 2;
+// How often (in milliseconds) the state of a prediction is checked
+const PREDICTION_POLL_INTERVAL = 1000;
 
 interface Entry {
 	timestamp: string;
@@ -147,12 +149,35 @@ const CustomLineChart = ({ path, title, yLabel, xLabel, color, predictionColor }
 					algorithm: selectedModel,
 				}),
 			});
-			if (response.status !== 200) {
+			if (response.status === 429) {
+				alert("Too many predictions are running, please try again later.");
+				setLoadingPrediction(false);
+				return;
+			}
+			if (response.status !== 202) {
 				alert("There was an error while fetching the data.");
 				setLoadingPrediction(false);
 				return;
 			}
-			const data = await response.json();
+			// The model is trained in the background, poll the job until it is finished
+			const { job_id } = await response.json();
+			let job;
+			do {
+				await new Promise((resolve) => setTimeout(resolve, PREDICTION_POLL_INTERVAL));
+				const jobResponse = await fetch(`${path}/predict/${job_id}`);
+				if (jobResponse.status !== 200) {
+					alert("There was an error while fetching the data.");
+					setLoadingPrediction(false);
+					return;
+				}
+				job = await jobResponse.json();
+			} while (job.status === "queued" || job.status === "running");
+			if (job.status !== "done") {
+				alert("There was an error while making the prediction.");
+				setLoadingPrediction(false);
+				return;
+			}
+			const data = job.result;
 			setPredictions(data[1]);
 			setRawLabels(data[0]);
 			setLabels(processLabels(data[0]));